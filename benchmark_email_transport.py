@@ -0,0 +1,173 @@
+"""
+Benchmark: envío de correos por lotes
+
+Levanta un sink HTTP local que imita la API de Resend (/emails y
+/emails/batch, con latencia y errores 500 configurables) y compara el envío
+anterior, una llamada por destinatario y una tras otra, con EmailTransport:
+correos sin adjuntos agrupados en /emails/batch, y correos con adjuntos (QR
+del ticket) en paralelo.
+
+No envía correos reales ni necesita RESEND_API_KEY.
+
+Uso:
+    python benchmark_email_transport.py [--emails 300] [--latency-ms 50] [--fail-rate 0.05]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import resend
+
+from email_service import EmailTransport, ResendBackend
+
+
+class ResendSink(ThreadingHTTPServer):
+    """API falsa de Resend: cuenta llamadas y correos, responde con latencia fija"""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float, fail_rate: float, seed: int = 2026):
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.emails = 0
+        self.next_id = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.emails = 0
+
+
+class _SinkHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server: ResendSink = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"null")
+        time.sleep(server.latency)
+
+        with server.lock:
+            server.calls += 1
+            failed = server.rng.random() < server.fail_rate
+
+        if failed:
+            return self._reply(500, {"statusCode": 500, "name": "application_error", "message": "Error simulado"})
+
+        if self.path == "/emails/batch":
+            data, errors = [], []
+            for index, item in enumerate(body):
+                if "invalid" in item["to"][0]:
+                    errors.append({"index": index, "message": "Invalid `to` field"})
+                else:
+                    data.append({"id": self._new_id()})
+            with server.lock:
+                server.emails += len(data)
+            return self._reply(200, {"data": data, "errors": errors})
+
+        with server.lock:
+            server.emails += 1
+        return self._reply(200, {"id": self._new_id()})
+
+    def _new_id(self) -> str:
+        server: ResendSink = self.server
+        with server.lock:
+            server.next_id += 1
+            return f"sink-{server.next_id}"
+
+    def _reply(self, status: int, payload):
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def build_messages(count: int, with_attachment: bool):
+    qr = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+    messages = []
+    for i in range(count):
+        params = {
+            "from": "IEEE Tadeo <bench@example.com>",
+            "to": [f"user{i}@example.com"],
+            "subject": "Benchmark",
+            "html": f"<p>Hola usuario {i}</p><img src=\"cid:ticket_qr\">",
+            "text": f"Hola usuario {i}"
+        }
+        if with_attachment:
+            params["attachments"] = [{"content": qr, "filename": "ticket_qr.png", "content_id": "ticket_qr", "disposition": "inline"}]
+        messages.append((i, params))
+    return messages
+
+
+def run_sequential(backend: ResendBackend, messages):
+    """Envío anterior: una llamada por correo, sin reintentos"""
+    sent = 0
+    for _, params in messages:
+        try:
+            backend.send(params)
+            sent += 1
+        except Exception:
+            pass
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envío de correos uno a uno vs. por lotes")
+    parser.add_argument("--emails", type=int, default=300, help="Correos por escenario")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latencia de cada llamada al sink")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="Fracción de llamadas que responden 500")
+    parser.add_argument("--concurrency", type=int, default=4, help="Envíos simultáneos del transporte")
+    args = parser.parse_args()
+
+    sink = ResendSink(args.latency_ms / 1000, args.fail_rate)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    resend.api_url = sink.url
+    backend = ResendBackend("re_benchmark")
+
+    print("=" * 72)
+    print(f"BENCHMARK: {args.emails} correos, latencia {args.latency_ms:.0f} ms, {args.fail_rate:.0%} de llamadas con error 500")
+    print("=" * 72)
+    print(f"{'Escenario':<38} {'Tiempo':>8} {'Llamadas':>9} {'Enviados':>9}")
+
+    for with_attachment in (False, True):
+        label = "con adjunto (QR)" if with_attachment else "sin adjuntos"
+        messages = build_messages(args.emails, with_attachment)
+
+        sink.reset()
+        start = time.perf_counter()
+        sent = run_sequential(backend, messages)
+        elapsed = time.perf_counter() - start
+        print(f"{'Uno por llamada, ' + label:<38} {elapsed:>7.2f}s {sink.calls:>9} {sent:>9}")
+
+        sink.reset()
+        transport = EmailTransport(backend, concurrency=args.concurrency, requests_per_second=0, retry_base=0.05)
+        start = time.perf_counter()
+        results = transport.send_many(messages)
+        elapsed = time.perf_counter() - start
+        sent = sum(1 for result in results.values() if result["success"])
+        print(f"{'EmailTransport, ' + label:<38} {elapsed:>7.2f}s {sink.calls:>9} {sent:>9}")
+
+    sink.shutdown()
+    print("=" * 72)
+    print("El transporte respeta además EMAIL_API_REQUESTS_PER_SECOND (aquí desactivado).")
+
+
+if __name__ == "__main__":
+    main()
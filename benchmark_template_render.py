@@ -0,0 +1,108 @@
+"""
+Benchmark: renderizado de templates de tickets
+
+Compara el renderizado anterior (str.format sobre el template completo en
+cada ticket) con los templates compilados de template_service, para el
+email y el WhatsApp predeterminados y para un template de evento. Verifica
+además que ambos produzcan exactamente el mismo texto.
+
+No necesita base de datos: usa objetos en memoria.
+
+Uso:
+    python benchmark_template_render.py [--renders 20000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models
+from template_service import TemplateService, template_service
+
+
+def format_email(template: str, i: int) -> str:
+    """Renderizado anterior del email"""
+    return template.format(
+        user_name=f"Usuario {i}", event_name="Congreso IEEE", event_date="14/03/2026 a las 18:00",
+        event_location="Auditorio", ticket_code=f"TCK-{i:06d}", ticket_url=f"https://ticket.example.org/ticket/{i}",
+        access_pin="123456", companions=1,
+        companions_info='<div class="info-item"><strong>Acompañantes:</strong> 1 persona</div>',
+        qr_base64="data:image/png;base64,iVBORw0KGgo="
+    )
+
+
+def format_whatsapp(template: str, i: int) -> str:
+    """Renderizado anterior del WhatsApp"""
+    return template.format(
+        user_name=f"Usuario {i}", event_name="Congreso IEEE", event_date="14/03/2026 a las 18:00",
+        event_location="Auditorio", ticket_code=f"TCK-{i:06d}", ticket_url=f"https://ticket.example.org/ticket/{i}",
+        access_pin="123456", companions=1, companions_text="\n👥 *Acompañantes:* 1 persona"
+    )
+
+
+def render_email(event, i: int) -> str:
+    return template_service.render_email_template(
+        organization=None, user_name=f"Usuario {i}", event_name="Congreso IEEE",
+        event_date="14/03/2026 a las 18:00", event_location="Auditorio", ticket_code=f"TCK-{i:06d}",
+        ticket_url=f"https://ticket.example.org/ticket/{i}", access_pin="123456", companions=1,
+        qr_base64="data:image/png;base64,iVBORw0KGgo=", event=event
+    )
+
+
+def render_whatsapp(event, i: int) -> str:
+    return template_service.render_whatsapp_template(
+        organization=None, user_name=f"Usuario {i}", event_name="Congreso IEEE",
+        event_date="14/03/2026 a las 18:00", event_location="Auditorio", ticket_code=f"TCK-{i:06d}",
+        ticket_url=f"https://ticket.example.org/ticket/{i}", access_pin="123456", companions=1, event=event
+    )
+
+
+def measure(fn, renders: int) -> float:
+    start = time.perf_counter()
+    for i in range(renders):
+        fn(i)
+    return renders / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="str.format vs. templates compilados")
+    parser.add_argument("--renders", type=int, default=20000, help="Renderizados por escenario")
+    args = parser.parse_args()
+
+    # Template de evento: el predeterminado con un bloque extra, para que no coincida con el default
+    event = models.Event(id=1, name="Congreso IEEE")
+    event.email_template = TemplateService.DEFAULT_EMAIL_TEMPLATE.replace(
+        "<body>", "<body>\n    <p>Patrocina: Rama IEEE</p>"
+    ) * 3
+    event.whatsapp_template = TemplateService.DEFAULT_WHATSAPP_TEMPLATE + "\n\nPatrocina: Rama IEEE"
+
+    scenarios = [
+        ("Email predeterminado", TemplateService.DEFAULT_EMAIL_TEMPLATE, format_email, render_email, None),
+        ("Email de evento (3x)", event.email_template, format_email, render_email, event),
+        ("WhatsApp predeterminado", TemplateService.DEFAULT_WHATSAPP_TEMPLATE, format_whatsapp, render_whatsapp, None),
+        ("WhatsApp de evento", event.whatsapp_template, format_whatsapp, render_whatsapp, event),
+    ]
+
+    print("=" * 72)
+    print(f"BENCHMARK: {args.renders} renderizados por escenario")
+    print("=" * 72)
+    print(f"{'Escenario':<26} {'str.format':>14} {'Compilado':>14} {'Mejora':>8}")
+
+    for label, template, old, new, owner in scenarios:
+        for i in range(50):
+            if old(template, i) != new(owner, i):
+                print(f"[ERROR] {label}: el resultado difiere del renderizado anterior")
+                sys.exit(1)
+
+        old_rate = measure(lambda i: old(template, i), args.renders)
+        new_rate = measure(lambda i: new(owner, i), args.renders)
+        print(f"{label:<26} {old_rate:>10,.0f} r/s {new_rate:>10,.0f} r/s {new_rate / old_rate:>7.1f}x")
+
+    print("=" * 72)
+    print(f"Tamaño del email predeterminado: {len(TemplateService.DEFAULT_EMAIL_TEMPLATE):,} caracteres")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark: búsqueda de usuarios
+
+Genera usuarios sintéticos (nombres con tildes, emails, cédulas y teléfonos)
+en una base SQLite en memoria y compara user_search_service.search_users con
+la búsqueda anterior (ILIKE '%q%' sobre nombre, email, teléfono y cédula).
+
+Reporta la mediana y el p95 por búsqueda y sale con código 1 si el p95 del
+índice supera el objetivo (10 ms por defecto).
+
+Uso:
+    python benchmark_user_search.py [--sizes 10000,100000] [--repeat 30] [--target-ms 10]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from user_search_service import index_user_rows, search_users
+
+FIRST_NAMES = [
+    "Andrés", "María", "José", "Sofía", "Nicolás", "Valentina", "Sebastián", "Camila",
+    "Julián", "Daniela", "Santiago", "Mariana", "Tomás", "Lucía", "Matías", "Isabella",
+    "Felipe", "Gabriela", "Martín", "Natalia", "Simón", "Ángela", "Óscar", "Manuela"
+]
+LAST_NAMES = [
+    "Gómez", "Rodríguez", "Martínez", "López", "García", "Hernández", "Pérez", "Sánchez",
+    "Ramírez", "Torres", "Díaz", "Vargas", "Rojas", "Muñoz", "Castaño", "Peña",
+    "Jiménez", "Ortiz", "Suárez", "Cárdenas", "Beltrán", "Nariño", "Zúñiga", "Ospina"
+]
+
+
+def build_database(size: int, seed: int = 2026):
+    """Base en memoria con `size` usuarios indexados"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    rng = random.Random(seed)
+
+    batch = []
+    for i in range(size):
+        first = rng.choice(FIRST_NAMES)
+        last = f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+        batch.append({
+            "id": i + 1,
+            "name": f"{first} {last}",
+            "email": f"{first.lower()}.{i}@benchmark.co",
+            "country_code": "+57",
+            "phone": f"3{rng.randint(0, 99):02d} {rng.randint(0, 999):03d} {rng.randint(0, 9999):04d}",
+            "identification": str(1000000000 + i * 7919 % 900000000)
+        })
+        if len(batch) == 5000 or i == size - 1:
+            db.execute(insert(models.User), batch)
+            index_user_rows(db, [(values["id"], values) for values in batch])
+            db.commit()
+            batch = []
+
+    return engine, db
+
+
+def baseline_search(db, q: str, limit: int = 20):
+    """Búsqueda anterior de /users/search"""
+    search_term = f"%{q}%"
+    return db.query(models.User).filter(
+        or_(
+            models.User.name.ilike(search_term),
+            models.User.email.ilike(search_term),
+            models.User.phone.ilike(search_term),
+            models.User.identification.ilike(search_term)
+        )
+    ).limit(limit).all()
+
+
+def time_search(func, repeat: int):
+    """Ejecuta func `repeat` veces y retorna (resultado, mediana ms, p95 ms)"""
+    result = func()  # Calentar caché de páginas y sentencias
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return result, statistics.median(timings), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda de usuarios con índice vs ILIKE")
+    parser.add_argument("--sizes", default="10000,100000", help="Cantidades de usuarios separadas por coma")
+    parser.add_argument("--repeat", type=int, default=30, help="Repeticiones por búsqueda")
+    parser.add_argument("--target-ms", type=float, default=10.0, help="p95 máximo aceptado")
+    args = parser.parse_args()
+
+    failures = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        started = time.perf_counter()
+        engine, db = build_database(size)
+        tokens = db.query(models.UserSearchToken).count()
+        print(f"\n{size} usuarios ({tokens} palabras indexadas, {time.perf_counter() - started:.1f} s)")
+
+        sample = db.get(models.User, size // 2)
+        queries = [
+            ("nombre sin tilde", "andres"),
+            ("nombre y apellido", "maria lopez"),
+            ("orden inverso", "lopez maria"),
+            ("prefijo corto", "ma"),
+            ("usuario exacto", sample.name),
+            ("email", sample.email[:12]),
+            ("cédula", sample.identification),
+            ("teléfono con indicativo", f"+57 {sample.phone}"),
+            ("últimos dígitos", sample.phone.replace(" ", "")[-4:]),
+        ]
+
+        for label, q in queries:
+            found, median_ms, p95_ms = time_search(lambda: search_users(db, q), args.repeat)
+            _, base_median, base_p95 = time_search(lambda: baseline_search(db, q), max(3, args.repeat // 5))
+            print(
+                f"   {label:<24} {q[:28]!r:<32} índice: {median_ms:6.2f} ms (p95 {p95_ms:6.2f}) "
+                f"| ILIKE: {base_median:7.2f} ms (p95 {base_p95:7.2f}) | {len(found)} resultado(s)"
+            )
+            if p95_ms > args.target_ms:
+                failures.append(f"{size} usuarios / {label}: p95 {p95_ms:.2f} ms")
+            if q in (sample.name, sample.identification, f"+57 {sample.phone}") and sample.id not in [u.id for u in found]:
+                failures.append(f"{size} usuarios / {label}: no encontró al usuario {sample.id}")
+
+        db.close()
+        engine.dispose()
+
+    if failures:
+        print("\n[ERROR] Búsquedas fuera del objetivo:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+
+    print(f"\n[OK] Todas las búsquedas con p95 menor a {args.target_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: consultas del historial de validaciones
+
+Genera historiales de distinto tamaño en una base SQLite en memoria y verifica
+que validation_service.get_history use siempre la misma cantidad de consultas
+(sin N+1), tanto por evento como por validador y en páginas siguientes.
+
+Uso:
+    python benchmark_validation_history.py [--sizes 100,1000,5000] [--days 7]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from validation_service import validation_service
+
+
+def build_database(validations: int):
+    """Crea una base en memoria con un evento, validadores y `validations` validaciones exitosas"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    validators = [models.AdminUser(username=f"validador{i}", email=f"validador{i}@benchmark.co", full_name=f"Validador {i}", hashed_password="x", role=models.RoleEnum.VALIDATOR) for i in range(3)]
+    db.add_all(validators)
+    evt = models.Event(name="Evento benchmark", location="Auditorio", event_date=datetime(2026, 3, 1, 8, 0))
+    db.add(evt)
+    db.flush()
+
+    # Tickets diarios con varias entradas cada uno, repartidas en 30 días
+    ticket_count = max(1, validations // 5)
+    tickets = []
+    for i in range(ticket_count):
+        user = models.User(name=f"Usuario {i}", email=f"usuario{i}@benchmark.co")
+        db.add(user)
+        db.flush()
+        ticket = models.Ticket(
+            user_id=user.id, event_id=evt.id, ticket_code=f"code-{i}",
+            unique_url=f"url-{i}", access_pin=f"{i:06d}"[-6:], validation_mode="daily"
+        )
+        db.add(ticket)
+        tickets.append(ticket)
+    db.flush()
+
+    start = datetime(2026, 3, 1, 8, 0)
+    logs = []
+    for i in range(validations):
+        ticket = tickets[i % ticket_count]
+        logs.append({
+            "ticket_id": ticket.id,
+            "validator_id": validators[i % len(validators)].id,
+            "validated_at": start + timedelta(days=(i * 7) % 30, minutes=i % 600),
+            "success": True,
+            "notes": "Validación en modo daily"
+        })
+    db.execute(models.ValidationLog.__table__.insert(), logs)
+    db.commit()
+
+    return engine, db, evt.id, validators[0].id
+
+
+def count_queries(engine, func):
+    """Ejecuta func y retorna (resultado, consultas, ms)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    started = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return result, len(statements), elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas del historial de validaciones")
+    parser.add_argument("--sizes", default="100,1000,5000", help="Tamaños de historial separados por coma")
+    parser.add_argument("--days", type=int, default=7, help="Días por página")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    query_counts = {}
+
+    for size in sizes:
+        engine, db, event_id, validator_id = build_database(size)
+        db.expire_all()
+
+        by_event, event_queries, event_ms = count_queries(
+            engine, lambda: validation_service.get_history(db, event_id=event_id, days=args.days)
+        )
+        _, next_queries, next_ms = count_queries(
+            engine, lambda: validation_service.get_history(db, event_id=event_id, before=by_event["next_cursor"], days=args.days)
+        )
+        by_validator, validator_queries, validator_ms = count_queries(
+            engine, lambda: validation_service.get_history(db, validator_id=validator_id, days=args.days)
+        )
+
+        query_counts[size] = (event_queries, next_queries, validator_queries)
+        print(
+            f"{size:>6} validaciones | evento: {event_queries} consultas {event_ms:7.1f} ms "
+            f"({len(by_event['rows'])} filas) | página siguiente: {next_queries} consultas {next_ms:7.1f} ms "
+            f"| validador: {validator_queries} consultas {validator_ms:7.1f} ms ({len(by_validator['rows'])} filas)"
+        )
+
+        # El conteo por ticket debe coincidir con el orden de las validaciones
+        counts = {}
+        for row in sorted(by_event["rows"], key=lambda r: r[0].id):
+            val_log, validation_count = row[0], row[-1]
+            if val_log.ticket_id in counts and validation_count <= counts[val_log.ticket_id]:
+                print(f"\n[ERROR] Conteo por ticket no creciente en la validación {val_log.id}")
+                sys.exit(1)
+            counts[val_log.ticket_id] = validation_count
+
+        db.close()
+        engine.dispose()
+
+    if len(set(query_counts.values())) != 1:
+        print(f"\n[ERROR] La cantidad de consultas cambia con el tamaño del historial: {query_counts}")
+        sys.exit(1)
+
+    print(f"\n[OK] Cantidad de consultas constante: {query_counts[sizes[0]]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,20 @@
 Script para verificar cumpleanos y enviar correos de felicitacion
 
 Este script debe ejecutarse diariamente (por ejemplo, a las 8:00 AM)
-usando un cron job o similar.
+usando un cron job o similar. Los envios los hace birthday_dispatcher:
+cada felicitacion queda registrada por usuario y canal, asi que si el
+script se interrumpe basta con volver a ejecutarlo (no se reenvia lo que
+ya salio).
+
+Uso:
+    python birthday_checker.py                  # cumpleanos de hoy
+    python birthday_checker.py --catch-up       # tambien los dias que no se ejecuto (max. 7)
+    python birthday_checker.py --date 2026-03-14
+    python birthday_checker.py --concurrency 8
 """
 import sys
 import io
+import argparse
 from datetime import datetime
 from pathlib import Path
 
@@ -18,148 +28,83 @@ if sys.platform == 'win32':
 sys.path.insert(0, str(Path(__file__).parent))
 
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import SessionLocal, engine
 import models
-from email_service import email_service
-from whatsapp_client import send_birthday_whatsapp, WhatsAppClient
+from birthday_dispatcher import (
+    BirthdayDispatcher, catch_up_days, BIRTHDAY_CATCH_UP_MAX_DAYS, BIRTHDAY_DISPATCH_CONCURRENCY
+)
+from timezone_utils import get_bogota_now_naive
 
 
-def check_and_send_birthday_emails(execution_type="automatic"):
+def check_and_send_birthday_emails(execution_type="automatic", catch_up=False, day=None,
+                                   concurrency=BIRTHDAY_DISPATCH_CONCURRENCY):
     """
     Verifica los cumpleanos del dia actual y envia correos y WhatsApp de felicitacion
 
     Args:
         execution_type: "automatic" o "manual" para indicar el tipo de ejecucion
+        catch_up: tambien procesar los dias sin ejecucion (hasta BIRTHDAY_CATCH_UP_MAX_DAYS)
+        day: fecha a procesar en lugar de hoy (date)
+        concurrency: envios simultaneos
     """
     db: Session = SessionLocal()
 
-    # Verificar si WhatsApp esta disponible
-    whatsapp_client = WhatsAppClient()
-    whatsapp_available = whatsapp_client.is_ready()
+    dispatcher = BirthdayDispatcher(concurrency=concurrency)
 
     # Inicializar log de ejecucion
     log_entry = models.BirthdayCheckLog(
         executed_at=datetime.now(),
-        whatsapp_available=whatsapp_available,
+        whatsapp_available=dispatcher.whatsapp_available,
         execution_type=execution_type
     )
 
     try:
-        # Obtener la fecha de hoy (solo mes y día, ignorar año)
-        today = datetime.now()
-        today_month = today.month
-        today_day = today.day
+        # Obtener la fecha de hoy en Bogotá (solo mes y día, ignorar año)
+        today = day or get_bogota_now_naive().date()
+        days = catch_up_days(db, today) if catch_up else [today]
 
         print(f"=== Verificador de Cumpleanos - {today.strftime('%Y-%m-%d')} ===")
-        print(f"WhatsApp: {'[OK] Disponible' if whatsapp_available else '[X] No disponible'}")
-        print(f"Buscando usuarios con cumpleanos en {today.strftime('%d/%m')}...")
-
-        # Buscar usuarios que cumplan anos hoy
-        # Filtramos por mes y dia, sin importar el ano
-        users = db.query(models.User).filter(
-            models.User.birthday.isnot(None)
-        ).all()
+        print(f"WhatsApp: {'[OK] Disponible' if dispatcher.whatsapp_available else '[X] No disponible'}")
+        print(f"Buscando usuarios con cumpleanos en {', '.join(d.strftime('%d/%m') for d in days)}...")
+        print("-" * 60)
 
-        birthday_users = []
-        for user in users:
-            if user.birthday and user.birthday.month == today_month and user.birthday.day == today_day:
-                birthday_users.append(user)
+        summary = dispatcher.run(days)
 
-        if not birthday_users:
+        if not summary["birthdays_found"]:
             print("No hay cumpleanos hoy.")
-            print("=" * 60)
-
-            # Guardar log de ejecucion (sin cumpleanos)
-            log_entry.birthdays_found = 0
-            db.add(log_entry)
-            db.commit()
-
-            return
-
-        print(f"\nEncontrados {len(birthday_users)} cumpleanos hoy:")
-        print("-" * 60)
-
-        # Enviar correos y WhatsApp de cumpleanos
-        email_sent_count = 0
-        email_failed_count = 0
-        whatsapp_sent_count = 0
-        whatsapp_failed_count = 0
-
-        for user in birthday_users:
-            # Calcular la edad si tenemos el ano de nacimiento
-            age = today.year - user.birthday.year if user.birthday else None
-            age_str = f" ({age} anos)" if age else ""
-
-            print(f"\n>> Enviando felicitaciones a:")
-            print(f"   Nombre: {user.name}{age_str}")
-            print(f"   Email: {user.email}")
-            if user.phone and user.country_code:
-                print(f"   WhatsApp: {user.country_code}{user.phone}")
-
-            # 1. Enviar correo
-            try:
-                success = email_service.send_birthday_email(
-                    to_email=user.email,
-                    user_name=user.name
-                )
-
-                if success:
-                    print(f"   [OK] Correo enviado exitosamente")
-                    email_sent_count += 1
-                else:
-                    print(f"   [ERROR] Error al enviar correo")
-                    email_failed_count += 1
-
-            except Exception as e:
-                print(f"   [ERROR] Error en correo: {str(e)}")
-                email_failed_count += 1
-
-            # 2. Enviar WhatsApp (solo si está disponible y el usuario tiene teléfono)
-            if whatsapp_available and user.phone and user.country_code:
-                try:
-                    success = send_birthday_whatsapp(
-                        phone=user.phone,
-                        country_code=user.country_code,
-                        user_name=user.name
-                    )
-
-                    if success:
-                        whatsapp_sent_count += 1
-                    else:
-                        whatsapp_failed_count += 1
-
-                except Exception as e:
-                    print(f"   [ERROR] Error en WhatsApp: {str(e)}")
-                    whatsapp_failed_count += 1
-            elif not user.phone or not user.country_code:
-                print(f"   [SKIP] Usuario sin numero de telefono")
-            elif not whatsapp_available:
-                print(f"   [SKIP] WhatsApp no disponible")
 
         # Resumen
         print("\n" + "=" * 60)
         print("RESUMEN:")
-        print(f"  Total de cumpleanos: {len(birthday_users)}")
+        print(f"  Total de cumpleanos: {summary['birthdays_found']}")
+        print(f"  Ya felicitados en ejecuciones anteriores: {summary['already_sent']}")
         print(f"\n  CORREOS:")
-        print(f"    Enviados: {email_sent_count}")
-        print(f"    Errores: {email_failed_count}")
+        print(f"    Enviados: {summary['sent']['email']}")
+        print(f"    Errores: {summary['failed']['email']}")
         print(f"\n  WHATSAPP:")
-        print(f"    Enviados: {whatsapp_sent_count}")
-        print(f"    Errores: {whatsapp_failed_count}")
+        print(f"    Enviados: {summary['sent']['whatsapp']}")
+        print(f"    Errores: {summary['failed']['whatsapp']}")
+        if summary["pending"]:
+            print(f"\n  Pendientes para la proxima ejecucion: {summary['pending']}")
         print("=" * 60)
 
         # Actualizar y guardar log de ejecucion
-        log_entry.birthdays_found = len(birthday_users)
-        log_entry.emails_sent = email_sent_count
-        log_entry.emails_failed = email_failed_count
-        log_entry.whatsapp_sent = whatsapp_sent_count
-        log_entry.whatsapp_failed = whatsapp_failed_count
-        log_entry.notes = f"Procesados {len(birthday_users)} cumpleaños"
+        log_entry.birthdays_found = summary["birthdays_found"]
+        log_entry.emails_sent = summary["sent"]["email"]
+        log_entry.emails_failed = summary["failed"]["email"]
+        log_entry.whatsapp_sent = summary["sent"]["whatsapp"]
+        log_entry.whatsapp_failed = summary["failed"]["whatsapp"]
+        log_entry.notes = (
+            f"Procesados {summary['birthdays_found']} cumpleaños ({', '.join(summary['days'])}); "
+            f"{summary['already_sent']} ya felicitados, {summary['pending']} pendientes"
+        )
 
         db.add(log_entry)
         db.commit()
         print(f"\n[LOG] Ejecucion registrada en base de datos (ID: {log_entry.id})")
 
+        return summary
+
     except Exception as e:
         print(f"[ERROR] Error general: {str(e)}")
 
@@ -177,5 +122,19 @@ def check_and_send_birthday_emails(execution_type="automatic"):
         db.close()
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Envía las felicitaciones de cumpleaños")
+    parser.add_argument("--catch-up", action="store_true",
+                        help=f"Procesar también los días sin ejecución (máximo {BIRTHDAY_CATCH_UP_MAX_DAYS})")
+    parser.add_argument("--date", help="Procesar esta fecha (YYYY-MM-DD) en lugar de hoy")
+    parser.add_argument("--concurrency", type=int, default=BIRTHDAY_DISPATCH_CONCURRENCY, help="Envíos simultáneos")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+
+    day = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else None
+    check_and_send_birthday_emails(catch_up=args.catch_up, day=day, concurrency=args.concurrency)
+
+
 if __name__ == "__main__":
-    check_and_send_birthday_emails()
+    main()
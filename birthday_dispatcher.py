@@ -0,0 +1,243 @@
+"""
+Envío de felicitaciones de cumpleaños
+
+Cada felicitación es una fila de birthday_deliveries (usuario, canal, día)
+con su estado. Para cada día el despachador:
+  1. crea las filas que falten para los cumpleañeros del día
+  2. envía las pendientes, email y WhatsApp en paralelo con un pool acotado
+  3. guarda el resultado de cada envío apenas termina
+
+Si el proceso se interrumpe, volver a ejecutarlo solo envía lo que quedó
+pendiente o falló (hasta BIRTHDAY_MAX_ATTEMPTS intentos): la llave única
+(user_id, channel, greeting_date) impide felicitar dos veces el mismo día.
+Cada envío se reclama con un UPDATE condicional, así que dos ejecuciones
+simultáneas (tarea programada y "verificar ahora") no se pisan.
+
+Con catch_up_days también se procesan los días en los que la tarea
+programada no se ejecutó.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from birthday_utils import get_birthday_users
+from database import SessionLocal
+from email_service import email_service
+from timezone_utils import get_bogota_now_naive
+from whatsapp_client import get_whatsapp_client, send_birthday_whatsapp
+
+BIRTHDAY_DISPATCH_CONCURRENCY = int(os.getenv("BIRTHDAY_DISPATCH_CONCURRENCY", "4"))
+BIRTHDAY_MAX_ATTEMPTS = int(os.getenv("BIRTHDAY_MAX_ATTEMPTS", "3"))
+
+# Días hacia atrás que revisa el modo catch-up como máximo
+BIRTHDAY_CATCH_UP_MAX_DAYS = 7
+
+# Un envío "sending" más viejo que esto quedó de un proceso interrumpido
+BIRTHDAY_SENDING_STALE_AFTER = timedelta(minutes=10)
+
+CHANNELS = ("email", "whatsapp")
+
+
+def _channels_for(user: models.User) -> List[str]:
+    channels = ["email"] if user.email else []
+    if user.phone and user.country_code:
+        channels.append("whatsapp")
+    return channels
+
+
+def _claimable(now: datetime):
+    """Envíos que se pueden (re)intentar"""
+    delivery = models.BirthdayDelivery
+    return or_(
+        delivery.status == "pending",
+        and_(delivery.status == "failed", delivery.attempts < BIRTHDAY_MAX_ATTEMPTS),
+        and_(delivery.status == "sending", delivery.locked_at < now - BIRTHDAY_SENDING_STALE_AFTER)
+    )
+
+
+def ensure_deliveries(db: Session, day: date, users: List[models.User]) -> int:
+    """Crea las filas de envío que falten para los cumpleañeros del día. Retorna cuántas creó."""
+    delivery = models.BirthdayDelivery
+    existing = set(db.query(delivery.user_id, delivery.channel).filter(delivery.greeting_date == day).all())
+    now = get_bogota_now_naive()
+    rows = [
+        {"user_id": user.id, "channel": channel, "greeting_date": day,
+         "status": "pending", "attempts": 0, "created_at": now}
+        for user in users
+        for channel in _channels_for(user)
+        if (user.id, channel) not in existing
+    ]
+    if not rows:
+        return 0
+
+    try:
+        db.execute(insert(delivery), rows)
+        db.commit()
+        return len(rows)
+    except IntegrityError:
+        # Otra ejecución creó algunas al mismo tiempo: insertar las que falten una a una
+        db.rollback()
+        created = 0
+        for row in rows:
+            try:
+                db.execute(insert(delivery), [row])
+                db.commit()
+                created += 1
+            except IntegrityError:
+                db.rollback()
+        return created
+
+
+def catch_up_days(db: Session, today: date, max_days: int = BIRTHDAY_CATCH_UP_MAX_DAYS) -> List[date]:
+    """
+    Días a procesar en modo catch-up: desde el día siguiente a la última
+    ejecución registrada (máximo `max_days` atrás) hasta hoy, más los días
+    recientes con envíos sin terminar.
+    """
+    first = today - timedelta(days=max_days)
+    last_run = db.query(func.max(models.BirthdayCheckLog.executed_at)).filter(
+        models.BirthdayCheckLog.executed_at < datetime.combine(today, time.min)
+    ).scalar()
+    start = max(first, last_run.date() + timedelta(days=1)) if last_run else today
+
+    days = {start + timedelta(days=offset) for offset in range((today - start).days + 1)}
+
+    unfinished = db.query(models.BirthdayDelivery.greeting_date).filter(
+        models.BirthdayDelivery.greeting_date >= first,
+        models.BirthdayDelivery.greeting_date < today,
+        _claimable(get_bogota_now_naive())
+    ).distinct().all()
+    days.update(greeting_date for (greeting_date,) in unfinished)
+
+    return sorted(days)
+
+
+class BirthdayDispatcher:
+    """Envía las felicitaciones pendientes de uno o varios días"""
+
+    def __init__(self, concurrency: int = BIRTHDAY_DISPATCH_CONCURRENCY, whatsapp_available: Optional[bool] = None):
+        self.concurrency = max(1, concurrency)
+        if whatsapp_available is None:
+            whatsapp_available = get_whatsapp_client().is_ready()
+        self.whatsapp_available = whatsapp_available
+
+    def run(self, days: List[date]) -> Dict:
+        """
+        Procesa los días dados.
+
+        Returns:
+            Dict con birthdays_found, sent/failed por canal en esta ejecución,
+            already_sent (felicitaciones de ejecuciones anteriores) y pending
+            (por ejemplo WhatsApp no disponible)
+        """
+        summary = {
+            "days": [day.isoformat() for day in days],
+            "birthdays_found": 0,
+            "sent": {channel: 0 for channel in CHANNELS},
+            "failed": {channel: 0 for channel in CHANNELS},
+            "already_sent": 0,
+            "pending": 0
+        }
+
+        delivery_ids = []
+        db = SessionLocal()
+        try:
+            for day in days:
+                users = get_birthday_users(db, today=day)
+                summary["birthdays_found"] += len(users)
+                if not users:
+                    continue
+                ensure_deliveries(db, day, users)
+                delivery_ids.extend(self._pending_ids(db, day))
+
+            summary["already_sent"] = db.query(func.count(models.BirthdayDelivery.id)).filter(
+                models.BirthdayDelivery.greeting_date.in_(days),
+                models.BirthdayDelivery.status == "sent"
+            ).scalar() or 0
+        finally:
+            db.close()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for result in pool.map(self._send, delivery_ids):
+                if result is None:
+                    continue
+                channel, success = result
+                summary["sent" if success else "failed"][channel] += 1
+
+        db = SessionLocal()
+        try:
+            summary["pending"] = db.query(func.count(models.BirthdayDelivery.id)).filter(
+                models.BirthdayDelivery.greeting_date.in_(days),
+                models.BirthdayDelivery.status == "pending"
+            ).scalar() or 0
+        finally:
+            db.close()
+
+        return summary
+
+    def _pending_ids(self, db: Session, day: date) -> List[int]:
+        query = db.query(models.BirthdayDelivery.id).filter(
+            models.BirthdayDelivery.greeting_date == day,
+            _claimable(get_bogota_now_naive())
+        )
+        if not self.whatsapp_available:
+            # Quedan pendientes para una próxima ejecución
+            query = query.filter(models.BirthdayDelivery.channel != "whatsapp")
+        return [delivery_id for (delivery_id,) in query.order_by(models.BirthdayDelivery.id).all()]
+
+    def _send(self, delivery_id: int) -> Optional[Tuple[str, bool]]:
+        """Reclama y envía una felicitación con su propia sesión. None si otra ejecución la tomó."""
+        db = SessionLocal()
+        try:
+            now = get_bogota_now_naive()
+            claimed = db.query(models.BirthdayDelivery).filter(
+                models.BirthdayDelivery.id == delivery_id,
+                _claimable(now)
+            ).update({
+                "status": "sending",
+                "locked_at": now,
+                "attempts": models.BirthdayDelivery.attempts + 1
+            }, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                return None
+
+            delivery = db.get(models.BirthdayDelivery, delivery_id)
+            user = delivery.user
+            try:
+                success, error = self._deliver(delivery.channel, user)
+            except Exception as e:
+                success, error = False, str(e)
+
+            delivery.status = "sent" if success else "failed"
+            delivery.error = None if success else (error or "Error desconocido")[:500]
+            delivery.sent_at = get_bogota_now_naive() if success else None
+            db.commit()
+
+            label = "Correo" if delivery.channel == "email" else "WhatsApp"
+            if success:
+                print(f"   [OK] {label} a {user.name}")
+            else:
+                print(f"   [ERROR] {label} a {user.name}: {delivery.error}")
+            return delivery.channel, success
+        finally:
+            db.close()
+
+    def _deliver(self, channel: str, user: models.User) -> Tuple[bool, Optional[str]]:
+        if channel == "email":
+            success = email_service.send_birthday_email(to_email=user.email, user_name=user.name, nick=user.nick)
+            return success, None if success else "Error al enviar correo"
+
+        success = send_birthday_whatsapp(
+            phone=user.phone,
+            country_code=user.country_code,
+            user_name=user.name,
+            nick=user.nick
+        )
+        return success, None if success else "Error al enviar WhatsApp"
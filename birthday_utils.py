@@ -1,8 +1,22 @@
 """
 Utilidades para manejo de cumpleaños
+
+Las consultas por fecha usan las columnas users.birthday_month y
+users.birthday_day (generadas por la base de datos e indexadas), así que
+"hoy", "próximos N días" y "este mes" leen solo los usuarios que coinciden.
 """
-from datetime import datetime, date
-from typing import Optional
+import threading
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, event, inspect, or_
+from sqlalchemy.orm import Session
+
+import models
+from timezone_utils import get_bogota_now_naive
+
+# Campos de User que aparecen en el calendario del portal
+CALENDAR_FIELDS = ('birthday', 'name', 'photo_path', 'academic_program_id')
 
 
 def calculate_days_until_birthday(birthday: Optional[datetime]) -> Optional[int]:
@@ -80,3 +94,123 @@ def get_birthday_status(birthday: Optional[datetime]) -> dict:
         "is_this_month": days_until is not None and 0 <= days_until <= 30,
         "date_str": date_str
     }
+
+
+def birthday_window_filter(days_ahead: int = 0, today: Optional[date] = None):
+    """
+    Condición para los cumpleaños de hoy a `days_ahead` días adelante.
+
+    Es un rango del índice (mes, día) por cada mes que cubre la ventana, por
+    ejemplo del 28 de diciembre a 7 días:
+        (mes = 12 AND día BETWEEN 28 AND 31) OR (mes = 1 AND día BETWEEN 1 AND 4)
+
+    Args:
+        days_ahead: días hacia adelante (0 = solo hoy)
+        today: fecha de referencia (por defecto, hoy en Bogotá)
+    """
+    today = today or get_bogota_now_naive().date()
+    end = today + timedelta(days=min(max(days_ahead, 0), 365))
+
+    ranges = []
+    current = today
+    while current <= end:
+        next_month = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        last = min(end, next_month - timedelta(days=1))
+        ranges.append(and_(
+            models.User.birthday_month == current.month,
+            models.User.birthday_day.between(current.day, last.day)
+        ))
+        current = last + timedelta(days=1)
+    return or_(*ranges)
+
+
+def birthday_month_filter(month: Optional[int] = None):
+    """Condición para los cumpleaños de un mes (por defecto, el mes actual en Bogotá)"""
+    return models.User.birthday_month == (month or get_bogota_now_naive().month)
+
+
+def get_birthday_users(db: Session, days_ahead: int = 0, today: Optional[date] = None) -> List[models.User]:
+    """Usuarios que cumplen años de hoy a `days_ahead` días adelante"""
+    return db.query(models.User).filter(
+        birthday_window_filter(days_ahead, today)
+    ).order_by(
+        models.User.birthday_month, models.User.birthday_day, models.User.id
+    ).all()
+
+
+# ============================================================
+# CALENDARIO DEL PORTAL
+# ============================================================
+
+# El calendario se arma una vez por día (Bogotá) y por proceso; se descarta
+# antes si cambia el cumpleaños, nombre, foto o programa de algún usuario
+_calendar_cache = {"day": None, "data": None, "generation": 0}
+_calendar_lock = threading.Lock()
+
+
+def invalidate_birthday_calendar():
+    with _calendar_lock:
+        _calendar_cache["data"] = None
+        _calendar_cache["generation"] += 1
+
+
+def _load_birthday_calendar(db: Session) -> List[Dict]:
+    rows = db.query(
+        models.User.name,
+        models.User.photo_path,
+        models.User.birthday_month,
+        models.User.birthday_day,
+        models.AcademicProgram.name
+    ).outerjoin(
+        models.AcademicProgram, models.User.academic_program_id == models.AcademicProgram.id
+    ).filter(
+        models.User.birthday_month.isnot(None)
+    ).order_by(
+        models.User.birthday_month, models.User.birthday_day, models.User.id
+    ).all()
+
+    return [
+        {
+            "name": name,
+            "photo_path": photo_path,
+            "month": month,
+            "day": day,
+            "academic_program": program_name,
+        }
+        for name, photo_path, month, day, program_name in rows
+    ]
+
+
+def get_birthday_calendar(db: Session) -> List[Dict]:
+    """
+    Cumpleaños de todos los miembros con fecha registrada, ordenados por mes y
+    día. Se guarda en memoria hasta la medianoche de Bogotá.
+    """
+    today = get_bogota_now_naive().date()
+    with _calendar_lock:
+        if _calendar_cache["day"] == today and _calendar_cache["data"] is not None:
+            return _calendar_cache["data"]
+        generation = _calendar_cache["generation"]
+
+    data = _load_birthday_calendar(db)
+
+    with _calendar_lock:
+        # Si se invalidó mientras se consultaba, no guardar datos viejos
+        if _calendar_cache["generation"] == generation:
+            _calendar_cache["day"] = today
+            _calendar_cache["data"] = data
+    return data
+
+
+@event.listens_for(models.User, "after_insert")
+@event.listens_for(models.User, "after_delete")
+def _user_added_or_removed(mapper, connection, target):
+    if target.birthday is not None:
+        invalidate_birthday_calendar()
+
+
+@event.listens_for(models.User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in CALENDAR_FIELDS):
+        invalidate_birthday_calendar()
@@ -0,0 +1,218 @@
+"""
+Handlers de los trabajos de envío masivo
+
+Cada handler procesa una DeliveryTask (un destinatario por canal) y retorna
+(éxito, error); los emails de campaña se procesan por lotes (una llamada al
+proveedor para muchos destinatarios) y retornan un resultado por tarea. Las
+actualizaciones de destinatarios y contadores se hacen en la sesión recibida;
+job_queue confirma todo junto con el estado de las tareas.
+"""
+import base64
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session, joinedload
+
+import models
+from email_service import email_service
+from job_queue import register_batch_handler, register_handler
+from timezone_utils import get_bogota_now_naive
+
+
+@lru_cache(maxsize=8)
+def _image_bytes(image_path: str) -> Optional[bytes]:
+    """Lee la imagen de la campaña una sola vez por proceso"""
+    try:
+        with open(image_path, "rb") as f:
+            return f.read()
+    except OSError as e:
+        print(f"[JOBS] No se pudo leer la imagen {image_path}: {str(e)}")
+        return None
+
+
+@lru_cache(maxsize=8)
+def _image_data_url(image_path: str) -> Optional[str]:
+    """Imagen de la campaña como data URL (para WhatsApp)"""
+    image = _image_bytes(image_path)
+    if image is None:
+        return None
+    return f"data:image/jpeg;base64,{base64.b64encode(image).decode('utf-8')}"
+
+
+@lru_cache(maxsize=8)
+def _campaign_email(job_id: int, payload_json: str):
+    """Correo de la campaña compilado una vez por trabajo (ver email_service.CampaignEmail)"""
+    payload = json.loads(payload_json or "{}")
+    return email_service.compile_campaign(
+        subject=payload["subject"],
+        message=payload["message"],
+        link=payload.get("link"),
+        link_text=payload.get("link_text"),
+        image=_image_bytes(payload["image_path"]) if payload.get("image_path") else None
+    )
+
+
+def _get_recipient(db: Session, recipient_id: int) -> models.MessageRecipient:
+    recipient = db.query(models.MessageRecipient).options(
+        joinedload(models.MessageRecipient.user)
+    ).filter(models.MessageRecipient.id == recipient_id).first()
+    if not recipient:
+        raise ValueError(f"Destinatario {recipient_id} no encontrado")
+    return recipient
+
+
+def _increment_campaign(db: Session, campaign_id: int, column, amount: int = 1):
+    """Incrementa un contador de la campaña con UPDATE atómico (varios hilos la actualizan)"""
+    if not amount:
+        return
+    db.execute(
+        update(models.MessageCampaign).where(
+            models.MessageCampaign.id == campaign_id
+        ).values({column: column + amount})
+    )
+
+
+def _display_name(user: models.User) -> str:
+    return user.nick if user.nick else user.name.split()[0]
+
+
+@register_batch_handler("campaign", "email")
+def send_campaign_emails(db: Session, job: models.DeliveryJob, tasks: List[models.DeliveryTask], payload: Dict) -> Dict[int, Tuple[bool, Optional[str]]]:
+    """Envía el email de una campaña a varios destinatarios con el transporte por lotes"""
+    recipients = {
+        recipient.id: recipient
+        for recipient in db.query(models.MessageRecipient).options(
+            joinedload(models.MessageRecipient.user)
+        ).filter(models.MessageRecipient.id.in_([task.target_id for task in tasks])).all()
+    }
+    campaign_email = _campaign_email(job.id, job.payload)
+
+    results: Dict[int, Tuple[bool, Optional[str]]] = {}
+    messages = []
+    for task in tasks:
+        recipient = recipients.get(task.target_id)
+        if not recipient:
+            results[task.id] = (False, f"Destinatario {task.target_id} no encontrado")
+            continue
+        try:
+            messages.append((task.id, campaign_email.build(recipient.user.email, _display_name(recipient.user))))
+        except Exception as e:
+            results[task.id] = (False, str(e))
+
+    # La llave de idempotencia evita duplicados si se reintenta una llamada que sí salió
+    sent = email_service.send_batch(messages, idempotency_prefix=f"campaign-{job.campaign_id}-job-{job.id}")
+    for task_id, result in sent.items():
+        results[task_id] = (result["success"], None if result["success"] else result["error"] or "Email sending failed")
+
+    now = get_bogota_now_naive()
+    tasks_by_id = {task.id: task for task in tasks}
+    for task_id, (success, error) in results.items():
+        recipient = recipients.get(tasks_by_id[task_id].target_id)
+        if not recipient:
+            continue
+        if not success:
+            print(f"[ERROR] Email to {recipient.user.email}: {error}")
+        recipient.email_sent = success
+        recipient.email_sent_at = now if success else None
+        recipient.email_error = error and error[:500]
+
+    sent_count = sum(1 for success, _ in results.values() if success)
+    _increment_campaign(db, job.campaign_id, models.MessageCampaign.emails_sent, sent_count)
+    _increment_campaign(db, job.campaign_id, models.MessageCampaign.emails_failed, len(results) - sent_count)
+
+    return results
+
+
+@register_handler("campaign", "whatsapp")
+def send_campaign_whatsapp(db: Session, job: models.DeliveryJob, task: models.DeliveryTask, payload: Dict) -> Tuple[bool, Optional[str]]:
+    """Envía el WhatsApp de una campaña (template o mensaje libre) a un destinatario"""
+    from whatsapp_client import send_bulk_whatsapp, get_whatsapp_client
+
+    recipient = _get_recipient(db, task.target_id)
+    user = recipient.user
+    display_name = _display_name(user)
+    result = None
+
+    try:
+        whatsapp_client = get_whatsapp_client()
+        if not whatsapp_client.is_ready():
+            result = {"success": False, "error": "WhatsApp service not ready"}
+        elif payload.get("whatsapp_message_type") == "template" and payload.get("whatsapp_template"):
+            # Primera variable: nombre del usuario (auto); siguientes: valores manuales
+            template_variables = [display_name] + payload.get("template_vars", [])
+            result = whatsapp_client.send_template_message(
+                phone=user.phone,
+                template_name=payload["whatsapp_template"],
+                language="es_MX",
+                variables=template_variables,
+                country_code=user.country_code,
+                header_image_link=payload.get("template_image_url") or None
+            )
+        else:
+            image_url = _image_data_url(payload["image_path"]) if payload.get("image_path") else None
+            result = send_bulk_whatsapp(
+                phone=user.phone,
+                country_code=user.country_code,
+                user_name=display_name,
+                subject=payload["subject"],
+                message=payload["message"].replace("{nombre}", display_name),
+                link=payload.get("link"),
+                image_base64=image_url
+            )
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+        print(f"[ERROR] WhatsApp to {user.phone}: {str(e)}")
+
+    if result and result.get("success"):
+        recipient.whatsapp_sent = True
+        recipient.whatsapp_sent_at = get_bogota_now_naive()
+        recipient.whatsapp_message_id = result.get("message_id") or result.get("messageId")
+        recipient.whatsapp_status = "pending"
+        _increment_campaign(db, job.campaign_id, models.MessageCampaign.whatsapp_sent)
+        return True, None
+
+    # Asegurar que el error sea string (puede venir como dict)
+    error_value = result.get("error", "Unknown error") if result else "No result"
+    if isinstance(error_value, dict):
+        error_value = json.dumps(error_value)
+    recipient.whatsapp_sent = False
+    recipient.whatsapp_error = str(error_value)[:500]
+    _increment_campaign(db, job.campaign_id, models.MessageCampaign.whatsapp_failed)
+    return False, recipient.whatsapp_error
+
+
+@register_handler("event_tickets_whatsapp", "whatsapp")
+def send_event_ticket_whatsapp(db: Session, job: models.DeliveryJob, task: models.DeliveryTask, payload: Dict) -> Tuple[bool, Optional[str]]:
+    """Envía un ticket de evento por WhatsApp"""
+    from whatsapp_client import send_ticket_whatsapp
+
+    ticket = db.query(models.Ticket).options(
+        joinedload(models.Ticket.user),
+        joinedload(models.Ticket.event).joinedload(models.Event.organization)
+    ).filter(models.Ticket.id == task.target_id).first()
+    if not ticket:
+        return False, "Ticket no encontrado"
+
+    user = ticket.user
+    event = ticket.event
+    if not user.phone or not user.country_code:
+        return False, f"{user.name}: Sin número de teléfono"
+
+    success = send_ticket_whatsapp(
+        phone=user.phone,
+        country_code=user.country_code,
+        user_name=user.name,
+        event_name=event.name,
+        event_location=event.location,
+        event_date=event.event_date.strftime('%d/%m/%Y a las %H:%M'),
+        ticket_code=ticket.ticket_code,
+        ticket_url=f"{payload['base_url']}/ticket/{ticket.unique_url}",
+        access_pin=ticket.access_pin,
+        companions=ticket.companions or 0,
+        organization=event.organization,
+        event=event
+    )
+
+    return success, None if success else f"{user.name}: Error al enviar mensaje"
@@ -1,8 +1,35 @@
 """
 Servicio para envío de correos electrónicos usando Resend
+
+Los envíos pasan por EmailTransport:
+  - los correos sin adjuntos se agrupan en llamadas a /emails/batch de hasta
+    EMAIL_BATCH_SIZE correos (el límite de Resend es 100)
+  - los que llevan adjuntos (QR del ticket, imagen de campaña) van uno por
+    llamada, porque el endpoint batch de Resend no acepta adjuntos, pero en
+    paralelo (EMAIL_SEND_CONCURRENCY) en lugar de uno tras otro
+  - las llamadas se espacian a EMAIL_API_REQUESTS_PER_SECOND (límite de la cuenta)
+  - solo se reintentan los errores transitorios (429, 5xx, red), y solo de los
+    correos que fallaron; un lote rechazado entero por un correo inválido se
+    reenvía correo por correo para aislarlo
+  - cada resultado vuelve con la llave que le dio el llamador (id del
+    destinatario o del ticket)
+
+El backend es intercambiable: Resend (con RESEND_API_KEY), consola (sin API
+key, simula los envíos) o SMTP (EMAIL_BACKEND=smtp://localhost:1025, para un
+sink local como Mailpit). Para probar contra un sink HTTP que imite la API de
+Resend basta con RESEND_API_URL. Ver benchmark_email_transport.py.
 """
+import hashlib
 import os
-from typing import Optional
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.message import EmailMessage
+from email.utils import make_msgid
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
 from datetime import datetime
 from dotenv import load_dotenv
 import resend
@@ -13,6 +40,266 @@ from template_service import template_service
 # Cargar variables de entorno desde .env
 load_dotenv()
 
+EMAIL_BATCH_SIZE = min(int(os.getenv("EMAIL_BATCH_SIZE", "100")), 100)
+EMAIL_SEND_CONCURRENCY = int(os.getenv("EMAIL_SEND_CONCURRENCY", "4"))
+EMAIL_API_REQUESTS_PER_SECOND = float(os.getenv("EMAIL_API_REQUESTS_PER_SECOND", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "3"))
+
+# Espera antes del primer reintento (se duplica en cada intento)
+EMAIL_RETRY_BASE_SECONDS = 1.0
+
+# Códigos con los que el proveedor rechaza un lote por validación (se reintenta correo por correo)
+EMAIL_VALIDATION_STATUSES = (400, 422)
+
+# Hueco del nombre del destinatario en los correos de campaña compilados
+NAME_SLOT = "\x00nombre\x00"
+
+
+class EmailSendError(Exception):
+    """
+    Error de un backend de correo; `retryable` indica si vale la pena
+    reintentar y `status` es el código HTTP del proveedor, si lo hay
+    """
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None,
+                 status: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.status = status
+
+
+def _html_to_text(html_content: str) -> str:
+    return re.sub('<[^<]+?>', '', html_content)
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+
+class ResendBackend:
+    """API de Resend (RESEND_API_URL permite apuntarla a un sink HTTP local)"""
+
+    name = "resend"
+
+    def __init__(self, api_key: str):
+        resend.api_key = api_key
+
+    def send(self, params: Dict, idempotency_key: Optional[str] = None) -> str:
+        options = {"idempotency_key": idempotency_key} if idempotency_key else None
+        try:
+            response = resend.Emails.send(params, options)
+        except Exception as e:
+            raise self._error(e)
+        return response.get('id', 'N/A')
+
+    def send_batch(self, params_list: List[Dict], idempotency_key: Optional[str] = None) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Envía hasta 100 correos en una llamada. Retorna (id, error) por correo,
+        en el mismo orden. En modo "permissive" Resend envía los válidos y
+        reporta los inválidos por índice.
+        """
+        options = {"batch_validation": "permissive"}
+        if idempotency_key:
+            options["idempotency_key"] = idempotency_key
+        try:
+            response = resend.Batch.send(params_list, options)
+        except Exception as e:
+            raise self._error(e)
+
+        errors = {item["index"]: item.get("message") or "Rechazado por Resend" for item in response.get("errors") or []}
+        ids = iter(item.get("id") for item in response.get("data") or [])
+        return [(None, errors[index]) if index in errors else (next(ids, None), None) for index in range(len(params_list))]
+
+    @staticmethod
+    def _error(e: Exception) -> EmailSendError:
+        code = getattr(e, "code", None)
+        try:
+            code = int(code)
+        except (TypeError, ValueError):
+            code = None
+        # Sin código HTTP es un error de red o del cliente: se puede reintentar
+        retryable = code is None or code == 429 or code >= 500
+        retry_after = None
+        headers = {k.lower(): v for k, v in (getattr(e, "headers", None) or {}).items()}
+        if headers.get("retry-after"):
+            try:
+                retry_after = float(headers["retry-after"])
+            except ValueError:
+                pass
+        return EmailSendError(str(e), retryable=retryable, retry_after=retry_after, status=code)
+
+
+class ConsoleBackend:
+    """Sin RESEND_API_KEY: imprime los correos en lugar de enviarlos"""
+
+    name = "console"
+
+    def send(self, params: Dict, idempotency_key: Optional[str] = None) -> str:
+        print("⚠️  RESEND_API_KEY no configurado - El correo NO se enviará")
+        print(f"📧 Correo simulado enviado a: {', '.join(params['to'])}")
+        print(f"📬 Asunto: {params['subject']}")
+        print(f"📤 De: {params['from']}")
+        print(f"↩️  Reply-To: {', '.join(params.get('reply_to') or []) or 'N/A'}")
+        return "simulado"
+
+    def send_batch(self, params_list: List[Dict], idempotency_key: Optional[str] = None) -> List[Tuple[Optional[str], Optional[str]]]:
+        return [(self.send(params), None) for params in params_list]
+
+
+class SmtpBackend:
+    """Servidor SMTP (un sink local en pruebas y benchmarks). Una conexión por lote."""
+
+    name = "smtp"
+
+    def __init__(self, host: str, port: int = 25):
+        self.host = host
+        self.port = port
+
+    def send(self, params: Dict, idempotency_key: Optional[str] = None) -> str:
+        return self.send_batch([params])[0][0]
+
+    def send_batch(self, params_list: List[Dict], idempotency_key: Optional[str] = None) -> List[Tuple[Optional[str], Optional[str]]]:
+        results = []
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+                for params in params_list:
+                    message = self._message(params)
+                    try:
+                        smtp.send_message(message)
+                        results.append((message["Message-ID"], None))
+                    except smtplib.SMTPRecipientsRefused as e:
+                        results.append((None, str(e)))
+        except (OSError, smtplib.SMTPException) as e:
+            raise EmailSendError(str(e), retryable=True)
+        return results
+
+    @staticmethod
+    def _message(params: Dict) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = params["from"]
+        message["To"] = ", ".join(params["to"])
+        message["Subject"] = params["subject"]
+        message["Message-ID"] = make_msgid()
+        if params.get("reply_to"):
+            message["Reply-To"] = ", ".join(params["reply_to"])
+        message.set_content(params.get("text") or _html_to_text(params["html"]))
+        message.add_alternative(params["html"], subtype="html")
+        html_part = message.get_payload()[-1]
+        for attachment in params.get("attachments") or []:
+            html_part.add_related(
+                base64.b64decode(attachment["content"]), maintype="image", subtype="png",
+                cid=f"<{attachment.get('content_id') or attachment['filename']}>", filename=attachment["filename"]
+            )
+        return message
+
+
+def backend_from_env(api_key: str):
+    """Backend según EMAIL_BACKEND ("resend", "console" o "smtp://host:puerto")"""
+    configured = os.getenv("EMAIL_BACKEND", "").strip()
+    if configured.startswith("smtp://"):
+        url = urlparse(configured)
+        return SmtpBackend(url.hostname or "localhost", url.port or 25)
+    if configured == "console" or not api_key:
+        return ConsoleBackend()
+    return ResendBackend(api_key)
+
+
+# ============================================================
+# TRANSPORTE POR LOTES
+# ============================================================
+
+class _RequestPacer:
+    """Espacia las llamadas al proveedor a una tasa máxima (compartido entre hilos)"""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class EmailTransport:
+    """
+    Envía muchos correos con el menor número de llamadas. Cada correo es
+    (llave, params de Resend); el resultado de cada llave es un dict
+    {"success", "id", "error", "attempts"}.
+    """
+
+    def __init__(self, backend, batch_size: int = EMAIL_BATCH_SIZE, concurrency: int = EMAIL_SEND_CONCURRENCY,
+                 requests_per_second: float = EMAIL_API_REQUESTS_PER_SECOND, max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                 retry_base: float = EMAIL_RETRY_BASE_SECONDS):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self._pacer = _RequestPacer(requests_per_second)
+        self.calls = 0
+
+    def send_many(self, messages: List[Tuple[object, Dict]], idempotency_prefix: Optional[str] = None) -> Dict[object, Dict]:
+        return dict(self.iter_send(messages, idempotency_prefix))
+
+    def iter_send(self, messages: List[Tuple[object, Dict]], idempotency_prefix: Optional[str] = None) -> Iterator[Tuple[object, Dict]]:
+        """
+        Envía los correos y entrega (llave, resultado) a medida que cada
+        llamada termina.
+
+        Args:
+            idempotency_prefix: identificador de esta ejecución (id del trabajo...).
+                Con él, un reintento tras un error de red no duplica correos.
+                Sin él no se usan llaves de idempotencia.
+        """
+        batched = [message for message in messages if not message[1].get("attachments")]
+        single = [message for message in messages if message[1].get("attachments")]
+        chunks = [batched[i:i + self.batch_size] for i in range(0, len(batched), self.batch_size)]
+        chunks.extend([message] for message in single)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._send_chunk, chunk, idempotency_prefix) for chunk in chunks]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    def _send_chunk(self, chunk: List[Tuple[object, Dict]], idempotency_prefix: Optional[str]) -> List[Tuple[object, Dict]]:
+        """Envía un lote (o un correo con adjuntos); reintenta el lote completo solo si no salió ninguno"""
+        idempotency_key = None
+        if idempotency_prefix:
+            keys = ",".join(str(key) for key, _ in chunk)
+            idempotency_key = f"{idempotency_prefix}:{hashlib.sha256(keys.encode()).hexdigest()[:32]}"
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._pacer.acquire()
+                self.calls += 1
+                if len(chunk) == 1:
+                    outcomes = [(self.backend.send(chunk[0][1], idempotency_key), None)]
+                else:
+                    outcomes = self.backend.send_batch([params for _, params in chunk], idempotency_key)
+                return [
+                    (key, {"success": error is None, "id": message_id, "error": error, "attempts": attempt})
+                    for (key, _), (message_id, error) in zip(chunk, outcomes)
+                ]
+            except EmailSendError as e:
+                if e.retryable and attempt < self.max_attempts:
+                    time.sleep(e.retry_after or self.retry_base * 2 ** (attempt - 1))
+                    continue
+                if e.status in EMAIL_VALIDATION_STATUSES and len(chunk) > 1:
+                    # Lote rechazado completo por validación: correo por correo. Otros
+                    # errores (llave inválida, permisos...) fallarían igual en cada uno
+                    return [result for message in chunk for result in self._send_chunk([message], idempotency_prefix)]
+                return [
+                    (key, {"success": False, "id": None, "error": str(e), "attempts": attempt})
+                    for key, _ in chunk
+                ]
+        return []
+
 
 class EmailService:
     """Servicio para enviar correos electrónicos usando Resend"""
@@ -23,13 +310,69 @@ class EmailService:
         self.from_email = os.getenv("FROM_EMAIL", "onboarding@resend.dev")
         self.from_name = os.getenv("FROM_NAME", "IEEE Tadeo - Control System")
 
-        # Configurar Resend
+        self.transport = EmailTransport(backend_from_env(self.api_key))
         if self.api_key:
-            resend.api_key = self.api_key
             print(f"[OK] Resend configurado: {self.from_email}")
         else:
             print("[AVISO] RESEND_API_KEY no configurado - Los correos se simularán")
 
+    def set_backend(self, backend, **transport_options):
+        """Cambia el backend de envío (pruebas y benchmarks contra un sink local)"""
+        self.transport = EmailTransport(backend, **transport_options)
+
+    def build_email(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+        from_name: Optional[str] = None,
+        reply_to: Optional[str] = None,
+        attachments: Optional[List[Dict]] = None
+    ) -> Dict:
+        """Parámetros de un correo en el formato de Resend (los usan todos los backends)"""
+        params = {
+            "from": f"{from_name or self.from_name} <{self.from_email}>",
+            "to": [to_email],
+            "subject": subject,
+            "html": html_content,
+            # Si no hay texto plano, crear uno simple del HTML
+            "text": text_content or _html_to_text(html_content)
+        }
+        if reply_to:
+            params["reply_to"] = [reply_to]
+        if attachments:
+            params["attachments"] = attachments
+        return params
+
+    def send_batch(self, messages: List[Tuple[object, Dict]], idempotency_prefix: Optional[str] = None) -> Dict[object, Dict]:
+        """
+        Envía muchos correos ya construidos agrupándolos por lotes (ver EmailTransport)
+
+        Args:
+            messages: lista de (llave, params) con params de build_email / build_ticket_email / build_bulk_message
+            idempotency_prefix: identificador único de esta ejecución, para reintentos sin duplicados
+
+        Returns:
+            Dict llave -> {"success", "id", "error", "attempts"}
+        """
+        return self.transport.send_many(messages, idempotency_prefix)
+
+    def iter_send_batch(self, messages: List[Tuple[object, Dict]], idempotency_prefix: Optional[str] = None) -> Iterator[Tuple[object, Dict]]:
+        """Como send_batch, pero entrega cada (llave, resultado) apenas termina su llamada"""
+        return self.transport.iter_send(messages, idempotency_prefix)
+
+    def send_params(self, params: Dict) -> bool:
+        """Envía un correo ya construido. Retorna True si salió."""
+        result = self.transport.send_many([(params["to"][0], params)])[params["to"][0]]
+        if result["success"]:
+            print(f"[OK] Correo enviado exitosamente a {params['to'][0]} (ID: {result['id']})")
+            if params.get("reply_to"):
+                print(f"    ↩️  Reply-To configurado: {params['reply_to'][0]}")
+            return True
+        print(f"[ERROR] Error al enviar correo a {params['to'][0]}: {result['error']}")
+        return False
+
     def send_email(
         self,
         to_email: str,
@@ -53,46 +396,9 @@ class EmailService:
         Returns:
             bool: True si el correo se envió correctamente, False en caso contrario
         """
-        if not self.api_key:
-            print("⚠️  RESEND_API_KEY no configurado - El correo NO se enviará")
-            print(f"📧 Correo simulado enviado a: {to_email}")
-            print(f"📬 Asunto: {subject}")
-            print(f"📤 De: {from_name or self.from_name}")
-            print(f"↩️  Reply-To: {reply_to or 'N/A'}")
-            return True
-
-        try:
-            # Si no hay texto plano, crear uno simple del HTML
-            if not text_content:
-                import re
-                text_content = re.sub('<[^<]+?>', '', html_content)
-
-            # Usar el nombre personalizado o el por defecto
-            sender_name = from_name or self.from_name
-
-            params = {
-                "from": f"{sender_name} <{self.from_email}>",
-                "to": [to_email],
-                "subject": subject,
-                "html": html_content,
-                "text": text_content
-            }
-
-            # Agregar reply_to si se especifica
-            if reply_to:
-                params["reply_to"] = [reply_to]
-
-            response = resend.Emails.send(params)
-            print(f"[OK] Correo enviado exitosamente a {to_email} (ID: {response.get('id', 'N/A')})")
-            if reply_to:
-                print(f"    ↩️  Reply-To configurado: {reply_to}")
-            return True
+        return self.send_params(self.build_email(to_email, subject, html_content, text_content, from_name, reply_to))
 
-        except Exception as e:
-            print(f"[ERROR] Error al enviar correo: {str(e)}")
-            return False
-
-    def send_ticket_email(
+    def build_ticket_email(
         self,
         to_email: str,
         user_name: str,
@@ -105,9 +411,9 @@ class EmailService:
         companions: int = 0,
         organization: Optional[models.Organization] = None,
         event: Optional[models.Event] = None
-    ) -> bool:
+    ) -> Dict:
         """
-        Envía un correo con la información del ticket usando templates personalizados
+        Construye el correo del ticket (template personalizado y QR como adjunto inline)
 
         Args:
             to_email: Email del destinatario
@@ -123,7 +429,7 @@ class EmailService:
             event: Evento (opcional, para usar template específico del evento)
 
         Returns:
-            bool: True si el correo se envió correctamente, False en caso contrario
+            Dict: parámetros del correo para send_params / send_batch
         """
         # Formato de fecha en español
         event_date_str = event_date.strftime('%d de %B de %Y a las %H:%M')
@@ -171,55 +477,52 @@ class EmailService:
             if organization.contact_email:
                 reply_to = organization.contact_email
 
-        # Enviar email con QR como adjunto inline (compatible con todos los clientes)
-        if not self.api_key:
-            print("⚠️  RESEND_API_KEY no configurado - El correo NO se enviará")
-            print(f"📧 Correo simulado enviado a: {to_email}")
-            print(f"📬 Asunto: {subject}")
-            print(f"📤 De: {from_name or self.from_name}")
-            print(f"↩️  Reply-To: {reply_to or 'N/A'}")
-            return True
-
-        try:
-            import re
-            text_content = re.sub('<[^<]+?>', '', html_content)
-
-            sender_name = from_name or self.from_name
-
-            # Decodificar el base64 a bytes para Resend
-            qr_bytes = base64.b64decode(qr_base64_clean)
-            qr_base64_encoded = base64.b64encode(qr_bytes).decode('utf-8')
-
-            params = {
-                "from": f"{sender_name} <{self.from_email}>",
-                "to": [to_email],
-                "subject": subject,
-                "html": html_content,
-                "text": text_content,
-                "attachments": [
-                    {
-                        "content": qr_base64_encoded,
-                        "filename": "ticket_qr.png",
-                        "content_id": "ticket_qr",
-                        "disposition": "inline"
-                    }
-                ]
-            }
-
-            if reply_to:
-                params["reply_to"] = [reply_to]
+        # QR como adjunto inline (compatible con todos los clientes)
+        return self.build_email(
+            to_email, subject, html_content,
+            from_name=from_name,
+            reply_to=reply_to,
+            attachments=[
+                {
+                    "content": qr_base64_clean,
+                    "filename": "ticket_qr.png",
+                    "content_id": "ticket_qr",
+                    "disposition": "inline"
+                }
+            ]
+        )
 
-            response = resend.Emails.send(params)
-            print(f"[OK] Correo con QR enviado exitosamente a {to_email} (ID: {response.get('id', 'N/A')})")
-            if reply_to:
-                print(f"    ↩️  Reply-To configurado: {reply_to}")
-            return True
+    def send_ticket_email(
+        self,
+        to_email: str,
+        user_name: str,
+        event_name: str,
+        event_date: datetime,
+        event_location: str,
+        ticket_code: str,
+        ticket_url: str,
+        access_pin: str,
+        companions: int = 0,
+        organization: Optional[models.Organization] = None,
+        event: Optional[models.Event] = None
+    ) -> bool:
+        """
+        Envía un correo con la información del ticket usando templates personalizados
 
+        Returns:
+            bool: True si el correo se envió correctamente, False en caso contrario
+        """
+        try:
+            params = self.build_ticket_email(
+                to_email, user_name, event_name, event_date, event_location, ticket_code,
+                ticket_url, access_pin, companions, organization, event
+            )
         except Exception as e:
-            print(f"[ERROR] Error al enviar correo: {str(e)}")
+            print(f"[ERROR] Error al preparar el correo: {str(e)}")
             import traceback
             traceback.print_exc()
             return False
+        return self.send_params(params)
 
     def send_birthday_email(self, to_email: str, user_name: str, nick: Optional[str] = None) -> bool:
         """
@@ -321,7 +624,7 @@ https://ticket.ieeetadeo.org
 
         return self.send_email(to_email, subject, html_content, text_content)
 
-    def send_bulk_message(
+    def build_bulk_message(
         self,
         to_email: str,
         user_name: str,
@@ -330,9 +633,10 @@ https://ticket.ieeetadeo.org
         link: Optional[str] = None,
         link_text: Optional[str] = None,
         image_url: Optional[str] = None
-    ) -> bool:
+    ) -> Dict:
         """
-        Envía un mensaje masivo personalizado
+        Construye un mensaje masivo personalizado. Para muchos destinatarios
+        conviene compile_campaign, que prepara el mensaje una sola vez.
 
         Args:
             to_email: Email del destinatario
@@ -344,24 +648,78 @@ https://ticket.ieeetadeo.org
             image_url: URL de la imagen opcional (data URL base64)
 
         Returns:
-            bool: True si el correo se envió correctamente
+            Dict: parámetros del correo para send_params / send_batch
         """
         # Procesar imagen si existe
-        image_html = ''
-        image_attachment = None
-
+        image_data = None
         if image_url and image_url.startswith('data:'):
-            # Extraer datos de la imagen
             try:
                 header, encoded = image_url.split(',', 1)
                 image_data = base64.b64decode(encoded)
-
-                # Usar CID para referenciar la imagen (más compatible con correos universitarios)
-                image_html = '<div style="text-align: center; margin: 30px 0;"><img src="cid:bulk_image" alt="Imagen" style="max-width: 100%; height: auto; border-radius: 8px; display: block; margin: 0 auto;"/></div>'
-                image_attachment = image_data
             except Exception as e:
                 print(f"[WARN] No se pudo procesar la imagen: {e}")
 
+        return self.compile_campaign(subject, message, link, link_text, image_data).build(to_email, user_name)
+
+    def compile_campaign(
+        self,
+        subject: str,
+        message: str,
+        link: Optional[str] = None,
+        link_text: Optional[str] = None,
+        image: Optional[bytes] = None
+    ) -> "CampaignEmail":
+        """Prepara el correo de una campaña para construirlo por destinatario (ver CampaignEmail)"""
+        return CampaignEmail(self, subject, message, link, link_text, image)
+
+    def send_bulk_message(
+        self,
+        to_email: str,
+        user_name: str,
+        subject: str,
+        message: str,
+        link: Optional[str] = None,
+        link_text: Optional[str] = None,
+        image_url: Optional[str] = None
+    ) -> bool:
+        """
+        Envía un mensaje masivo personalizado (ver build_bulk_message)
+
+        Returns:
+            bool: True si el correo se envió correctamente
+        """
+        return self.send_params(self.build_bulk_message(to_email, user_name, subject, message, link, link_text, image_url))
+
+
+class CampaignEmail:
+    """
+    Correo de campaña compilado una sola vez: el HTML y el texto plano quedan
+    partidos en los huecos del nombre, y la imagen se codifica una vez como
+    adjunto compartido por todos los destinatarios. Por destinatario solo se
+    sustituye {nombre} (en el saludo y en el mensaje).
+    """
+
+    def __init__(self, service: EmailService, subject: str, message: str, link: Optional[str] = None,
+                 link_text: Optional[str] = None, image: Optional[bytes] = None):
+        self.service = service
+        self.subject = subject
+
+        # Usar CID para referenciar la imagen (más compatible con correos universitarios)
+        image_html = ''
+        self.attachments = None
+        if image:
+            image_html = '<div style="text-align: center; margin: 30px 0;"><img src="cid:bulk_image" alt="Imagen" style="max-width: 100%; height: auto; border-radius: 8px; display: block; margin: 0 auto;"/></div>'
+            self.attachments = [
+                {
+                    "content": base64.b64encode(image).decode('utf-8'),
+                    "filename": "image.jpg",
+                    "content_id": "bulk_image",
+                    "disposition": "inline"
+                }
+            ]
+
+        message = message.replace("{nombre}", NAME_SLOT)
+
         # Link con estilos inline más compatibles
         link_html = f'''
         <table width="100%" cellpadding="0" cellspacing="0" style="margin: 30px 0;">
@@ -396,7 +754,7 @@ https://ticket.ieeetadeo.org
                             <!-- Content -->
                             <tr>
                                 <td style="padding: 40px 30px;">
-                                    <p style="font-size: 18px; color: #333333; margin-bottom: 20px;">Hola <strong>{user_name}</strong>,</p>
+                                    <p style="font-size: 18px; color: #333333; margin-bottom: 20px;">Hola <strong>{NAME_SLOT}</strong>,</p>
 
                                     {image_html}
 
@@ -424,7 +782,7 @@ https://ticket.ieeetadeo.org
         text_content = f"""
 {subject}
 
-Hola {user_name},
+Hola {NAME_SLOT},
 
 {message}
 
@@ -435,44 +793,17 @@ IEEE Tadeo Student Branch
 Control System
         """
 
-        # Si hay imagen adjunta, usar Resend con attachments
-        if image_attachment:
-            if not self.api_key:
-                print("⚠️  RESEND_API_KEY no configurado - El correo NO se enviará")
-                return True
-
-            try:
-                import re
-                if not text_content:
-                    text_content = re.sub('<[^<]+?>', '', html_content)
-
-                # Preparar imagen como adjunto inline
-                params = {
-                    "from": f"{self.from_name} <{self.from_email}>",
-                    "to": [to_email],
-                    "subject": subject,
-                    "html": html_content,
-                    "text": text_content,
-                    "attachments": [
-                        {
-                            "content": base64.b64encode(image_attachment).decode('utf-8'),
-                            "filename": "image.jpg",
-                            "content_id": "bulk_image",
-                            "disposition": "inline"
-                        }
-                    ]
-                }
+        self._html_parts = html_content.split(NAME_SLOT)
+        self._text_parts = text_content.split(NAME_SLOT)
 
-                response = resend.Emails.send(params)
-                print(f"[OK] Correo con imagen enviado exitosamente a {to_email} (ID: {response.get('id', 'N/A')})")
-                return True
-
-            except Exception as e:
-                print(f"[ERROR] Error al enviar correo con imagen: {str(e)}")
-                return False
-        else:
-            # Sin imagen, usar método normal
-            return self.send_email(to_email, subject, html_content, text_content)
+    def build(self, to_email: str, user_name: str) -> Dict:
+        """Parámetros del correo para un destinatario (user_name: nick o primer nombre)"""
+        return self.service.build_email(
+            to_email, self.subject,
+            user_name.join(self._html_parts),
+            user_name.join(self._text_parts),
+            attachments=self.attachments
+        )
 
 
 # Instancia global del servicio
@@ -0,0 +1,192 @@
+"""
+Contadores de validación por evento
+
+La tabla event_validation_stats guarda una fila por evento con los totales que
+muestra el panel (tickets por modo, validaciones, tickets validados). Cada
+cambio de tickets o validaciones ajusta la fila con un UPDATE atómico dentro de
+la misma transacción, así que leer las estadísticas es leer una fila.
+
+rebuild_event_stats recalcula los contadores desde tickets y validation_logs y
+reporta la diferencia, para detectar y corregir desvíos (ver reconcile_event_stats.py).
+"""
+from typing import Dict, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from timezone_utils import get_bogota_now_naive
+
+COUNTER_FIELDS = ('total_tickets', 'once_tickets', 'daily_tickets', 'total_validations', 'validated_tickets')
+
+
+def count_event_stats(db: Session, event_id: int) -> Dict[str, int]:
+    """Calcula los contadores de un evento desde las tablas (dos consultas)"""
+    total_tickets, once_tickets, daily_tickets = db.query(
+        func.count(models.Ticket.id),
+        func.sum(case((models.Ticket.validation_mode == 'once', 1), else_=0)),
+        func.sum(case((models.Ticket.validation_mode == 'daily', 1), else_=0))
+    ).filter(models.Ticket.event_id == event_id).one()
+
+    total_validations, validated_tickets = db.query(
+        func.count(models.ValidationLog.id),
+        func.count(func.distinct(models.ValidationLog.ticket_id))
+    ).join(
+        models.Ticket, models.ValidationLog.ticket_id == models.Ticket.id
+    ).filter(
+        models.Ticket.event_id == event_id,
+        models.ValidationLog.success == True
+    ).one()
+
+    return {
+        'total_tickets': int(total_tickets or 0),
+        'once_tickets': int(once_tickets or 0),
+        'daily_tickets': int(daily_tickets or 0),
+        'total_validations': int(total_validations or 0),
+        'validated_tickets': int(validated_tickets or 0)
+    }
+
+
+def _apply(db: Session, event_id: int, **deltas):
+    """
+    Suma los deltas a la fila del evento. Si la fila aún no existe se crea
+    calculándola desde las tablas, tras un flush, sin sumar el delta: por eso
+    los record_* se llaman después de aplicar el cambio en la sesión (add,
+    asignación, delete), nunca antes.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    stats = models.EventValidationStats
+    values = {getattr(stats, field): getattr(stats, field) + delta for field, delta in deltas.items()}
+    values[stats.updated_at] = get_bogota_now_naive()
+
+    updated = db.query(stats).filter(stats.event_id == event_id).update(values, synchronize_session=False)
+    if updated:
+        return
+
+    db.flush()
+    try:
+        with db.begin_nested():
+            db.add(stats(event_id=event_id, updated_at=get_bogota_now_naive(), **count_event_stats(db, event_id)))
+    except IntegrityError:
+        # Otra transacción creó la fila sin ver nuestros cambios: aplicar el delta
+        db.query(stats).filter(stats.event_id == event_id).update(values, synchronize_session=False)
+
+
+def record_tickets_added(db: Session, event_id: int, once: int = 0, daily: int = 0):
+    """Registra tickets nuevos de un evento"""
+    _apply(db, event_id, total_tickets=once + daily, once_tickets=once, daily_tickets=daily)
+
+
+def record_ticket_removed(db: Session, event_id: int, validation_mode: Optional[str], validations: int):
+    """
+    Registra la eliminación de un ticket y de sus `validations` validaciones
+    exitosas (contadas con count_ticket_validations antes de borrarlo)
+    """
+    _apply(
+        db, event_id,
+        total_tickets=-1,
+        once_tickets=-1 if validation_mode == 'once' else 0,
+        daily_tickets=-1 if validation_mode == 'daily' else 0,
+        total_validations=-validations,
+        validated_tickets=-1 if validations else 0
+    )
+
+
+def record_mode_change(db: Session, event_id: int, old_mode: Optional[str], new_mode: Optional[str], count: int = 1):
+    """Registra el cambio de modo de validación de `count` tickets"""
+    if old_mode == new_mode or not count:
+        return
+    deltas = {'once_tickets': 0, 'daily_tickets': 0}
+    if old_mode in ('once', 'daily'):
+        deltas[f'{old_mode}_tickets'] -= count
+    if new_mode in ('once', 'daily'):
+        deltas[f'{new_mode}_tickets'] += count
+    _apply(db, event_id, **deltas)
+
+
+def record_validation(db: Session, event_id: int, first_for_ticket: bool):
+    """Registra una validación exitosa"""
+    _apply(db, event_id, total_validations=1, validated_tickets=1 if first_for_ticket else 0)
+
+
+def record_validations_cleared(db: Session, event_id: int, validations: int):
+    """
+    Registra que se borraron las `validations` validaciones exitosas de un
+    ticket (reactivación; contadas con count_ticket_validations antes de borrarlas)
+    """
+    _apply(db, event_id, total_validations=-validations, validated_tickets=-1 if validations else 0)
+
+
+def count_ticket_validations(db: Session, ticket_id: int) -> int:
+    """Validaciones exitosas de un ticket"""
+    return db.query(func.count(models.ValidationLog.id)).filter(
+        models.ValidationLog.ticket_id == ticket_id,
+        models.ValidationLog.success == True
+    ).scalar() or 0
+
+
+def get_event_stats(db: Session, event_id: int) -> Dict[str, int]:
+    """Contadores del evento (una fila; se crea desde las tablas si no existe)"""
+    row = db.query(models.EventValidationStats).filter(
+        models.EventValidationStats.event_id == event_id
+    ).first()
+    if row:
+        return {field: getattr(row, field) for field in COUNTER_FIELDS}
+
+    counts = rebuild_event_stats(db, event_id)["counts"]
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra petición creó la fila al mismo tiempo
+        db.rollback()
+        return get_event_stats(db, event_id)
+    return counts
+
+
+def rebuild_event_stats(db: Session, event_id: int) -> Dict:
+    """
+    Recalcula los contadores de un evento desde tickets y validation_logs.
+    No hace commit.
+
+    Returns:
+        Dict con los contadores correctos y el desvío encontrado por campo
+    """
+    # Bloquear la fila antes de contar: las validaciones concurrentes esperan y
+    # aplican su delta después, sobre el valor ya reconstruido
+    row = db.query(models.EventValidationStats).filter(
+        models.EventValidationStats.event_id == event_id
+    ).with_for_update().first()
+
+    counts = count_event_stats(db, event_id)
+    now = get_bogota_now_naive()
+
+    drift = {}
+    if row:
+        for field in COUNTER_FIELDS:
+            difference = (getattr(row, field) or 0) - counts[field]
+            if difference:
+                drift[field] = difference
+            setattr(row, field, counts[field])
+        row.updated_at = now
+        row.reconciled_at = now
+    else:
+        db.add(models.EventValidationStats(event_id=event_id, updated_at=now, reconciled_at=now, **counts))
+
+    return {"event_id": event_id, "counts": counts, "drift": drift}
+
+
+def reconcile_all_event_stats(db: Session) -> Dict:
+    """Reconstruye los contadores de todos los eventos y confirma por evento"""
+    results = []
+    for (event_id,) in db.query(models.Event.id).order_by(models.Event.id).all():
+        results.append(rebuild_event_stats(db, event_id))
+        db.commit()
+
+    return {
+        "events": len(results),
+        "events_with_drift": [result for result in results if result["drift"]]
+    }
@@ -18,7 +18,7 @@ router = APIRouter(prefix="/api/external", tags=["External API"])
 # DEPENDENCIAS DE SEGURIDAD
 # ============================================================
 
-async def validate_api_key(
+def validate_api_key(
     x_api_key: str = Header(..., description="API Key del módulo externo"),
     db: Session = Depends(get_db)
 ) -> models.ExternalModule:
@@ -34,7 +34,7 @@ async def validate_api_key(
 
 def require_scope(scope: str):
     """Genera una dependencia que verifica que el módulo tenga el scope requerido"""
-    async def checker(
+    def checker(
         module: models.ExternalModule = Depends(validate_api_key)
     ) -> models.ExternalModule:
         scopes = json.loads(module.allowed_scopes)
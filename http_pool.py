@@ -0,0 +1,48 @@
+"""
+Cliente HTTP compartido para la Graph API de Meta
+
+Una sola requests.Session por proceso (con pool de conexiones keep-alive) en
+lugar de requests.post/get sueltos, que abren una conexión TCP+TLS nueva a
+graph.facebook.com en cada mensaje.
+"""
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configuración del pool
+GRAPH_HTTP_POOL_SIZE = int(os.getenv("GRAPH_HTTP_POOL_SIZE", "20"))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_graph_session() -> requests.Session:
+    """Sesión HTTP del proceso, con conexiones reutilizables hacia graph.facebook.com"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Solo se reintentan fallos de conexión: un POST que llegó a Meta
+                # no se repite para no duplicar mensajes
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=GRAPH_HTTP_POOL_SIZE,
+                    max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5)
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def close_graph_session():
+    """Cierra las conexiones abiertas (al apagar la aplicación)"""
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
@@ -0,0 +1,444 @@
+"""
+Cola de trabajos persistente para envíos masivos
+
+Los endpoints de envío masivo encolan un DeliveryJob con una DeliveryTask por
+destinatario y canal, y responden de inmediato con el id del trabajo. El
+proceso job_worker.py (iniciado junto a uvicorn) reclama las tareas
+pendientes desde la base de datos y las ejecuta con concurrencia y ritmo
+configurables, así que ningún worker de uvicorn queda bloqueado enviando.
+
+Los tipos de tarea con handler por lotes (register_batch_handler) se
+procesan de a JOB_BATCH_SIZE tareas del mismo trabajo en una sola llamada,
+por ejemplo los emails de una campaña con el endpoint batch del proveedor.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from timezone_utils import get_bogota_now_naive
+
+# Configuración del worker
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_TASK_MAX_ATTEMPTS = int(os.getenv("JOB_TASK_MAX_ATTEMPTS", "3"))
+JOB_STALE_AFTER = timedelta(minutes=int(os.getenv("JOB_STALE_AFTER_MINUTES", "10")))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "100"))
+
+# Envíos por segundo permitidos por canal (0 = sin límite propio).
+# WhatsApp se regula con el token bucket compartido de whatsapp_rate_limiter.
+CHANNEL_RATE_LIMITS = {
+    "email": float(os.getenv("JOB_EMAIL_PER_SECOND", "5")),
+    "whatsapp": float(os.getenv("JOB_WHATSAPP_PER_SECOND", "0")),
+}
+
+# Handlers registrados: (job_type, channel) -> handler(db, job, task, payload) -> (éxito, error)
+_handlers: Dict[Tuple[str, str], Callable] = {}
+
+# Handlers por lotes: (job_type, channel) -> handler(db, job, tasks, payload) -> {task_id: (éxito, error)}
+_batch_handlers: Dict[Tuple[str, str], Callable] = {}
+
+
+def register_handler(job_type: str, channel: str):
+    """Decorador para registrar la función que procesa un tipo de tarea"""
+    def decorator(func: Callable) -> Callable:
+        _handlers[(job_type, channel)] = func
+        return func
+    return decorator
+
+
+def register_batch_handler(job_type: str, channel: str):
+    """Decorador para registrar la función que procesa varias tareas de un trabajo a la vez"""
+    def decorator(func: Callable) -> Callable:
+        _batch_handlers[(job_type, channel)] = func
+        return func
+    return decorator
+
+
+def enqueue_job(
+    db: Session,
+    job_type: str,
+    tasks: List[Tuple[str, int]],
+    payload: Optional[Dict] = None,
+    created_by: Optional[int] = None,
+    campaign_id: Optional[int] = None,
+    event_id: Optional[int] = None
+) -> models.DeliveryJob:
+    """
+    Encola un trabajo de envío. No hace commit: el llamador lo confirma junto
+    con los registros relacionados (campaña, destinatarios). Un trabajo sin
+    tareas se crea ya completado, porque el worker nunca lo cerraría.
+
+    Args:
+        db: Sesión de base de datos
+        job_type: Tipo de trabajo (debe tener handlers registrados)
+        tasks: Lista de (canal, target_id)
+        payload: Parámetros comunes a todas las tareas (se guarda como JSON)
+
+    Returns:
+        El DeliveryJob creado
+    """
+    now = get_bogota_now_naive()
+    job = models.DeliveryJob(
+        job_type=job_type,
+        status="queued" if tasks else "completed",
+        payload=json.dumps(payload or {}),
+        total_tasks=len(tasks),
+        campaign_id=campaign_id,
+        event_id=event_id,
+        created_by=created_by,
+        created_at=now,
+        started_at=None if tasks else now,
+        finished_at=None if tasks else now
+    )
+    db.add(job)
+    db.flush()
+
+    if tasks:
+        db.execute(
+            insert(models.DeliveryTask),
+            [
+                {"job_id": job.id, "channel": channel, "target_id": target_id, "status": "pending", "attempts": 0}
+                for channel, target_id in tasks
+            ]
+        )
+
+    return job
+
+
+def get_job_progress(db: Session, job_id: int) -> Optional[Dict]:
+    """Obtiene el estado y progreso de un trabajo"""
+    job = db.query(models.DeliveryJob).filter(models.DeliveryJob.id == job_id).first()
+    if not job:
+        return None
+
+    recent_errors = db.query(
+        models.DeliveryTask.channel,
+        models.DeliveryTask.target_id,
+        models.DeliveryTask.error
+    ).filter(
+        models.DeliveryTask.job_id == job_id,
+        models.DeliveryTask.status == "failed"
+    ).order_by(models.DeliveryTask.id.desc()).limit(20).all()
+
+    done = (job.completed_tasks or 0) + (job.failed_tasks or 0)
+    return {
+        "job_id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "total_tasks": job.total_tasks,
+        "completed_tasks": job.completed_tasks,
+        "failed_tasks": job.failed_tasks,
+        "pending_tasks": max((job.total_tasks or 0) - done, 0),
+        "progress": round(done * 100 / job.total_tasks, 1) if job.total_tasks else 100.0,
+        "campaign_id": job.campaign_id,
+        "event_id": job.event_id,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error,
+        "recent_errors": [
+            {"channel": channel, "target_id": target_id, "error": error}
+            for channel, target_id, error in recent_errors
+        ]
+    }
+
+
+def cancel_job(db: Session, job_id: int) -> bool:
+    """Cancela un trabajo: sus tareas pendientes ya no se reclaman"""
+    updated = db.query(models.DeliveryJob).filter(
+        models.DeliveryJob.id == job_id,
+        models.DeliveryJob.status.in_(["queued", "running"])
+    ).update({
+        "status": "cancelled",
+        "finished_at": get_bogota_now_naive()
+    }, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
+
+def _claim_tasks(db: Session, worker_id: str, limit: int) -> List[int]:
+    """
+    Reclama hasta `limit` tareas pendientes de forma atómica.
+    SELECT ... FOR UPDATE SKIP LOCKED permite varios workers sin que dos
+    procesen la misma tarea. Donde no existe (SQLite), el UPDATE solo toma
+    las que siguen pendientes y se retornan las que quedaron a nombre de
+    este worker.
+    """
+    rows = db.query(models.DeliveryTask.id, models.DeliveryTask.job_id).join(
+        models.DeliveryJob, models.DeliveryTask.job_id == models.DeliveryJob.id
+    ).filter(
+        models.DeliveryTask.status == "pending",
+        models.DeliveryJob.status.in_(["queued", "running"])
+    ).order_by(
+        models.DeliveryTask.id
+    ).limit(limit).with_for_update(skip_locked=True, of=models.DeliveryTask).all()
+
+    if not rows:
+        db.commit()
+        return []
+
+    task_ids = [task_id for task_id, _ in rows]
+    now = get_bogota_now_naive()
+
+    db.query(models.DeliveryTask).filter(
+        models.DeliveryTask.id.in_(task_ids),
+        models.DeliveryTask.status == "pending"
+    ).update({
+        "status": "running",
+        "locked_by": worker_id,
+        "locked_at": now,
+        "attempts": models.DeliveryTask.attempts + 1
+    }, synchronize_session=False)
+
+    claimed = db.query(models.DeliveryTask.id, models.DeliveryTask.job_id).filter(
+        models.DeliveryTask.id.in_(task_ids),
+        models.DeliveryTask.status == "running",
+        models.DeliveryTask.locked_by == worker_id
+    ).order_by(models.DeliveryTask.id).all()
+    if not claimed:
+        db.commit()
+        return []
+
+    task_ids = [task_id for task_id, _ in claimed]
+    job_ids = {job_id for _, job_id in claimed}
+
+    db.query(models.DeliveryJob).filter(
+        models.DeliveryJob.id.in_(job_ids),
+        models.DeliveryJob.status == "queued"
+    ).update({
+        "status": "running",
+        "started_at": now
+    }, synchronize_session=False)
+
+    db.commit()
+    return task_ids
+
+
+def _recover_stale_tasks(db: Session):
+    """Devuelve a la cola las tareas de workers que murieron a mitad del envío"""
+    stale_before = get_bogota_now_naive() - JOB_STALE_AFTER
+    stale = db.query(models.DeliveryTask.id, models.DeliveryTask.attempts).filter(
+        models.DeliveryTask.status == "running",
+        models.DeliveryTask.locked_at < stale_before
+    ).all()
+
+    for task_id, attempts in stale:
+        _release_task(db, task_id, attempts, "Worker interrumpido durante el envío")
+
+
+def _finish_task(db: Session, task_id: int, job_id: int, success: bool, error: Optional[str] = None):
+    """Marca la tarea como terminada y actualiza el progreso del trabajo en la misma transacción"""
+    _finish_tasks(db, job_id, {task_id: (success, error)})
+
+
+def _finish_tasks(db: Session, job_id: int, results: Dict[int, Tuple[bool, Optional[str]]]):
+    """Marca varias tareas de un trabajo como terminadas con un solo commit"""
+    now = get_bogota_now_naive()
+    sent_ids = [task_id for task_id, (success, _) in results.items() if success]
+
+    if sent_ids:
+        db.query(models.DeliveryTask).filter(models.DeliveryTask.id.in_(sent_ids)).update({
+            "status": "sent",
+            "error": None,
+            "completed_at": now
+        }, synchronize_session=False)
+    for task_id, (success, error) in results.items():
+        if not success:
+            db.query(models.DeliveryTask).filter(models.DeliveryTask.id == task_id).update({
+                "status": "failed",
+                "error": (error or None) and str(error)[:500],
+                "completed_at": now
+            }, synchronize_session=False)
+
+    failed_count = len(results) - len(sent_ids)
+    db.execute(
+        update(models.DeliveryJob).where(models.DeliveryJob.id == job_id).values({
+            models.DeliveryJob.completed_tasks: models.DeliveryJob.completed_tasks + len(sent_ids),
+            models.DeliveryJob.failed_tasks: models.DeliveryJob.failed_tasks + failed_count
+        })
+    )
+
+    # Cerrar el trabajo cuando ya no quedan tareas
+    db.execute(
+        update(models.DeliveryJob).where(
+            models.DeliveryJob.id == job_id,
+            models.DeliveryJob.status == "running",
+            models.DeliveryJob.completed_tasks + models.DeliveryJob.failed_tasks >= models.DeliveryJob.total_tasks
+        ).values(status="completed", finished_at=now)
+    )
+
+    db.commit()
+
+
+def _release_task(db: Session, task_id: int, attempts: int, error: str):
+    """Reintenta una tarea que falló por una excepción, o la marca fallida si agotó los intentos"""
+    if attempts >= JOB_TASK_MAX_ATTEMPTS:
+        job_id = db.query(models.DeliveryTask.job_id).filter(models.DeliveryTask.id == task_id).scalar()
+        _finish_task(db, task_id, job_id, False, error)
+        return
+
+    db.query(models.DeliveryTask).filter(models.DeliveryTask.id == task_id).update({
+        "status": "pending",
+        "locked_by": None,
+        "locked_at": None,
+        "error": error[:500]
+    }, synchronize_session=False)
+    db.commit()
+
+
+class _RateLimiter:
+    """Espacia los envíos de un canal a una tasa máxima (compartido entre hilos)"""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class JobWorker:
+    """Proceso que ejecuta las tareas de envío encoladas"""
+
+    def __init__(self, concurrency: int = JOB_WORKER_CONCURRENCY, poll_interval: float = JOB_POLL_INTERVAL_SECONDS):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._rate_limiters = {
+            channel: _RateLimiter(rate) for channel, rate in CHANNEL_RATE_LIMITS.items()
+        }
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Detiene el worker al terminar el lote en curso"""
+        self._stop.set()
+
+    def run_forever(self):
+        """Bucle principal: reclama tareas, las ejecuta y espera si no hay trabajo"""
+        print(f"[JOBS] Worker {self.worker_id} iniciado (concurrencia {self.concurrency})")
+        last_recovery = 0.0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stop.is_set():
+                if time.monotonic() - last_recovery > 60:
+                    db = SessionLocal()
+                    try:
+                        _recover_stale_tasks(db)
+                    finally:
+                        db.close()
+                    last_recovery = time.monotonic()
+
+                if not self.run_once(pool):
+                    self._stop.wait(self.poll_interval)
+
+        print(f"[JOBS] Worker {self.worker_id} detenido")
+
+    def run_once(self, pool: ThreadPoolExecutor) -> int:
+        """Reclama y ejecuta un lote de tareas. Retorna cuántas se procesaron"""
+        db = SessionLocal()
+        try:
+            # Con handlers por lotes se reclaman suficientes tareas para llenar un lote
+            limit = max(self.concurrency, JOB_BATCH_SIZE) if _batch_handlers else self.concurrency
+            task_ids = _claim_tasks(db, self.worker_id, limit)
+            units = self._group_tasks(db, task_ids)
+        finally:
+            db.close()
+
+        list(pool.map(lambda unit: self._run_batch(unit) if isinstance(unit, list) else self._run_task(unit), units))
+        return len(task_ids)
+
+    def _group_tasks(self, db: Session, task_ids: List[int]) -> List:
+        """Tareas sueltas (id) y lotes (lista de ids del mismo trabajo y canal con handler por lotes)"""
+        if not task_ids or not _batch_handlers:
+            return task_ids
+        rows = db.query(
+            models.DeliveryTask.id, models.DeliveryTask.job_id, models.DeliveryTask.channel, models.DeliveryJob.job_type
+        ).join(
+            models.DeliveryJob, models.DeliveryTask.job_id == models.DeliveryJob.id
+        ).filter(models.DeliveryTask.id.in_(task_ids)).order_by(models.DeliveryTask.id).all()
+
+        units = []
+        batches: Dict[Tuple[int, str], List[int]] = {}
+        for task_id, job_id, channel, job_type in rows:
+            if (job_type, channel) in _batch_handlers:
+                batches.setdefault((job_id, channel), []).append(task_id)
+            else:
+                units.append(task_id)
+        for batch in batches.values():
+            units.extend(batch[i:i + JOB_BATCH_SIZE] for i in range(0, len(batch), JOB_BATCH_SIZE))
+        return units
+
+    def _run_batch(self, task_ids: List[int]):
+        """Ejecuta un lote de tareas del mismo trabajo con una sola llamada al handler"""
+        db = SessionLocal()
+        try:
+            tasks = db.query(models.DeliveryTask).filter(
+                models.DeliveryTask.id.in_(task_ids)
+            ).order_by(models.DeliveryTask.id).all()
+            job = tasks[0].job
+            handler = _batch_handlers[(job.job_type, tasks[0].channel)]
+
+            # El límite del canal cuenta llamadas al proveedor: una por lote
+            limiter = self._rate_limiters.get(tasks[0].channel)
+            if limiter:
+                limiter.acquire()
+
+            results = handler(db, job, tasks, json.loads(job.payload or "{}"))
+            # Las tareas sin resultado se dan por fallidas para no dejarlas colgadas
+            for task in tasks:
+                results.setdefault(task.id, (False, "Sin resultado del envío"))
+            _finish_tasks(db, job.id, results)
+
+        except Exception as e:
+            print(f"[JOBS] Error en lote de {len(task_ids)} tareas: {str(e)}")
+            db.rollback()
+            attempts = dict(db.query(models.DeliveryTask.id, models.DeliveryTask.attempts).filter(
+                models.DeliveryTask.id.in_(task_ids)
+            ).all())
+            for task_id in task_ids:
+                _release_task(db, task_id, attempts.get(task_id) or 0, str(e))
+        finally:
+            db.close()
+
+    def _run_task(self, task_id: int):
+        """Ejecuta una tarea con su propia sesión de base de datos"""
+        db = SessionLocal()
+        try:
+            task = db.query(models.DeliveryTask).filter(models.DeliveryTask.id == task_id).first()
+            job = task.job
+            handler = _handlers.get((job.job_type, task.channel))
+
+            if not handler:
+                _finish_task(db, task.id, job.id, False, f"Sin handler para {job.job_type}/{task.channel}")
+                return
+
+            limiter = self._rate_limiters.get(task.channel)
+            if limiter:
+                limiter.acquire()
+
+            success, error = handler(db, job, task, json.loads(job.payload or "{}"))
+            _finish_task(db, task.id, job.id, success, error)
+
+        except Exception as e:
+            print(f"[JOBS] Error en tarea {task_id}: {str(e)}")
+            db.rollback()
+            attempts = db.query(models.DeliveryTask.attempts).filter(models.DeliveryTask.id == task_id).scalar() or 0
+            _release_task(db, task_id, attempts, str(e))
+        finally:
+            db.close()
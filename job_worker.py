@@ -0,0 +1,61 @@
+"""
+Worker de envíos masivos
+
+Procesa los trabajos encolados por /messages/bulk-send y
+/tickets/send-whatsapp-by-event, y en otro hilo los webhooks de WhatsApp
+guardados por /webhooks/whatsapp (ver whatsapp_inbox.py). Se inicia junto a
+uvicorn (ver start_production.sh); se pueden ejecutar varios en paralelo.
+
+Variables de entorno:
+    JOB_WORKER_CONCURRENCY   Tareas simultáneas por worker (default 4)
+    JOB_EMAIL_PER_SECOND     Emails por segundo (default 5)
+    JOB_WHATSAPP_PER_SECOND  Tope adicional de WhatsApp por segundo (default 0: solo
+                             el limitador compartido de whatsapp_rate_limiter)
+    WHATSAPP_INBOX_BATCH_SIZE  Webhooks de WhatsApp por lote (default 200)
+
+Ejecutar con: python job_worker.py
+"""
+import io
+import signal
+import sys
+import threading
+from pathlib import Path
+
+# Configurar codificacion UTF-8 para stdout en Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Agregar el directorio actual al path para importar modulos
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models
+from database import engine
+from job_queue import JobWorker
+from whatsapp_inbox import WebhookInboxConsumer
+import delivery_jobs  # noqa: F401  (registra los handlers)
+
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+
+    worker = JobWorker()
+    inbox = WebhookInboxConsumer()
+
+    def handle_signal(signum, frame):
+        print("\n[JOBS] Señal recibida, deteniendo worker...")
+        worker.stop()
+        inbox.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    inbox_thread = threading.Thread(target=inbox.run_forever, name="whatsapp-inbox", daemon=True)
+    inbox_thread.start()
+
+    worker.run_forever()
+    inbox_thread.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Prueba de carga: escaneos simultáneos del mismo ticket
+
+Dispara N validaciones en paralelo del mismo código contra un servidor en
+ejecución (idealmente con varios workers de uvicorn) y verifica que
+exactamente una sea exitosa.
+
+Uso:
+    python load_test_validation.py <ticket_code> [--url URL] [--user USUARIO] [--password CLAVE] [--scans N]
+
+El ticket debe estar en modo 'once' y sin validaciones previas (o en modo
+'daily' sin validaciones del día).
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def login(base_url: str, username: str, password: str) -> str:
+    """Obtiene el token JWT del validador"""
+    response = requests.post(
+        f"{base_url}/auth/login",
+        json={"username": username, "password": password},
+        timeout=15
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escaneos simultáneos del mismo ticket")
+    parser.add_argument("ticket_code", help="Código del ticket a validar")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="URL base del servidor")
+    parser.add_argument("--user", default="admin", help="Usuario validador")
+    parser.add_argument("--password", default="admin123", help="Contraseña del validador")
+    parser.add_argument("--scans", type=int, default=20, help="Cantidad de escaneos simultáneos")
+    args = parser.parse_args()
+
+    token = login(args.url, args.user, args.password)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # Todos los hilos esperan en la barrera para disparar al mismo tiempo
+    barrier = threading.Barrier(args.scans)
+
+    def scan(_):
+        barrier.wait()
+        started = time.perf_counter()
+        response = requests.post(
+            f"{args.url}/validate/",
+            json={"ticket_code": args.ticket_code},
+            headers=headers,
+            timeout=30
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return response.json(), elapsed_ms
+
+    print(f"Disparando {args.scans} escaneos simultáneos de {args.ticket_code[:16]}...")
+    with ThreadPoolExecutor(max_workers=args.scans) as executor:
+        results = list(executor.map(scan, range(args.scans)))
+
+    successes = [data for data, _ in results if data.get("valid")]
+    timings = sorted(elapsed for _, elapsed in results)
+
+    print(f"\nExitosos: {len(successes)} / {args.scans}")
+    for data, elapsed in results:
+        status = "OK " if data.get("valid") else "NO "
+        print(f"  {status} {elapsed:7.1f} ms  {data.get('message')}")
+    print(f"\nLatencia: min {timings[0]:.1f} ms, max {timings[-1]:.1f} ms")
+
+    if len(successes) != 1:
+        print(f"\n[ERROR] Se esperaba exactamente 1 validación exitosa, hubo {len(successes)}")
+        sys.exit(1)
+
+    print("\n[OK] Exactamente una validación exitosa")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Monitor de bloqueos del event loop
+
+Los endpoints async comparten un solo hilo por worker de uvicorn: una
+consulta síncrona o una llamada HTTP bloqueante dentro de un `async def`
+detiene todas las peticiones del worker mientras dura.
+
+Una tarea del loop marca un latido cada LOOP_MONITOR_INTERVAL_MS y un hilo
+vigilante revisa que llegue a tiempo. Si el loop pasa más de
+LOOP_LAG_THRESHOLD_MS sin latir, imprime la pila del hilo del loop en ese
+momento (apunta a la llamada que bloquea) y, al liberarse, cuánto duró.
+Las últimas detecciones se consultan en /system/loop-lag.
+
+Variables de entorno:
+    LOOP_MONITOR_ENABLED      "false" para desactivarlo (default true)
+    LOOP_LAG_THRESHOLD_MS     Bloqueo mínimo que se reporta (default 100)
+    LOOP_MONITOR_INTERVAL_MS  Intervalo del latido (default 50)
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, Optional
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+
+# Frames de la pila que se guardan por bloqueo
+LOOP_MONITOR_STACK_DEPTH = 8
+
+
+class LoopLagMonitor:
+    """Detecta y reporta los bloqueos del event loop"""
+
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS, interval_ms: float = LOOP_MONITOR_INTERVAL_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self._last_beat = time.monotonic()
+        self._last_delay = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.blocks = 0
+        self.max_lag_ms = 0.0
+        self.recent = deque(maxlen=20)
+
+    def start(self):
+        """Inicia el latido y el hilo vigilante (llamar desde el event loop)"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True)
+        self._thread.start()
+        print(f"[LOOP] Monitor de bloqueos activo (umbral {self.threshold * 1000:.0f} ms)")
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        self._last_beat = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            # Retraso exacto del latido: cuánto duró el último bloqueo
+            self._last_delay = now - self._last_beat - self.interval
+            self._last_beat = now
+
+    def _lag(self) -> float:
+        """Segundos de retraso del latido respecto a lo esperado"""
+        return time.monotonic() - self._last_beat - self.interval
+
+    def _watch(self):
+        where = None
+        worst = 0.0
+        while not self._stop.wait(self.interval):
+            lag = self._lag()
+            if lag > self.threshold:
+                if where is None:
+                    # Primera detección de este bloqueo: la pila dice quién lo causa
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    stack = traceback.format_stack(frame)[-LOOP_MONITOR_STACK_DEPTH:] if frame else []
+                    where = "".join(stack).rstrip() or "(pila no disponible)"
+                    print(f"[LOOP] Event loop bloqueado por más de {lag * 1000:.0f} ms en:\n{where}")
+                worst = max(worst, lag)
+            elif where is not None:
+                self._record(max(worst, self._last_delay), where)
+                where = None
+                worst = 0.0
+
+    def _record(self, lag: float, where: str):
+        lag_ms = round(lag * 1000, 1)
+        print(f"[LOOP] Bloqueo liberado tras ~{lag_ms:.0f} ms")
+        with self._lock:
+            self.blocks += 1
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self.recent.appendleft({
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "lag_ms": lag_ms,
+                "where": where
+            })
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self._task is not None,
+                "threshold_ms": self.threshold * 1000,
+                "current_lag_ms": round(max(self._lag(), 0.0) * 1000, 1),
+                "blocks": self.blocks,
+                "max_lag_ms": self.max_lag_ms,
+                "recent": list(self.recent)
+            }
+
+
+# Instancia global (una por proceso)
+loop_monitor = LoopLagMonitor()
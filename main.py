@@ -1,5 +1,5 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, File, UploadFile, Form
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, status, Request, File, UploadFile, Form, BackgroundTasks
+from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, validator
@@ -7,6 +7,8 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, desc, or_
 from datetime import datetime, timedelta
 from typing import List, Optional
+from collections import Counter
+import asyncio
 import os
 import json
 from dotenv import load_dotenv
@@ -15,6 +17,24 @@ import schemas
 from database import engine, get_db
 from ticket_service import ticket_service
 from email_service import email_service
+from validation_service import validation_service
+from validation_feed import validation_feed
+from loop_monitor import loop_monitor, LOOP_MONITOR_ENABLED
+from public_page_cache import public_page_cache
+from user_directory_service import get_user_directory
+import user_search_service
+from job_queue import enqueue_job, get_job_progress, cancel_job
+from whatsapp_inbox import enqueue_webhook
+from send_streams import start_or_join_run, follow_run, send_event_emails, send_event_whatsapp
+from event_stats_service import (
+    get_event_stats,
+    rebuild_event_stats,
+    record_tickets_added,
+    record_ticket_removed,
+    record_mode_change,
+    record_validations_cleared,
+    count_ticket_validations
+)
 from timezone_utils import (
     get_bogota_now_naive,
     format_datetime_bogota,
@@ -40,6 +60,10 @@ load_dotenv()
 # Configuración
 BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8000")
 
+# Hilos para los endpoints síncronos (def): cada uno usa una conexión del pool
+# de la base de datos, así que va de la mano con DB_POOL_SIZE + DB_MAX_OVERFLOW
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "30"))
+
 # Crear tablas
 models.Base.metadata.create_all(bind=engine)
 
@@ -63,6 +87,32 @@ app.include_router(user_portal_router)
 app.include_router(external_api_router)
 
 
+@app.on_event("startup")
+async def configure_concurrency():
+    """
+    Los endpoints que usan la sesión síncrona de SQLAlchemy son `def` y corren
+    en el threadpool; el event loop solo atiende código async que no bloquea.
+    """
+    import anyio.to_thread
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Cerrar las conexiones HTTP compartidas hacia la Graph API"""
+    from http_pool import close_graph_session
+    loop_monitor.stop()
+    close_graph_session()
+
+
+@app.get("/system/loop-lag")
+def get_loop_lag(current_user: models.AdminUser = Depends(require_admin)):
+    """Bloqueos recientes del event loop de este worker (ver loop_monitor.py)"""
+    return loop_monitor.stats()
+
+
 # ========== ENDPOINTS DE AUTENTICACIÓN ==========
 
 @app.post("/auth/login", response_model=schemas.Token)
@@ -100,7 +150,7 @@ def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
 
 
 @app.get("/auth/callback")
-async def oauth_callback(request: Request, code: str = None, state: str = None, error: str = None):
+def oauth_callback(request: Request, code: str = None, state: str = None, error: str = None):
     """
     OAuth callback endpoint para Meta/Facebook.
     Este endpoint es requerido por Meta para la configuración de OAuth,
@@ -1419,19 +1469,11 @@ def search_users(
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
 ):
-    """Buscar usuarios por nombre, email o teléfono"""
-    if len(q) < 2:
+    """Buscar usuarios por nombre, email, cédula o teléfono (índice de user_search_service)"""
+    if len(q.strip()) < 2:
         return []
 
-    search_term = f"%{q}%"
-    users = db.query(models.User).filter(
-        or_(
-            models.User.name.ilike(search_term),
-            models.User.email.ilike(search_term),
-            models.User.phone.ilike(search_term),
-            models.User.identification.ilike(search_term)
-        )
-    ).limit(limit).all()
+    users = user_search_service.search_users(db, q, limit=min(max(limit, 1), 100))
 
     return [
         {
@@ -1445,6 +1487,41 @@ def search_users(
     ]
 
 
+@app.get("/users/directory")
+def users_directory(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    university_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    is_ieee_member: Optional[bool] = None,
+    birthday: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: str = "id",
+    order: str = "desc",
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """
+    Tramo del directorio de usuarios de /admin/users (paginación por cursor).
+    birthday: today | week | month | has | missing
+    """
+    try:
+        return get_user_directory(
+            db,
+            cursor=cursor,
+            limit=limit,
+            sort=sort,
+            order=order,
+            university_id=university_id,
+            tag_id=tag_id,
+            is_ieee_member=is_ieee_member,
+            birthday=birthday,
+            q=q
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/users/{user_id}", response_model=schemas.UserResponse)
 def get_user(
     user_id: int,
@@ -1794,134 +1871,92 @@ def delete_user_study(
     return {"success": True, "message": "Estudio eliminado exitosamente"}
 
 
+def _get_import_tag(db: Session, tag_id: int, file: UploadFile) -> models.Tag:
+    """Validaciones comunes de la importación CSV"""
+    tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+    if not tag:
+        raise HTTPException(status_code=404, detail="Tag no encontrado")
+
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="El archivo debe ser CSV")
+
+    return tag
+
+
 @app.post("/users/import-csv")
-async def import_users_from_csv(
+def import_users_from_csv(
     file: UploadFile = File(...),
     tag_id: int = Form(...),
+    dry_run: bool = Form(False),
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
 ):
-    """Importar usuarios desde CSV y asignar tag (solo ADMIN)"""
-    import csv
-    import io
+    """
+    Importar usuarios desde CSV y asignar tag (solo ADMIN)
 
-    # Verificar que el tag existe
-    tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
-    if not tag:
-        raise HTTPException(status_code=404, detail="Tag no encontrado")
+    Se procesa por lotes (una transacción por lote). Con dry_run=true solo se
+    valida el archivo y se calcula el resultado, sin guardar nada.
+    """
+    from user_import_service import UserCSVImporter, iter_csv_rows
 
-    # Verificar que el archivo es CSV
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="El archivo debe ser CSV")
+    tag = _get_import_tag(db, tag_id, file)
 
-    # Leer el archivo CSV
-    try:
-        content = await file.read()
-        decoded_content = content.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(decoded_content))
-        rows = list(csv_reader)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error al leer el archivo CSV: {str(e)}")
+    importer = UserCSVImporter(db, tag, dry_run=dry_run)
+    stats = importer.import_all(iter_csv_rows(file.file))
 
-    # Estadísticas
-    stats = {
-        'created': 0,
-        'duplicates': 0,
-        'tag_added': 0,
-        'tag_already_exists': 0,
-        'errors': 0,
-        'total_processed': len(rows)
+    return {
+        "success": True,
+        "message": "Validación completada (no se guardaron cambios)" if dry_run else "Importación completada",
+        "dry_run": dry_run,
+        "stats": stats,
+        "tag_name": tag.name,
+        "errors": importer.errors
     }
 
-    errors = []
 
-    # Procesar cada fila
-    for i, row in enumerate(rows, start=1):
-        try:
-            email = row.get('email', '').strip().lower()
-            name = row.get('name', '').strip()
-            phone = row.get('phone', '').strip()
-
-            # Validar campos obligatorios: name, email, phone
-            if not email or not name or not phone:
-                missing = []
-                if not name: missing.append('name')
-                if not email: missing.append('email')
-                if not phone: missing.append('phone')
-                errors.append(f"Fila {i}: Campos obligatorios vacíos: {', '.join(missing)}")
-                stats['errors'] += 1
-                continue
+@app.post("/users/import-csv/stream")
+def import_users_from_csv_stream(
+    file: UploadFile = File(...),
+    tag_id: int = Form(...),
+    dry_run: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """
+    Importar usuarios desde CSV con Server-Sent Events para ver el progreso
 
-            # Buscar usuario existente
-            existing_user = db.query(models.User).filter(models.User.email == email).first()
+    Retorna un stream de eventos con el formato:
+    - event: start -> Inicio de la importación
+    - event: progress -> Resumen acumulado después de cada lote
+    - event: complete -> Estadísticas finales y errores
+    """
+    from user_import_service import UserCSVImporter, iter_csv_rows
 
-            if existing_user:
-                # Usuario duplicado - agregar tag si no lo tiene
-                stats['duplicates'] += 1
+    tag = _get_import_tag(db, tag_id, file)
 
-                if tag in existing_user.tags:
-                    stats['tag_already_exists'] += 1
-                else:
-                    existing_user.tags.append(tag)
-                    stats['tag_added'] += 1
-            else:
-                # Usuario nuevo - crear con el tag
-                # phone ya está extraído en la validación
-                country_code = row.get('country_code', '').strip() or '+57'
-                identification = row.get('identification', '').strip() or None
-                university_name = row.get('university_name', '').strip()
-                is_ieee_member = row.get('is_ieee_member', '').strip().lower() in ['true', '1', 'yes', 'sí', 'si']
-                ieee_member_id = row.get('ieee_member_id', '').strip() or None
-
-                # Buscar universidad
-                university_id = None
-                if university_name:
-                    university = db.query(models.University).filter(
-                        models.University.name == university_name
-                    ).first()
-                    if university:
-                        university_id = university.id
-
-                # Crear usuario
-                new_user = models.User(
-                    name=name,
-                    email=email,
-                    phone=phone,
-                    country_code=country_code,
-                    identification=identification,
-                    university_id=university_id,
-                    is_ieee_member=is_ieee_member,
-                    ieee_member_id=ieee_member_id,
-                    created_at=get_bogota_now_naive()
-                )
+    # Generador síncrono: Starlette lo itera en un hilo y no bloquea el event loop
+    def event_generator():
+        try:
+            importer = UserCSVImporter(db, tag, dry_run=dry_run)
+            yield f"data: {json.dumps({'event': 'start', 'tag_name': tag.name, 'dry_run': dry_run, 'batch_size': importer.batch_size})}\n\n"
 
-                db.add(new_user)
-                db.flush()  # Para obtener el ID
+            for progress in importer.run(iter_csv_rows(file.file)):
+                yield f"data: {json.dumps(dict(progress, event='progress'))}\n\n"
 
-                # Agregar el tag
-                new_user.tags.append(tag)
-                stats['created'] += 1
+            yield f"data: {json.dumps({'event': 'complete', 'dry_run': dry_run, 'stats': importer.stats, 'tag_name': tag.name, 'errors': importer.errors})}\n\n"
 
         except Exception as e:
-            errors.append(f"Fila {i}: {str(e)}")
-            stats['errors'] += 1
-            db.rollback()
-            continue
-
-    # Commit final
-    try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al guardar los cambios: {str(e)}")
+            yield f"data: {json.dumps({'event': 'error', 'message': str(e)})}\n\n"
 
-    return {
-        "success": True,
-        "message": "Importación completada",
-        "stats": stats,
-        "tag_name": tag.name,
-        "errors": errors[:50]  # Limitar a 50 errores
-    }
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 
 @app.post("/users/{user_id}/send-birthday")
@@ -2194,7 +2229,7 @@ def update_event(
 
 
 @app.post("/events/{event_id}/upload-whatsapp-image")
-async def upload_event_whatsapp_image(
+def upload_event_whatsapp_image(
     event_id: int,
     image: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -2213,7 +2248,7 @@ async def upload_event_whatsapp_image(
     if not image.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="El archivo debe ser una imagen")
 
-    content = await image.read()
+    content = image.file.read()
 
     # Generar nombre único para el archivo (siempre .jpg para optimización)
     filename = f"event_{event_id}_{int(datetime.now().timestamp())}.jpg"
@@ -2343,7 +2378,7 @@ def get_event_gallery(
 
 
 @app.post("/events/{event_id}/gallery")
-async def upload_event_gallery_image(
+def upload_event_gallery_image(
     event_id: int,
     image: UploadFile = File(...),
     caption: str = Form(None),
@@ -2365,7 +2400,7 @@ async def upload_event_gallery_image(
     if not image.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="El archivo debe ser una imagen")
 
-    content = await image.read()
+    content = image.file.read()
 
     # Crear directorio del evento si no existe
     event_gallery_dir = f"static/event_gallery/{event_id}"
@@ -2606,6 +2641,7 @@ def create_ticket(
         access_pin=access_pin
     )
     db.add(db_ticket)
+    record_tickets_added(db, ticket.event_id, once=1)
     db.commit()
     db.refresh(db_ticket)
     return db_ticket
@@ -2634,6 +2670,122 @@ def list_tickets(
     return tickets
 
 
+# Columnas por las que se puede ordenar el listado de /admin/tickets
+TICKET_GRID_SORTS = {
+    "id": models.Ticket.id,
+    "user": models.User.name,
+    "event": models.Event.name,
+    "created_at": models.Ticket.created_at,
+}
+
+
+@app.get("/tickets/grid")
+def tickets_grid(
+    page: int = 1,
+    page_size: int = 50,
+    event_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    used: Optional[bool] = None,
+    validation_mode: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: str = "id",
+    order: str = "desc",
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """
+    Página del listado de tickets de /admin/tickets.
+    Una consulta con los datos de usuario y evento (join) y otra para el total;
+    los filtros por evento, usuario y estado usan los índices de tickets.
+    """
+    if sort not in TICKET_GRID_SORTS:
+        raise HTTPException(status_code=400, detail=f"Orden no válido: {sort}")
+
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 200)
+
+    filters = []
+    if event_id:
+        filters.append(models.Ticket.event_id == event_id)
+    if user_id:
+        filters.append(models.Ticket.user_id == user_id)
+    if used is True:
+        filters.append(models.Ticket.is_used == True)
+    elif used is False:
+        filters.append(or_(models.Ticket.is_used == False, models.Ticket.is_used.is_(None)))
+    if validation_mode in ("once", "daily"):
+        filters.append(models.Ticket.validation_mode == validation_mode)
+
+    search = (q or "").strip()
+    if search:
+        search_term = f"%{search}%"
+        conditions = [
+            models.User.name.ilike(search_term),
+            models.User.email.ilike(search_term),
+            models.Event.name.ilike(search_term),
+            models.Ticket.ticket_code.like(f"{search}%")
+        ]
+        if search.isdigit():
+            conditions.append(models.Ticket.id == int(search))
+        filters.append(or_(*conditions))
+
+    total_query = db.query(func.count(models.Ticket.id))
+    if search:
+        total_query = total_query.join(
+            models.User, models.Ticket.user_id == models.User.id
+        ).join(
+            models.Event, models.Ticket.event_id == models.Event.id
+        )
+    total = total_query.filter(*filters).scalar() or 0
+
+    sort_column = TICKET_GRID_SORTS[sort]
+    ordering = [sort_column.asc(), models.Ticket.id.asc()] if order == "asc" else [sort_column.desc(), models.Ticket.id.desc()]
+
+    rows = db.query(
+        models.Ticket.id,
+        models.Ticket.ticket_code,
+        models.Ticket.user_id,
+        models.Ticket.event_id,
+        models.Ticket.companions,
+        models.Ticket.validation_mode,
+        models.Ticket.created_at,
+        models.Ticket.is_used,
+        models.Ticket.used_at,
+        models.User.name,
+        models.User.email,
+        models.Event.name
+    ).join(
+        models.User, models.Ticket.user_id == models.User.id
+    ).join(
+        models.Event, models.Ticket.event_id == models.Event.id
+    ).filter(*filters).order_by(*ordering).offset((page - 1) * page_size).limit(page_size).all()
+
+    return {
+        "tickets": [
+            {
+                "id": ticket_id,
+                "ticket_code": ticket_code,
+                "user_id": ticket_user_id,
+                "user_name": user_name,
+                "user_email": user_email,
+                "event_id": ticket_event_id,
+                "event_name": event_name,
+                "companions": companions or 0,
+                "validation_mode": mode or 'once',
+                "created_at": created_at.strftime('%d/%m/%Y %H:%M') if created_at else None,
+                "is_used": bool(is_used),
+                "used_at": used_at.strftime('%d/%m/%Y %H:%M') if used_at else None
+            }
+            for (ticket_id, ticket_code, ticket_user_id, ticket_event_id, companions, mode,
+                 created_at, is_used, used_at, user_name, user_email, event_name) in rows
+        ],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": (total + page_size - 1) // page_size
+    }
+
+
 @app.get("/tickets/{ticket_id}", response_model=schemas.TicketResponse)
 def get_ticket(
     ticket_id: int,
@@ -2662,9 +2814,11 @@ def reactivate_ticket(
         raise HTTPException(status_code=400, detail="El ticket no ha sido usado aún")
 
     # Eliminar todos los registros de validación de este ticket
+    validations = count_ticket_validations(db, ticket_id)
     db.query(models.ValidationLog).filter(
         models.ValidationLog.ticket_id == ticket_id
     ).delete()
+    record_validations_cleared(db, ticket.event_id, validations)
 
     # Reactivar el ticket
     ticket.is_used = False
@@ -2697,7 +2851,9 @@ def update_ticket(
         ticket.companions = ticket_update.companions
 
     if ticket_update.validation_mode is not None:
+        old_mode = ticket.validation_mode
         ticket.validation_mode = ticket_update.validation_mode
+        record_mode_change(db, ticket.event_id, old_mode, ticket_update.validation_mode)
 
     db.commit()
     db.refresh(ticket)
@@ -2724,7 +2880,9 @@ def delete_ticket(
         except Exception as e:
             print(f"Error al eliminar archivo QR: {e}")
 
+    validations = count_ticket_validations(db, ticket.id)
     db.delete(ticket)
+    record_ticket_removed(db, ticket.event_id, ticket.validation_mode, validations)
     db.commit()
 
     return {
@@ -2833,146 +2991,73 @@ def send_ticket_email(
         raise HTTPException(status_code=500, detail="Error al enviar el correo")
 
 
-@app.post("/tickets/send-email-by-event-stream")
-async def send_tickets_email_by_event_stream(
-    data: dict,
-    db: Session = Depends(get_db),
-    current_user: models.AdminUser = Depends(require_admin)
-):
-    """
-    Enviar tickets por Email masivamente con Server-Sent Events para progreso en tiempo real
-
-    Body:
-    - event_id: ID del evento
-
-    Retorna un stream de eventos con el formato:
-    - event: progress -> Progreso de envío individual
-    - event: complete -> Resumen final
-    """
+def _send_stream_response(request: Request, db: Session, current_user: models.AdminUser,
+                          channel: str, data: dict, target, *args):
+    """Inicia (o retoma) un envío de send_streams y transmite su progreso"""
     event_id = data.get('event_id')
+    run_id = data.get('run_id')
 
-    if not event_id:
+    if not event_id and not run_id:
         raise HTTPException(status_code=400, detail="event_id es requerido")
 
-    # Función generadora para SSE
-    async def event_generator():
-        try:
-            # Verificar que el evento existe
-            event = db.query(models.Event).filter(models.Event.id == event_id).first()
-            if not event:
-                yield f"data: {json.dumps({'event': 'error', 'message': 'Evento no encontrado'})}\n\n"
-                return
-
-            # Cargar organización del evento si existe
-            organization = None
-            if event.organization_id:
-                organization = db.query(models.Organization).filter(
-                    models.Organization.id == event.organization_id
-                ).first()
-
-            # Obtener todos los tickets del evento con sus usuarios
-            from sqlalchemy.orm import joinedload
-
-            tickets = db.query(models.Ticket).options(
-                joinedload(models.Ticket.user)
-            ).filter(
-                models.Ticket.event_id == event_id
-            ).all()
-
-            if not tickets:
-                yield f"data: {json.dumps({'event': 'error', 'message': 'No se encontraron tickets para este evento'})}\n\n"
-                return
-
-            # Enviar evento de inicio
-            yield f"data: {json.dumps({'event': 'start', 'total': len(tickets), 'event_name': event.name})}\n\n"
-
-            # Enviar tickets por Email
-            sent_count = 0
-            skipped_count = 0
-            errors = []
-
-            import asyncio
-
-            for idx, ticket in enumerate(tickets):
-                user = ticket.user
-
-                try:
-                    # Verificar que el usuario tenga email
-                    if not user.email:
-                        skipped_count += 1
-                        error_msg = f"{user.name}: Sin correo electrónico"
-                        errors.append(error_msg)
-
-                        # Enviar evento de skip
-                        yield f"data: {json.dumps({'event': 'skip', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'reason': 'Sin email'})}\n\n"
-                        continue
-
-                    # Enviar evento de progreso - enviando
-                    yield f"data: {json.dumps({'event': 'sending', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'email': user.email})}\n\n"
-
-                    # Construir URL completa del ticket
-                    ticket_url = f"{BASE_URL}/ticket/{ticket.unique_url}"
-
-                    # Enviar por Email
-                    success = email_service.send_ticket_email(
-                        to_email=user.email,
-                        user_name=user.name,
-                        event_name=event.name,
-                        event_date=event.event_date,
-                        event_location=event.location,
-                        ticket_code=ticket.ticket_code,
-                        ticket_url=ticket_url,
-                        access_pin=ticket.access_pin,
-                        companions=ticket.companions,
-                        organization=organization,
-                        event=event
-                    )
-
-                    if success:
-                        sent_count += 1
-                        # Enviar evento de éxito
-                        yield f"data: {json.dumps({'event': 'success', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'email': user.email})}\n\n"
-                    else:
-                        skipped_count += 1
-                        error_msg = f"{user.name}: Error al enviar email"
-                        errors.append(error_msg)
-                        # Enviar evento de error
-                        yield f"data: {json.dumps({'event': 'error', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'reason': 'Error al enviar'})}\n\n"
-
-                    # Pequeño delay entre envíos para evitar rate limiting
-                    await asyncio.sleep(0.5)
-
-                except Exception as e:
-                    skipped_count += 1
-                    error_msg = f"{user.name}: {str(e)}"
-                    errors.append(error_msg)
-                    # Enviar evento de error
-                    yield f"data: {json.dumps({'event': 'error', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'reason': str(e)})}\n\n"
-                    continue
+    try:
+        last_event_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_event_id = 0
 
-            # Enviar evento de completado
-            yield f"data: {json.dumps({'event': 'complete', 'sent': sent_count, 'skipped': skipped_count, 'total': len(tickets), 'errors': errors})}\n\n"
+    if not run_id:
+        # Si el evento ya se está enviando, unirse a ese envío en lugar de duplicarlo
+        run_id, started = start_or_join_run(db, channel, event_id, current_user.id, target, event_id, *args)
+        if started:
+            last_event_id = 0
 
-        except Exception as e:
-            yield f"data: {json.dumps({'event': 'error', 'message': str(e)})}\n\n"
+    # follow_run abre sus propias sesiones: la de la petición (y de require_admin)
+    # se cerraría recién al terminar el stream, reteniendo una conexión del pool
+    db.close()
 
     return StreamingResponse(
-        event_generator(),
+        follow_run(run_id, last_event_id),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
+            "X-Accel-Buffering": "no",
+            "X-Send-Run-Id": run_id
         }
     )
 
 
+@app.post("/tickets/send-email-by-event-stream")
+def send_tickets_email_by_event_stream(
+    data: dict,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """
+    Enviar tickets por Email masivamente con Server-Sent Events para progreso en tiempo real
+
+    Body:
+    - event_id: ID del evento
+    - run_id: (opcional) envío a retomar, junto con la cabecera Last-Event-ID
+
+    El envío corre en segundo plano (send_streams): cerrar la conexión no lo
+    detiene, y cada evento lleva un `id:` para retomar el progreso.
+
+    Retorna un stream de eventos con el formato:
+    - event: start -> Total de tickets y run_id del envío
+    - event: sending / success / skip / error -> Progreso de cada ticket (en orden de llegada)
+    - event: complete -> Resumen final
+    """
+    return _send_stream_response(request, db, current_user, "email", data, send_event_emails, BASE_URL)
+
+
 # ============================================
 # WhatsApp Webhook Endpoints
 # ============================================
 
 @app.get("/webhooks/whatsapp")
-async def whatsapp_webhook_verification(request: Request):
+def whatsapp_webhook_verification(request: Request):
     """
     Endpoint de verificación del webhook de WhatsApp.
     Meta enviará una petición GET con estos parámetros para verificar el webhook.
@@ -3002,143 +3087,19 @@ async def whatsapp_webhook_handler(request: Request):
     - Mensajes recibidos
     - Estados de mensajes enviados (entregado, leído, etc.)
     - Otros eventos
+
+    Solo guarda el cuerpo en la bandeja de webhooks y responde de inmediato;
+    el consumidor de whatsapp_inbox (en job_worker.py) lo procesa por lotes.
     """
-    db = next(get_db())
+    payload = await request.body()
     try:
-        body = await request.json()
-
-        # Logging del evento recibido
-        print(f"[WEBHOOK] Evento de WhatsApp recibido:")
-        print(json.dumps(body, indent=2))
-
-        if "entry" in body:
-            for entry in body["entry"]:
-                if "changes" in entry:
-                    for change in entry["changes"]:
-                        if "value" in change:
-                            value = change["value"]
-
-                            # Procesar mensajes recibidos
-                            if "messages" in value:
-                                contacts = value.get("contacts", [])
-                                messages = value["messages"]
-
-                                for message in messages:
-                                    from_number = message.get("from")
-                                    msg_type = message.get("type")
-                                    msg_id = message.get("id")
-                                    timestamp = message.get("timestamp")
-
-                                    # Obtener nombre del contacto
-                                    contact_name = None
-                                    for contact in contacts:
-                                        if contact.get("wa_id") == from_number:
-                                            contact_name = contact.get("profile", {}).get("name")
-                                            break
-
-                                    print(f"[WEBHOOK] Mensaje de {from_number} ({contact_name}): {msg_type}")
-
-                                    # Verificar si el mensaje ya existe
-                                    existing = db.query(models.WhatsAppMessage).filter(
-                                        models.WhatsAppMessage.wa_message_id == msg_id
-                                    ).first()
-
-                                    if not existing:
-                                        # Extraer contenido según tipo
-                                        text_body = None
-                                        media_id = None
-                                        caption = None
-
-                                        if msg_type == "text":
-                                            text_body = message.get("text", {}).get("body")
-                                        elif msg_type in ["image", "video", "audio", "document", "sticker"]:
-                                            media_data = message.get(msg_type, {})
-                                            media_id = media_data.get("id")
-                                            caption = media_data.get("caption")
-                                        elif msg_type == "location":
-                                            loc = message.get("location", {})
-                                            text_body = f"Ubicación: {loc.get('latitude')}, {loc.get('longitude')}"
-
-                                        # Crear mensaje en BD
-                                        new_message = models.WhatsAppMessage(
-                                            wa_message_id=msg_id,
-                                            from_number=from_number,
-                                            from_name=contact_name,
-                                            message_type=msg_type,
-                                            text_body=text_body,
-                                            media_id=media_id,
-                                            caption=caption,
-                                            context_message_id=message.get("context", {}).get("id"),
-                                            is_forwarded=message.get("context", {}).get("forwarded", False),
-                                            timestamp=datetime.fromtimestamp(int(timestamp)) if timestamp else datetime.utcnow(),
-                                            raw_payload=json.dumps(message)
-                                        )
-                                        db.add(new_message)
-
-                                        # Actualizar o crear conversación
-                                        conversation = db.query(models.WhatsAppConversation).filter(
-                                            models.WhatsAppConversation.phone_number == from_number
-                                        ).first()
-
-                                        if conversation:
-                                            conversation.last_message_at = datetime.utcnow()
-                                            conversation.last_user_message_at = datetime.utcnow()
-                                            conversation.unread_count += 1
-                                            conversation.is_active = True
-                                            if contact_name and not conversation.contact_name:
-                                                conversation.contact_name = contact_name
-                                        else:
-                                            # Buscar usuario por teléfono
-                                            user = db.query(models.User).filter(
-                                                models.User.phone == from_number[-10:]  # Últimos 10 dígitos
-                                            ).first()
-
-                                            conversation = models.WhatsAppConversation(
-                                                phone_number=from_number,
-                                                contact_name=contact_name,
-                                                user_id=user.id if user else None,
-                                                last_message_at=datetime.utcnow(),
-                                                last_user_message_at=datetime.utcnow(),
-                                                unread_count=1,
-                                                is_active=True
-                                            )
-                                            db.add(conversation)
-
-                                        db.commit()
-
-                            # Procesar estados de mensajes
-                            if "statuses" in value:
-                                statuses = value["statuses"]
-                                for status_data in statuses:
-                                    msg_id = status_data.get("id")
-                                    status_type = status_data.get("status")
-                                    recipient = status_data.get("recipient_id")
-                                    print(f"[WEBHOOK] Estado: {msg_id} -> {status_type}")
-
-                                    # Actualizar MessageRecipient si existe
-                                    recipient_record = db.query(models.MessageRecipient).filter(
-                                        models.MessageRecipient.whatsapp_message_id == msg_id
-                                    ).first()
-
-                                    if recipient_record:
-                                        recipient_record.whatsapp_status = status_type
-                                        recipient_record.whatsapp_status_updated_at = datetime.utcnow()
-                                        if status_type == "failed":
-                                            recipient_record.whatsapp_sent = False
-                                            error_info = status_data.get("errors", [{}])[0]
-                                            recipient_record.whatsapp_error = error_info.get("message", "Error desconocido")
-                                        db.commit()
-
-        return {"status": "ok"}
-
-    except Exception as e:
-        print(f"[WEBHOOK] Error procesando webhook: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        db.rollback()
+        json.loads(payload)
+    except ValueError as e:
+        print(f"[WEBHOOK] Cuerpo inválido: {str(e)}")
         return {"status": "error", "message": str(e)}
-    finally:
-        db.close()
+
+    await asyncio.to_thread(enqueue_webhook, payload.decode("utf-8"))
+    return {"status": "ok"}
 
 
 # ============================================
@@ -3555,17 +3516,23 @@ def get_event_email_template_preview(
 @app.post("/tickets/bulk-by-tag")
 def create_bulk_tickets_by_tag(
     data: dict,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
 ):
     """
-    Crear tickets masivos para todos los usuarios con una etiqueta específica
+    Crear tickets masivos para todos los usuarios con una etiqueta específica.
+    Los tickets se insertan en lote; los QRs se generan en segundo plano
+    (y bajo demanda en /api/qr/{ticket_code} si aún no existen).
 
     Body:
     - event_id: ID del evento
     - tag_id: ID de la etiqueta
     - companions: Número de acompañantes (0-4) para todos los tickets
     """
+    import time
+    from sqlalchemy import insert
+
     event_id = data.get('event_id')
     tag_id = data.get('tag_id')
     companions = data.get('companions', 0)
@@ -3583,69 +3550,68 @@ def create_bulk_tickets_by_tag(
     if not tag:
         raise HTTPException(status_code=404, detail="Tag no encontrado")
 
-    # Obtener todos los usuarios con ese tag
-    users = db.query(models.User).join(models.user_tags).filter(
+    timings = {}
+    started = time.perf_counter()
+
+    # Fase 1: usuarios con ese tag (solo las columnas necesarias)
+    users = db.query(models.User.id, models.User.name).join(
+        models.user_tags, models.user_tags.c.user_id == models.User.id
+    ).filter(
         models.user_tags.c.tag_id == tag_id
     ).all()
+    timings["load_users_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
     if not users:
         raise HTTPException(status_code=404, detail=f"No se encontraron usuarios con la etiqueta '{tag.name}'")
 
-    # Crear tickets para cada usuario
-    created_count = 0
-    skipped_count = 0
-    errors = []
-
-    for user in users:
-        try:
-            # Verificar si el usuario ya tiene un ticket para este evento
-            existing_ticket = db.query(models.Ticket).filter(
-                models.Ticket.user_id == user.id,
-                models.Ticket.event_id == event_id
-            ).first()
-
-            if existing_ticket:
-                skipped_count += 1
-                continue
-
-            # Generar código de ticket
-            ticket_code = ticket_service.generate_ticket_code(user.id, event_id)
+    # Fase 2: usuarios del tag que ya tienen ticket para el evento, en una sola consulta
+    phase_start = time.perf_counter()
+    existing_user_ids = {
+        user_id for (user_id,) in db.query(models.Ticket.user_id).join(
+            models.user_tags, models.user_tags.c.user_id == models.Ticket.user_id
+        ).filter(
+            models.user_tags.c.tag_id == tag_id,
+            models.Ticket.event_id == event_id
+        ).all()
+    }
+    timings["prefetch_existing_ms"] = round((time.perf_counter() - phase_start) * 1000, 1)
 
-            # Generar URL única y PIN
-            unique_url = ticket_service.generate_unique_url()
-            access_pin = ticket_service.generate_pin()
+    # Fase 3: construir e insertar los tickets nuevos en lote
+    phase_start = time.perf_counter()
+    rows = []
+    for user_id, _ in users:
+        if user_id in existing_user_ids:
+            continue
+        ticket_code = ticket_service.generate_ticket_code(user_id, event_id)
+        rows.append({
+            "ticket_code": ticket_code,
+            "user_id": user_id,
+            "event_id": event_id,
+            "qr_path": ticket_service.qr_path_for(ticket_code),
+            "unique_url": ticket_service.generate_unique_url(),
+            "access_pin": ticket_service.generate_pin(),
+            "companions": companions
+        })
 
-            # Generar QR code
-            qr_path = ticket_service.generate_qr_code(
-                ticket_code=ticket_code,
-                user_name=user.name,
-                event_name=event.name,
-                event_date=event.event_date.isoformat()
-            )
+    if rows:
+        try:
+            db.execute(insert(models.Ticket), rows)
+            record_tickets_added(db, event_id, once=len(rows))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"Error al guardar tickets: {str(e)}")
+    timings["insert_ms"] = round((time.perf_counter() - phase_start) * 1000, 1)
 
-            # Crear ticket en la BD
-            db_ticket = models.Ticket(
-                ticket_code=ticket_code,
-                user_id=user.id,
-                event_id=event_id,
-                qr_path=qr_path,
-                unique_url=unique_url,
-                access_pin=access_pin,
-                companions=companions
-            )
-            db.add(db_ticket)
-            created_count += 1
+    # Fase 4: QRs fuera de la petición
+    if rows:
+        background_tasks.add_task(_generate_bulk_qr_codes, [row["ticket_code"] for row in rows])
 
-        except Exception as e:
-            errors.append(f"Error al crear ticket para {user.name}: {str(e)}")
-            continue
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    created_count = len(rows)
+    skipped_count = len(users) - created_count
 
-    # Commit de todos los tickets creados
-    try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al guardar tickets: {str(e)}")
+    print(f"[BULK TICKETS] Evento {event_id}, tag '{tag.name}': {created_count} creados, {skipped_count} omitidos. Tiempos: {timings}")
 
     return {
         "success": True,
@@ -3655,10 +3621,24 @@ def create_bulk_tickets_by_tag(
         "total_users": len(users),
         "tag_name": tag.name,
         "event_name": event.name,
-        "errors": errors if errors else []
+        "qr_generation": "background" if rows else "none",
+        "timings": timings,
+        "errors": []
     }
 
 
+def _generate_bulk_qr_codes(ticket_codes: List[str]):
+    """Tarea en segundo plano: genera los QRs de los tickets creados en lote"""
+    import time
+
+    started = time.perf_counter()
+    try:
+        generated = ticket_service.generate_qr_codes_bulk(ticket_codes)
+        print(f"[BULK TICKETS] {generated} QRs generados en {(time.perf_counter() - started) * 1000:.0f} ms")
+    except Exception as e:
+        print(f"[ERROR] Generando QRs en lote: {str(e)}")
+
+
 @app.post("/tickets/send-whatsapp-by-event")
 def send_tickets_whatsapp_by_event(
     data: dict,
@@ -3666,7 +3646,8 @@ def send_tickets_whatsapp_by_event(
     current_user: models.AdminUser = Depends(require_admin)
 ):
     """
-    Enviar tickets por WhatsApp masivamente a todos los usuarios con ticket de un evento
+    Encolar el envío de tickets por WhatsApp a todos los usuarios con ticket de un evento.
+    El envío lo realiza job_worker.py; el progreso se consulta en /jobs/{job_id}
 
     Body:
     - event_id: ID del evento
@@ -3681,15 +3662,8 @@ def send_tickets_whatsapp_by_event(
     if not event:
         raise HTTPException(status_code=404, detail="Evento no encontrado")
 
-    # Cargar organización del evento si existe
-    organization = None
-    if event.organization_id:
-        organization = db.query(models.Organization).filter(
-            models.Organization.id == event.organization_id
-        ).first()
-
     # Verificar que WhatsApp esté disponible
-    from whatsapp_client import send_ticket_whatsapp, WhatsAppClient
+    from whatsapp_client import WhatsAppClient
 
     whatsapp_client = WhatsAppClient()
     if not whatsapp_client.is_ready():
@@ -3698,11 +3672,11 @@ def send_tickets_whatsapp_by_event(
             detail="Servicio de WhatsApp no disponible. Verifica que esté conectado."
         )
 
-    # Obtener todos los tickets del evento con sus usuarios
-    from sqlalchemy.orm import joinedload
-
-    tickets = db.query(models.Ticket).options(
-        joinedload(models.Ticket.user)
+    # Obtener todos los tickets del evento con el teléfono de sus usuarios
+    tickets = db.query(
+        models.Ticket.id, models.User.name, models.User.phone, models.User.country_code
+    ).join(
+        models.User, models.Ticket.user_id == models.User.id
     ).filter(
         models.Ticket.event_id == event_id
     ).all()
@@ -3713,79 +3687,44 @@ def send_tickets_whatsapp_by_event(
             detail=f"No se encontraron tickets para el evento '{event.name}'"
         )
 
-    # Enviar tickets por WhatsApp con delay entre mensajes
-    sent_count = 0
-    skipped_count = 0
-    errors = []
-
-    # Formatear fecha del evento
-    event_date_formatted = event.event_date.strftime('%d/%m/%Y a las %H:%M')
+    # Los usuarios sin teléfono se omiten; el resto se encola para job_worker.py
+    errors = [f"{name}: Sin número de teléfono" for _, name, phone, country_code in tickets if not phone or not country_code]
+    task_targets = [("whatsapp", ticket_id) for ticket_id, _, phone, country_code in tickets if phone and country_code]
+    if not task_targets:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Ningún ticket del evento '{event.name}' tiene número de teléfono"
+        )
 
-    import time
+    job = enqueue_job(
+        db,
+        job_type="event_tickets_whatsapp",
+        tasks=task_targets,
+        payload={"base_url": BASE_URL},
+        created_by=current_user.id,
+        event_id=event.id
+    )
+    db.commit()
 
-    for idx, ticket in enumerate(tickets):
-        user = ticket.user
+    print(f"[JOBS] Job {job.id}: {len(task_targets)} tickets de '{event.name}' en cola")
 
-        try:
-            # Verificar que el usuario tenga teléfono
-            if not user.phone or not user.country_code:
-                skipped_count += 1
-                errors.append(f"{user.name}: Sin número de teléfono")
-                continue
-
-            # Construir URL completa del ticket
-            ticket_url = f"{BASE_URL}/ticket/{ticket.unique_url}"
-
-            # Enviar por WhatsApp
-            success = send_ticket_whatsapp(
-                phone=user.phone,
-                country_code=user.country_code,
-                user_name=user.name,
-                event_name=event.name,
-                event_location=event.location,
-                event_date=event_date_formatted,
-                ticket_code=ticket.ticket_code,
-                ticket_url=ticket_url,
-                access_pin=ticket.access_pin,
-                companions=ticket.companions or 0,
-                organization=organization,
-                event=event
-            )
-
-            if success:
-                sent_count += 1
-            else:
-                skipped_count += 1
-                errors.append(f"{user.name}: Error al enviar mensaje")
-
-            # Delay progresivo entre mensajes para evitar colapso
-            # 2 segundos base + 0.5s extra cada 10 mensajes
-            base_delay = 2.0
-            extra_delay = (idx // 10) * 0.5
-            total_delay = min(base_delay + extra_delay, 5.0)  # Max 5 segundos
-
-            if idx < len(tickets) - 1:  # No esperar después del último
-                time.sleep(total_delay)
-
-        except Exception as e:
-            skipped_count += 1
-            errors.append(f"{user.name}: {str(e)}")
-            continue
-
-    return {
-        "success": True,
-        "message": f"Se enviaron {sent_count} tickets exitosamente por WhatsApp",
-        "sent_count": sent_count,
-        "skipped_count": skipped_count,
-        "total_tickets": len(tickets),
-        "event_name": event.name,
-        "errors": errors if errors else []
-    }
+    return {
+        "success": True,
+        "message": f"Se encolaron {len(task_targets)} tickets para envío por WhatsApp",
+        "job_id": job.id,
+        "status": job.status,
+        "queued_count": len(task_targets),
+        "skipped_count": len(errors),
+        "total_tickets": len(tickets),
+        "event_name": event.name,
+        "errors": errors
+    }
 
 
 @app.post("/tickets/send-whatsapp-by-event-stream")
-async def send_tickets_whatsapp_by_event_stream(
+def send_tickets_whatsapp_by_event_stream(
     data: dict,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
 ):
@@ -3796,181 +3735,23 @@ async def send_tickets_whatsapp_by_event_stream(
     - event_id: ID del evento
     - use_template: (opcional) Si es True, usa template de Meta. Default: False
     - template_name: (opcional) Nombre del template a usar. Default: "tickets_event"
+    - run_id: (opcional) envío a retomar, junto con la cabecera Last-Event-ID
+
+    Los envíos corren en segundo plano con SEND_STREAM_CONCURRENCY en vuelo
+    (send_streams): cerrar la conexión no los detiene, y cada evento lleva un
+    `id:` para retomar el progreso.
 
     Retorna un stream de eventos con el formato:
-    - event: progress -> Progreso de envío individual
+    - event: start -> Total de tickets y run_id del envío
+    - event: sending / success / skip / error -> Progreso de cada ticket (en orden de llegada)
     - event: complete -> Resumen final
     """
-    event_id = data.get('event_id')
     use_template = data.get('use_template', False)
     template_name = data.get('template_name', 'tickets_event')
 
-    if not event_id:
-        raise HTTPException(status_code=400, detail="event_id es requerido")
-
-    # Función generadora para SSE
-    async def event_generator():
-        try:
-            # Verificar que el evento existe
-            event = db.query(models.Event).filter(models.Event.id == event_id).first()
-            if not event:
-                yield f"data: {json.dumps({'event': 'error', 'message': 'Evento no encontrado'})}\n\n"
-                return
-
-            # Cargar organización del evento si existe
-            organization = None
-            if event.organization_id:
-                organization = db.query(models.Organization).filter(
-                    models.Organization.id == event.organization_id
-                ).first()
-
-            # Verificar que WhatsApp esté disponible
-            from whatsapp_client import send_ticket_whatsapp, send_ticket_with_template, WhatsAppClient
-
-            whatsapp_client = WhatsAppClient()
-            if not whatsapp_client.is_ready():
-                yield f"data: {json.dumps({'event': 'error', 'message': 'Servicio de WhatsApp no disponible'})}\n\n"
-                return
-
-            # Obtener todos los tickets del evento con sus usuarios
-            from sqlalchemy.orm import joinedload
-
-            tickets = db.query(models.Ticket).options(
-                joinedload(models.Ticket.user)
-            ).filter(
-                models.Ticket.event_id == event_id
-            ).all()
-
-            if not tickets:
-                yield f"data: {json.dumps({'event': 'error', 'message': 'No se encontraron tickets para este evento'})}\n\n"
-                return
-
-            # Enviar evento de inicio
-            yield f"data: {json.dumps({'event': 'start', 'total': len(tickets), 'event_name': event.name})}\n\n"
-
-            # Enviar tickets por WhatsApp con delay entre mensajes
-            sent_count = 0
-            skipped_count = 0
-            errors = []
-
-            # Formatear fecha del evento
-            event_date_formatted = event.event_date.strftime('%d/%m/%Y a las %H:%M')
-
-            import time
-            import asyncio
-
-            for idx, ticket in enumerate(tickets):
-                user = ticket.user
-
-                try:
-                    # Verificar que el usuario tenga teléfono
-                    if not user.phone or not user.country_code:
-                        skipped_count += 1
-                        error_msg = f"{user.name}: Sin número de teléfono"
-                        errors.append(error_msg)
-
-                        # Enviar evento de skip
-                        yield f"data: {json.dumps({'event': 'skip', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'reason': 'Sin teléfono'})}\n\n"
-                        continue
-
-                    # Enviar evento de progreso - enviando
-                    yield f"data: {json.dumps({'event': 'sending', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'phone': f'{user.country_code}{user.phone}'})}\n\n"
-
-                    # Construir URL completa del ticket
-                    ticket_url = f"{BASE_URL}/ticket/{ticket.unique_url}"
-
-                    # Enviar por WhatsApp
-                    if use_template:
-                        # Usar template de Meta
-                        # Para tickets_event, el QR es OBLIGATORIO (header IMAGE)
-                        qr_base64 = None
-                        needs_qr = template_name == "tickets_event"
-
-                        if needs_qr or (event and hasattr(event, 'send_qr_with_whatsapp') and event.send_qr_with_whatsapp):
-                            try:
-                                from ticket_service import ticket_service
-                                qr_base64 = ticket_service.generate_qr_base64(
-                                    ticket_code=ticket.ticket_code,
-                                    user_name=user.name,
-                                    event_name=event.name,
-                                    event_date=event_date_formatted
-                                )
-                            except Exception as qr_err:
-                                print(f"[WARNING] No se pudo generar QR para template: {qr_err}")
-                                if needs_qr:
-                                    # Si el template requiere QR y no se pudo generar, es un error
-                                    raise Exception(f"El template '{template_name}' requiere QR: {qr_err}")
-
-                        result = send_ticket_with_template(
-                            phone=user.phone,
-                            country_code=user.country_code,
-                            user_name=user.name,
-                            event_name=event.name,
-                            event_location=event.location,
-                            event_date=event_date_formatted,
-                            ticket_code=ticket.ticket_code,
-                            ticket_url=ticket_url,
-                            access_pin=ticket.access_pin,
-                            companions=ticket.companions or 0,
-                            template_name=template_name,
-                            qr_image_base64=qr_base64
-                        )
-                        success = result.get("success", False)
-                        error_reason = result.get("error", "Error al enviar template")
-                    else:
-                        # Mensaje libre
-                        success = send_ticket_whatsapp(
-                            phone=user.phone,
-                            country_code=user.country_code,
-                            user_name=user.name,
-                            event_name=event.name,
-                            event_location=event.location,
-                            event_date=event_date_formatted,
-                            ticket_code=ticket.ticket_code,
-                            ticket_url=ticket_url,
-                            access_pin=ticket.access_pin,
-                            companions=ticket.companions or 0,
-                            organization=organization,
-                            event=event
-                        )
-                        error_reason = "Error al enviar mensaje"
-
-                    if success:
-                        sent_count += 1
-                        # Enviar evento de éxito
-                        method_info = f" (template: {template_name})" if use_template else ""
-                        yield f"data: {json.dumps({'event': 'success', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'phone': f'{user.country_code}{user.phone}', 'method': 'template' if use_template else 'free_text'})}\n\n"
-                    else:
-                        skipped_count += 1
-                        error_msg = f"{user.name}: {error_reason}"
-                        errors.append(error_msg)
-                        # Enviar evento de error
-                        yield f"data: {json.dumps({'event': 'error', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'reason': error_reason})}\n\n"
-
-                    # Delay progresivo entre mensajes para evitar colapso
-                    # 2 segundos base + 0.5s extra cada 10 mensajes
-                    base_delay = 2.0
-                    extra_delay = (idx // 10) * 0.5
-                    total_delay = min(base_delay + extra_delay, 5.0)  # Max 5 segundos
-
-                    if idx < len(tickets) - 1:  # No esperar después del último
-                        await asyncio.sleep(total_delay)
-
-                except Exception as e:
-                    skipped_count += 1
-                    error_msg = f"{user.name}: {str(e)}"
-                    errors.append(error_msg)
-                    # Enviar evento de error
-                    yield f"data: {json.dumps({'event': 'error', 'index': idx + 1, 'total': len(tickets), 'user': user.name, 'reason': str(e)})}\n\n"
-                    continue
-
-            # Enviar evento de finalización
-            yield f"data: {json.dumps({'event': 'complete', 'sent_count': sent_count, 'skipped_count': skipped_count, 'total_tickets': len(tickets), 'errors': errors})}\n\n"
-
-        except Exception as e:
-            yield f"data: {json.dumps({'event': 'error', 'message': str(e)})}\n\n"
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return _send_stream_response(
+        request, db, current_user, "whatsapp", data, send_event_whatsapp, BASE_URL, use_template, template_name
+    )
 
 
 # ========== ENDPOINTS DE VALIDACIÓN ==========
@@ -3987,126 +3768,22 @@ def validate_ticket(
     - 'once': Ticket puede ser validado una sola vez
     - 'daily': Ticket puede ser validado una vez por día durante la duración del evento
     """
-    try:
-        # Buscar el ticket por código
-        ticket = db.query(models.Ticket).filter(
-            models.Ticket.ticket_code == validation.ticket_code
-        ).first()
-
-        if not ticket:
-            return schemas.TicketValidationResponse(
-                valid=False,
-                message="Ticket no encontrado o inválido"
-            )
-
-        # Obtener usuario y evento
-        user = db.query(models.User).filter(models.User.id == ticket.user_id).first()
-        event = db.query(models.Event).filter(models.Event.id == ticket.event_id).first()
-
-        if not user or not event:
-            return schemas.TicketValidationResponse(
-                valid=False,
-                message="Error: Usuario o evento no encontrado"
-            )
-
-        # Obtener todas las validaciones previas del ticket
-        previous_validations = db.query(models.ValidationLog).filter(
-            models.ValidationLog.ticket_id == ticket.id,
-            models.ValidationLog.success == True
-        ).order_by(models.ValidationLog.validated_at.desc()).all()
-
-        validation_count = len(previous_validations)
-        current_time_bogota = get_bogota_now_naive()
-
-        # Lógica de validación según el modo
-        if ticket.validation_mode == 'once':
-            # Modo: Una sola validación
-            if validation_count > 0:
-                last_validation = previous_validations[0]
-                last_validation_time = format_datetime_bogota(
-                    last_validation.validated_at,
-                    '%d/%m/%Y %H:%M'
-                )
-                return schemas.TicketValidationResponse(
-                    valid=False,
-                    message=f"Ticket ya fue utilizado el {last_validation_time}",
-                    validation_count=validation_count
-                )
-
-        elif ticket.validation_mode == 'daily':
-            # Modo: Una validación por día
-            if validation_count > 0:
-                # Verificar si ya hay una validación hoy
-                validations_today = [
-                    v for v in previous_validations
-                    if is_same_day_bogota(v.validated_at, current_time_bogota)
-                ]
-
-                if validations_today:
-                    last_validation_today = validations_today[0]
-                    last_validation_time = format_datetime_bogota(
-                        last_validation_today.validated_at,
-                        '%d/%m/%Y %H:%M'
-                    )
-                    return schemas.TicketValidationResponse(
-                        valid=False,
-                        message=f"Ticket ya fue validado hoy a las {last_validation_time}. En modo diario solo se permite 1 validación por día.",
-                        validation_count=validation_count
-                    )
-
-                # Hay validaciones previas pero no de hoy - es válido
-                # Informar que es una validación adicional
-                is_second_validation = True
-                last_validation = previous_validations[0]
-                last_validation_date = format_datetime_bogota(
-                    last_validation.validated_at,
-                    '%d/%m/%Y'
-                )
-                message = f"Ticket válido - Acceso permitido. Validación #{validation_count + 1}. Última validación: {last_validation_date}"
-
-        # Si llegamos aquí, el ticket es válido
-        # Crear registro de validación
-        validation_log = models.ValidationLog(
-            ticket_id=ticket.id,
-            validator_id=current_user.id,
-            validated_at=current_time_bogota,
-            success=True,
-            notes=f"Validación en modo {ticket.validation_mode}"
-        )
-        db.add(validation_log)
-
-        # Actualizar campos deprecated para compatibilidad
-        ticket.is_used = True
-        ticket.used_at = current_time_bogota
-
-        db.commit()
-        db.refresh(ticket)
-
-        # Preparar mensaje apropiado
-        if ticket.validation_mode == 'once':
-            message = "Ticket válido - Acceso permitido"
-        elif ticket.validation_mode == 'daily' and validation_count == 0:
-            message = "Ticket válido - Acceso permitido. Primera validación"
-        else:
-            # Ya definido arriba para validaciones adicionales
-            pass
+    result = validation_service.validate(db, validation.ticket_code, current_user)
+    if result.valid and result.event:
+        # Entrega inmediata a los feeds en vivo de este worker
+        validation_feed.notify(result.event.id)
+    return result
 
-        return schemas.TicketValidationResponse(
-            valid=True,
-            message=message,
-            ticket=schemas.TicketResponse.model_validate(ticket),
-            user=schemas.UserResponse.model_validate(user),
-            event=schemas.EventResponse.model_validate(event),
-            validation_count=validation_count + 1,
-            is_second_validation=(validation_count > 0)
-        )
 
-    except Exception as e:
-        db.rollback()
-        return schemas.TicketValidationResponse(
-            valid=False,
-            message=f"Error al validar ticket: {str(e)}"
-        )
+@app.get("/validate/metrics")
+def get_validation_metrics(
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """
+    Obtener latencias p50/p95 de los escaneos recientes de este worker
+    y si se mantienen dentro del presupuesto (VALIDATION_BUDGET_MS).
+    """
+    return validation_service.get_timing_stats()
 
 
 @app.post("/validate/scan/", response_model=schemas.TicketValidationResponse)
@@ -4131,6 +3808,44 @@ def validate_scanned_qr(
         )
 
 
+@app.get("/events/{event_id}/validation-manifest")
+def get_event_validation_manifest(
+    event_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_validator)
+):
+    """
+    Descargar el manifiesto firmado del evento para validar sin conexión.
+    El validador guarda el manifiesto en el dispositivo y sube luego las
+    validaciones a /validate/offline-sync.
+    """
+    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Evento no encontrado")
+
+    return validation_service.build_manifest(db, event)
+
+
+@app.post("/validate/offline-sync")
+def sync_offline_validations(
+    sync: schemas.OfflineSyncRequest,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_validator)
+):
+    """
+    Subir un lote de validaciones realizadas sin conexión.
+    Los conflictos en tickets 'once' y 'daily' se resuelven de forma determinista.
+    """
+    try:
+        result = validation_service.reconcile_offline(db, sync, current_user)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if result["accepted"]:
+        validation_feed.notify(sync.event_id)
+    return result
+
+
 class QRDataValidation(BaseModel):
     qr_data: str
 
@@ -4204,12 +3919,16 @@ def change_event_validation_mode(
             detail="No se encontraron tickets para este evento"
         )
 
-    # Actualizar modo de validación
+    # Actualizar modo de validación (contadores del evento: un ajuste por modo anterior)
     updated_count = 0
+    mode_changes = Counter(ticket.validation_mode for ticket in tickets)
     for ticket in tickets:
         ticket.validation_mode = request.validation_mode
         updated_count += 1
 
+    for old_mode, count in mode_changes.items():
+        record_mode_change(db, event_id, old_mode, request.validation_mode, count)
+
     db.commit()
 
     return {
@@ -4248,10 +3967,14 @@ def batch_change_validation_mode(
         )
 
     updated_count = 0
+    mode_changes = Counter((ticket.event_id, ticket.validation_mode) for ticket in tickets)
     for ticket in tickets:
         ticket.validation_mode = request.validation_mode
         updated_count += 1
 
+    for (ticket_event_id, old_mode), count in mode_changes.items():
+        record_mode_change(db, ticket_event_id, old_mode, request.validation_mode, count)
+
     db.commit()
 
     return {
@@ -4276,35 +3999,13 @@ def get_event_validation_stats(
     if not event:
         raise HTTPException(status_code=404, detail="Evento no encontrado")
 
-    # Contar tickets por modo
-    total_tickets = db.query(func.count(models.Ticket.id)).filter(
-        models.Ticket.event_id == event_id
-    ).scalar()
-
-    once_tickets = db.query(func.count(models.Ticket.id)).filter(
-        models.Ticket.event_id == event_id,
-        models.Ticket.validation_mode == 'once'
-    ).scalar()
-
-    daily_tickets = db.query(func.count(models.Ticket.id)).filter(
-        models.Ticket.event_id == event_id,
-        models.Ticket.validation_mode == 'daily'
-    ).scalar()
-
-    # Contar validaciones
-    total_validations = db.query(func.count(models.ValidationLog.id)).join(
-        models.Ticket
-    ).filter(
-        models.Ticket.event_id == event_id,
-        models.ValidationLog.success == True
-    ).scalar()
-
-    validated_tickets = db.query(func.count(func.distinct(models.ValidationLog.ticket_id))).join(
-        models.Ticket
-    ).filter(
-        models.Ticket.event_id == event_id,
-        models.ValidationLog.success == True
-    ).scalar()
+    # Una fila mantenida en cada cambio de tickets o validaciones
+    stats = get_event_stats(db, event_id)
+    total_tickets = stats["total_tickets"]
+    once_tickets = stats["once_tickets"]
+    daily_tickets = stats["daily_tickets"]
+    total_validations = stats["total_validations"]
+    validated_tickets = stats["validated_tickets"]
 
     return {
         "event_id": event_id,
@@ -4322,56 +4023,147 @@ def get_event_validation_stats(
     }
 
 
-@app.get("/events/{event_id}/validation-history")
-def get_event_validation_history(
+def _parse_history_cursor(before: Optional[str]) -> Optional[str]:
+    """Valida el cursor de paginación por día (YYYY-MM-DD)"""
+    if before is None:
+        return None
+    try:
+        datetime.strptime(before, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El cursor 'before' debe tener formato YYYY-MM-DD")
+    return before
+
+
+def _group_history_by_day(history: dict, build_item) -> list:
+    """Agrupa las filas del historial por día (más reciente primero)"""
+    from timezone_utils import format_datetime_bogota
+
+    groups = {day: [] for day in history["day_keys"]}
+    for row in history["rows"]:
+        groups[row[0].validated_at.strftime('%Y-%m-%d')].append(build_item(*row))
+
+    return [
+        {
+            "date": format_datetime_bogota(datetime.strptime(day, '%Y-%m-%d'), '%A %d de %B, %Y'),
+            "day": day,
+            "count": len(groups[day]),
+            "validations": groups[day]
+        }
+        for day in history["day_keys"]
+    ]
+
+
+@app.get("/events/{event_id}/validation-feed")
+async def stream_event_validation_feed(
     event_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
 ):
     """
-    Obtener historial completo de validaciones para un evento, agrupado por día.
+    Feed en vivo (Server-Sent Events) de las validaciones exitosas de un evento
+
+    Retorna un stream de eventos con el formato:
+    - event: snapshot -> Totales actuales al conectarse
+    - event: validation -> Cada validación exitosa (usuario, validador, acompañantes y totales)
+    Cada 15 s sin validaciones se envía un comentario para mantener viva la conexión.
+    """
+    from validation_feed import load_event_name, load_totals
+
+    # `db` es la misma sesión que usó require_admin: FastAPI la cierra recién al
+    # terminar el stream, así que se libera ya para no retener una conexión del pool
+    await asyncio.to_thread(db.close)
+
+    # Handler async: las consultas van a un hilo para no bloquear el event loop
+    event_name = await asyncio.to_thread(load_event_name, event_id)
+    if event_name is None:
+        raise HTTPException(status_code=404, detail="Evento no encontrado")
+
+    async def event_generator():
+
+        queue = validation_feed.subscribe(event_id)
+        try:
+            totals = await asyncio.to_thread(load_totals, event_id)
+            yield f"data: {json.dumps({'event': 'snapshot', 'event_id': event_id, 'event_name': event_name, 'totals': totals})}\n\n"
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            validation_feed.unsubscribe(event_id, queue)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@app.post("/events/{event_id}/validation-stats/reconcile")
+def reconcile_event_validation_stats(
+    event_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """
+    Reconstruir los contadores de validación de un evento desde tickets y
+    validation_logs. Retorna el desvío encontrado (contador guardado - real).
     """
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Evento no encontrado")
 
-    # Obtener todas las validaciones exitosas del evento con información completa
-    validations = db.query(
-        models.ValidationLog,
-        models.Ticket,
-        models.User,
-        models.AdminUser
-    ).join(
-        models.Ticket, models.ValidationLog.ticket_id == models.Ticket.id
-    ).join(
-        models.User, models.Ticket.user_id == models.User.id
-    ).join(
-        models.AdminUser, models.ValidationLog.validator_id == models.AdminUser.id
-    ).filter(
-        models.Ticket.event_id == event_id,
-        models.ValidationLog.success == True
-    ).order_by(
-        models.ValidationLog.validated_at.desc()
-    ).all()
+    result = rebuild_event_stats(db, event_id)
+    db.commit()
 
-    # Agrupar validaciones por día
-    from collections import defaultdict
-    from timezone_utils import format_datetime_bogota, get_date_only_bogota
+    if result["drift"]:
+        print(f"[STATS] Desvío corregido en evento {event_id}: {result['drift']}")
 
-    validations_by_day = defaultdict(list)
+    return {
+        "success": True,
+        "event_id": event_id,
+        "counts": result["counts"],
+        "drift": result["drift"]
+    }
+
+
+@app.get("/events/{event_id}/validation-history")
+def get_event_validation_history(
+    event_id: int,
+    before: Optional[str] = None,
+    days: int = 7,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """
+    Obtener historial de validaciones de un evento, agrupado por día.
 
-    for val_log, ticket, user, validator in validations:
-        # Obtener fecha en formato legible
-        date_str = format_datetime_bogota(val_log.validated_at, '%A %d de %B, %Y')
+    Paginado por día: `days` días por página (más recientes primero) y
+    `before=<next_cursor>` para la página siguiente.
+    """
+    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Evento no encontrado")
 
-        # Contar cuántas validaciones tiene este ticket
-        ticket_validation_count = db.query(func.count(models.ValidationLog.id)).filter(
-            models.ValidationLog.ticket_id == ticket.id,
-            models.ValidationLog.success == True,
-            models.ValidationLog.id <= val_log.id
-        ).scalar()
+    history = validation_service.get_history(
+        db,
+        event_id=event_id,
+        before=_parse_history_cursor(before),
+        days=max(1, min(days, 90))
+    )
 
-        validations_by_day[date_str].append({
+    def build_item(val_log, ticket, user, validator, _event, validation_count):
+        return {
             "validation_id": val_log.id,
             "ticket_id": ticket.id,
             "user_name": user.name,
@@ -4380,77 +4172,43 @@ def get_event_validation_history(
             "validator_name": validator.full_name or validator.username,
             "validated_at": val_log.validated_at.isoformat(),
             "notes": val_log.notes,
-            "validation_count": ticket_validation_count
-        })
-
-    # Convertir a lista ordenada por fecha (más reciente primero)
-    validations_list = [
-        {
-            "date": date,
-            "validations": validations
+            "validation_count": validation_count
         }
-        for date, validations in sorted(validations_by_day.items(), reverse=True)
-    ]
-
-    # Estadísticas generales
-    total_validations = len(validations)
-    unique_tickets = len(set(val_log.ticket_id for val_log, _, _, _ in validations))
 
     return {
         "event_id": event_id,
         "event_name": event.name,
-        "total_validations": total_validations,
-        "unique_tickets": unique_tickets,
-        "validations_by_day": validations_list
+        "total_validations": history["total_validations"],
+        "unique_tickets": history["unique_tickets"],
+        "validations_by_day": _group_history_by_day(history, build_item),
+        "next_cursor": history["next_cursor"]
     }
 
 
 @app.get("/validator/my-validations-history")
 def get_my_validations_history(
+    before: Optional[str] = None,
+    days: int = 7,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(get_current_user)
 ):
     """
     Obtener historial de validaciones realizadas por el usuario actual, agrupadas por día.
     Solo incluye las validaciones realizadas por el validador logueado.
-    """
-    # Obtener todas las validaciones exitosas del usuario actual
-    validations = db.query(
-        models.ValidationLog,
-        models.Ticket,
-        models.User,
-        models.Event
-    ).join(
-        models.Ticket, models.ValidationLog.ticket_id == models.Ticket.id
-    ).join(
-        models.User, models.Ticket.user_id == models.User.id
-    ).join(
-        models.Event, models.Ticket.event_id == models.Event.id
-    ).filter(
-        models.ValidationLog.validator_id == current_user.id,
-        models.ValidationLog.success == True
-    ).order_by(
-        models.ValidationLog.validated_at.desc()
-    ).all()
 
-    # Agrupar validaciones por día
-    from collections import defaultdict
+    Paginado por día igual que el historial por evento (`days` y `before`).
+    """
     from timezone_utils import format_datetime_bogota
 
-    validations_by_day = defaultdict(list)
-
-    for val_log, ticket, user, event in validations:
-        # Obtener fecha en formato legible
-        date_str = format_datetime_bogota(val_log.validated_at, '%A %d de %B, %Y')
-
-        # Contar cuántas validaciones tiene este ticket
-        ticket_validation_count = db.query(func.count(models.ValidationLog.id)).filter(
-            models.ValidationLog.ticket_id == ticket.id,
-            models.ValidationLog.success == True,
-            models.ValidationLog.id <= val_log.id
-        ).scalar()
+    history = validation_service.get_history(
+        db,
+        validator_id=current_user.id,
+        before=_parse_history_cursor(before),
+        days=max(1, min(days, 90))
+    )
 
-        validations_by_day[date_str].append({
+    def build_item(val_log, ticket, user, _validator, event, validation_count):
+        return {
             "validation_id": val_log.id,
             "ticket_id": ticket.id,
             "ticket_code": ticket.ticket_code,
@@ -4460,38 +4218,24 @@ def get_my_validations_history(
             "event_id": event.id,
             "validation_mode": ticket.validation_mode,
             "validated_at": format_datetime_bogota(val_log.validated_at, '%H:%M:%S'),
-            "validation_count": ticket_validation_count,
+            "validation_count": validation_count,
             "companions": ticket.companions
-        })
-
-    # Convertir a lista ordenada por fecha (más reciente primero)
-    validations_list = [
-        {
-            "date": date,
-            "count": len(validations),
-            "validations": validations
         }
-        for date, validations in sorted(validations_by_day.items(), reverse=True)
-    ]
-
-    # Estadísticas generales
-    total_validations = len(validations)
-    unique_tickets = len(set(val_log.ticket_id for val_log, _, _, _ in validations))
-    unique_events = len(set(event.id for _, _, _, event in validations))
 
     return {
         "validator_name": current_user.full_name or current_user.username,
-        "total_validations": total_validations,
-        "unique_tickets": unique_tickets,
-        "unique_events": unique_events,
-        "validations_by_day": validations_list
+        "total_validations": history["total_validations"],
+        "unique_tickets": history["unique_tickets"],
+        "unique_events": history["unique_events"],
+        "validations_by_day": _group_history_by_day(history, build_item),
+        "next_cursor": history["next_cursor"]
     }
 
 
 # ========== RUTAS DE ADMINISTRACIÓN ==========
 
 @app.get("/login", response_class=HTMLResponse)
-async def login_page(request: Request):
+def login_page(request: Request):
     """Página de login"""
     return templates.TemplateResponse("login.html", {
         "request": request
@@ -4499,13 +4243,13 @@ async def login_page(request: Request):
 
 
 @app.get("/admin/projects", response_class=HTMLResponse)
-async def admin_projects_page(request: Request, db: Session = Depends(get_db)):
+def admin_projects_page(request: Request, db: Session = Depends(get_db)):
     """Página de gestión de proyectos"""
     return templates.TemplateResponse("projects.html", {"request": request})
 
 
 @app.get("/admin/access", response_class=HTMLResponse)
-async def admin_access_management(
+def admin_access_management(
     request: Request,
     db: Session = Depends(get_db)
 ):
@@ -4537,7 +4281,7 @@ async def admin_access_management(
 
 
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard(
+def admin_dashboard(
     request: Request,
     db: Session = Depends(get_db)
 ):
@@ -4653,72 +4397,24 @@ async def admin_dashboard(
 
 
 @app.get("/admin/users", response_class=HTMLResponse)
-async def admin_users(
+def admin_users(
     request: Request,
     db: Session = Depends(get_db)
 ):
-    """Página de gestión de usuarios - Con soporte para tags"""
-    from birthday_utils import get_birthday_status
-
-    # Obtener usuarios con conteo de tickets
-    from sqlalchemy.orm import joinedload
-
-    users = db.query(
-        models.User,
-        func.count(models.Ticket.id).label('ticket_count')
-    ).options(
-        joinedload(models.User.university),
-        joinedload(models.User.tags)
-    ).outerjoin(models.Ticket).group_by(models.User.id).all()
-
-    users_list = []
-    for user, ticket_count in users:
-        # Obtener información del cumpleaños
-        birthday_status = get_birthday_status(user.birthday)
-
-        # Crear objeto con atributos accesibles directamente
-        class UserWrapper:
-            pass
-
-        user_obj = UserWrapper()
-        user_obj.id = user.id
-        user_obj.name = user.name
-        user_obj.nick = user.nick
-        user_obj.email = user.email
-        user_obj.country_code = user.country_code
-        user_obj.phone = user.phone
-        user_obj.identification = user.identification
-        user_obj.university_id = user.university_id
-        user_obj.is_ieee_member = user.is_ieee_member
-        user_obj.birthday = user.birthday
-        user_obj.created_at = user.created_at
-        user_obj.ticket_count = ticket_count
-        user_obj.university = user.university
-        user_obj.tags = user.tags
-        user_obj.birthday_status = birthday_status
-        user_obj.photo_path = user.photo_path
-        user_obj.email_personal = user.email_personal
-        user_obj.email_institutional = user.email_institutional
-        user_obj.email_ieee = user.email_ieee
-        user_obj.primary_email_type = user.primary_email_type
-        user_obj.branch_role = user.branch_role
-
-        users_list.append(user_obj)
-
+    """Página de gestión de usuarios (el listado se carga desde /users/directory)"""
     # Obtener universidades y tags para los filtros
     universities = db.query(models.University).order_by(models.University.short_name).all()
     tags = db.query(models.Tag).order_by(models.Tag.name).all()
 
     return templates.TemplateResponse("users.html", {
         "request": request,
-        "users": users_list,
         "universities": universities,
         "tags": tags
     })
 
 
 @app.get("/admin/universities", response_class=HTMLResponse)
-async def admin_universities(
+def admin_universities(
     request: Request
 ):
     """Página de gestión de universidades"""
@@ -4728,7 +4424,7 @@ async def admin_universities(
 
 
 @app.get("/admin/tags", response_class=HTMLResponse)
-async def admin_tags(
+def admin_tags(
     request: Request
 ):
     """Página de gestión de etiquetas"""
@@ -4738,7 +4434,7 @@ async def admin_tags(
 
 
 @app.get("/admin/catalogs", response_class=HTMLResponse)
-async def admin_catalogs(
+def admin_catalogs(
     request: Request
 ):
     """Página de gestión de catálogos de perfilamiento"""
@@ -4748,7 +4444,7 @@ async def admin_catalogs(
 
 
 @app.get("/admin/organizations", response_class=HTMLResponse)
-async def admin_organizations(
+def admin_organizations(
     request: Request
 ):
     """Página de gestión de organizaciones"""
@@ -4758,7 +4454,7 @@ async def admin_organizations(
 
 
 @app.get("/admin/events", response_class=HTMLResponse)
-async def admin_events(
+def admin_events(
     request: Request,
     db: Session = Depends(get_db)
 ):
@@ -4783,7 +4479,7 @@ async def admin_events(
 
 
 @app.get("/admin/events/{event_id}/edit", response_class=HTMLResponse)
-async def admin_edit_event(
+def admin_edit_event(
     request: Request,
     event_id: int,
     db: Session = Depends(get_db)
@@ -4800,45 +4496,39 @@ async def admin_edit_event(
 
 
 @app.get("/admin/tickets", response_class=HTMLResponse)
-async def admin_tickets(
+def admin_tickets(
     request: Request,
     db: Session = Depends(get_db)
 ):
-    """Página de gestión de tickets"""
-    tickets = db.query(models.Ticket).all()
-    users = db.query(models.User).all()
+    """Página de gestión de tickets (el listado se carga desde /tickets/grid)"""
     events = db.query(models.Event).filter(models.Event.is_active == True).all()
 
-    # Agregar nombres de usuario y evento a los tickets
-    tickets_list = []
-    for ticket in tickets:
-        user = db.query(models.User).filter(models.User.id == ticket.user_id).first()
-        event = db.query(models.Event).filter(models.Event.id == ticket.event_id).first()
-        ticket_dict = ticket.__dict__.copy()
-        ticket_dict['user_name'] = user.name if user else 'N/A'
-        ticket_dict['event_name'] = event.name if event else 'N/A'
-        tickets_list.append(type('Ticket', (), ticket_dict))
-
     return templates.TemplateResponse("tickets.html", {
         "request": request,
-        "tickets": tickets_list,
-        "users": users,
         "events": events
     })
 
 
 @app.get("/admin/validate", response_class=HTMLResponse)
-async def admin_validate(
-    request: Request
+def admin_validate(
+    request: Request,
+    db: Session = Depends(get_db)
 ):
     """Página de validación de tickets"""
+    # Eventos disponibles para descargar el manifiesto del modo sin conexión
+    offline_events = db.query(models.Event.id, models.Event.name).filter(
+        models.Event.is_active == True,
+        models.Event.event_type == 'organized'
+    ).order_by(models.Event.event_date.desc()).all()
+
     return templates.TemplateResponse("validate.html", {
-        "request": request
+        "request": request,
+        "offline_events": offline_events
     })
 
 
 @app.get("/admin/messages", response_class=HTMLResponse)
-async def admin_messages(
+def admin_messages(
     request: Request
 ):
     """Página de envío de mensajes masivos"""
@@ -4848,7 +4538,7 @@ async def admin_messages(
 
 
 @app.get("/admin/campaigns", response_class=HTMLResponse)
-async def admin_campaigns(
+def admin_campaigns(
     request: Request
 ):
     """Página de histórico de campañas de mensajes"""
@@ -4858,7 +4548,7 @@ async def admin_campaigns(
 
 
 @app.get("/admin/campaigns/{campaign_id}", response_class=HTMLResponse)
-async def admin_campaign_details(
+def admin_campaign_details(
     request: Request,
     campaign_id: int
 ):
@@ -4870,7 +4560,7 @@ async def admin_campaign_details(
 
 
 @app.post("/messages/bulk-send")
-async def bulk_send_messages(
+def bulk_send_messages(
     user_ids: str = Form(...),
     subject: str = Form(...),
     message: str = Form(...),
@@ -4887,9 +4577,11 @@ async def bulk_send_messages(
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
 ):
-    """Enviar mensajes masivos a usuarios seleccionados con tracking completo"""
+    """
+    Encolar mensajes masivos a usuarios seleccionados con tracking completo.
+    El envío lo realiza job_worker.py; el progreso se consulta en /jobs/{job_id}
+    """
     import json
-    import base64
     from PIL import Image
     from io import BytesIO
     from pathlib import Path
@@ -4932,7 +4624,7 @@ async def bulk_send_messages(
         os.makedirs(template_images_dir, exist_ok=True)
 
         # Leer y procesar imagen
-        template_img_content = await template_image_file.read()
+        template_img_content = template_image_file.file.read()
         template_img = Image.open(BytesIO(template_img_content))
 
         # Convertir a RGB si es necesario
@@ -4959,11 +4651,10 @@ async def bulk_send_messages(
         print(f"[BULK] Template image saved: {template_img_path} -> {final_template_image_url}")
 
     # Procesar imagen si fue proporcionada
-    image_url = None
     image_path_for_db = None
     if image and image.filename:
         # Leer y procesar imagen
-        image_content = await image.read()
+        image_content = image.file.read()
         img = Image.open(BytesIO(image_content))
 
         # Convertir a RGB si es necesario
@@ -4983,8 +4674,7 @@ async def bulk_send_messages(
         img.save(buffer, format='JPEG', quality=85, optimize=True)
         compressed_content = buffer.getvalue()
 
-        # Guardar en directorio message_images
-        import os
+        # Guardar en directorio message_images (job_worker.py la lee desde aquí)
         import time
         message_images_dir = "static/message_images"
         os.makedirs(message_images_dir, exist_ok=True)
@@ -4998,16 +4688,14 @@ async def bulk_send_messages(
 
         image_path_for_db = image_path
 
-        # Convertir a base64 data URL
-        image_base64 = base64.b64encode(compressed_content).decode('utf-8')
-        image_url = f"data:image/jpeg;base64,{image_base64}"
-
         print(f"[INFO] Imagen guardada: {image_path} ({len(compressed_content)/1024:.2f}KB)")
 
     # Obtener usuarios
     users = db.query(models.User).filter(models.User.id.in_(user_id_list)).all()
     if not users:
         raise HTTPException(status_code=404, detail="No se encontraron usuarios")
+    if not send_email_bool and not any(user.phone and user.country_code for user in users):
+        raise HTTPException(status_code=400, detail="Ninguno de los usuarios seleccionados tiene número de teléfono")
 
     # CREAR CAMPAÑA
     campaign = models.MessageCampaign(
@@ -5015,7 +4703,7 @@ async def bulk_send_messages(
         message=message,
         link=link if link else None,
         link_text=link_text if link_text else None,
-        has_image=image_url is not None,
+        has_image=image_path_for_db is not None,
         image_path=image_path_for_db,
         send_email=send_email_bool,
         send_whatsapp=send_whatsapp_bool,
@@ -5025,142 +4713,91 @@ async def bulk_send_messages(
     db.add(campaign)
     db.flush()  # Get campaign ID without committing
 
-    print(f"[CAMPAIGN] Created campaign ID {campaign.id}: '{subject}' to {len(users)} users")
-
-    import time
-
-    # Enviar mensajes y crear registros de destinatarios
-    for idx, user in enumerate(users):
-        # Personalizar mensaje
-        display_name = user.nick if user.nick else user.name.split()[0]
-        personalized_message = message.replace("{nombre}", display_name)
+    # Crear registros de destinatarios y encolar un envío por canal
+    recipients = [models.MessageRecipient(campaign_id=campaign.id, user_id=user.id) for user in users]
+    db.add_all(recipients)
+    db.flush()  # Get recipient IDs
 
-        # Crear registro de destinatario
-        recipient = models.MessageRecipient(
-            campaign_id=campaign.id,
-            user_id=user.id
-        )
-        db.add(recipient)
-        db.flush()  # Get recipient ID
-
-        # Enviar por email
+    task_targets = []
+    for recipient, user in zip(recipients, users):
         if send_email_bool:
-            try:
-                success = email_service.send_bulk_message(
-                    to_email=user.email,
-                    user_name=display_name,
-                    subject=subject,
-                    message=personalized_message,
-                    link=link if link else None,
-                    link_text=link_text if link_text else None,
-                    image_url=image_url
-                )
-
-                recipient.email_sent = success
-                recipient.email_sent_at = get_bogota_now_naive() if success else None
-
-                if success:
-                    campaign.emails_sent += 1
-                else:
-                    campaign.emails_failed += 1
-                    recipient.email_error = "Email sending failed"
-
-            except Exception as e:
-                campaign.emails_failed += 1
-                recipient.email_sent = False
-                recipient.email_error = str(e)
-                print(f"[ERROR] Email to {user.email}: {str(e)}")
-
-        # Enviar por WhatsApp
+            task_targets.append(("email", recipient.id))
         if send_whatsapp_bool and user.phone and user.country_code:
-            try:
-                from whatsapp_client import send_bulk_whatsapp, WhatsAppClient
-
-                whatsapp_client = WhatsAppClient()
-                if whatsapp_client.is_ready():
-                    result = None
-
-                    # Decidir si usar template o mensaje libre
-                    if whatsapp_message_type == "template" and whatsapp_template:
-                        # Construir variables para el template
-                        # Primera variable: nombre del usuario (auto)
-                        # Siguientes variables: valores manuales de template_vars_list
-                        template_variables = [display_name] + template_vars_list
-
-                        print(f"[TEMPLATE] Sending '{whatsapp_template}' to {user.phone}: {template_variables}")
-
-                        result = whatsapp_client.send_template_message(
-                            phone=user.phone,
-                            template_name=whatsapp_template,
-                            language="es_MX",
-                            variables=template_variables,
-                            country_code=user.country_code,
-                            header_image_link=final_template_image_url if final_template_image_url else None
-                        )
-                    else:
-                        # Mensaje libre
-                        result = send_bulk_whatsapp(
-                            phone=user.phone,
-                            country_code=user.country_code,
-                            user_name=display_name,
-                            subject=subject,
-                            message=personalized_message,
-                            link=link if link else None,
-                            image_base64=image_url if image_url else None
-                        )
+            task_targets.append(("whatsapp", recipient.id))
 
-                    if result and result.get("success"):
-                        recipient.whatsapp_sent = True
-                        recipient.whatsapp_sent_at = get_bogota_now_naive()
-                        recipient.whatsapp_message_id = result.get("message_id") or result.get("messageId")
-                        recipient.whatsapp_status = "pending"
-                        campaign.whatsapp_sent += 1
-                    else:
-                        recipient.whatsapp_sent = False
-                        # Asegurar que el error sea string (puede venir como dict)
-                        error_value = result.get("error", "Unknown error") if result else "No result"
-                        if isinstance(error_value, dict):
-                            error_value = json.dumps(error_value)
-                        recipient.whatsapp_error = str(error_value)[:500]  # Limitar longitud
-                        campaign.whatsapp_failed += 1
-                else:
-                    recipient.whatsapp_sent = False
-                    recipient.whatsapp_error = "WhatsApp service not ready"
-                    campaign.whatsapp_failed += 1
-
-            except Exception as e:
-                campaign.whatsapp_failed += 1
-                recipient.whatsapp_sent = False
-                recipient.whatsapp_error = str(e)
-                print(f"[ERROR] WhatsApp to {user.phone}: {str(e)}")
-
-        # Delay progresivo entre mensajes para evitar colapso del servicio de WhatsApp
-        # Solo si se envió WhatsApp y no es el último usuario
-        if send_whatsapp_bool and idx < len(users) - 1:
-            # 2 segundos base + 0.5s extra cada 10 mensajes (max 5 segundos)
-            base_delay = 2.0
-            extra_delay = (idx // 10) * 0.5
-            total_delay = min(base_delay + extra_delay, 5.0)
-            time.sleep(total_delay)
-
-    # Commit todas las transacciones
+    job = enqueue_job(
+        db,
+        job_type="campaign",
+        tasks=task_targets,
+        payload={
+            "subject": subject,
+            "message": message,
+            "link": link or None,
+            "link_text": link_text or None,
+            "image_path": image_path_for_db,
+            "whatsapp_message_type": whatsapp_message_type,
+            "whatsapp_template": whatsapp_template,
+            "template_vars": template_vars_list,
+            "template_image_url": final_template_image_url or None
+        },
+        created_by=current_user.id,
+        campaign_id=campaign.id
+    )
     db.commit()
 
-    print(f"[CAMPAIGN] Completed campaign ID {campaign.id}:")
-    print(f"  Emails: {campaign.emails_sent} sent, {campaign.emails_failed} failed")
-    print(f"  WhatsApp: {campaign.whatsapp_sent} sent, {campaign.whatsapp_failed} failed")
+    print(f"[CAMPAIGN] Created campaign ID {campaign.id}: '{subject}' to {len(users)} users (job {job.id}, {len(task_targets)} envíos en cola)")
 
     return {
         "success": True,
         "campaign_id": campaign.id,
+        "job_id": job.id,
+        "status": job.status,
         "total_recipients": len(users),
-        "emails_sent": campaign.emails_sent,
-        "emails_failed": campaign.emails_failed,
-        "whatsapp_sent": campaign.whatsapp_sent,
-        "whatsapp_failed": campaign.whatsapp_failed
+        "queued_tasks": len(task_targets)
     }
 
 
+# ========== ENDPOINTS DE TRABAJOS DE ENVÍO ==========
+
+@app.get("/jobs/{job_id}")
+def get_job_status(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """Obtener el estado y progreso de un trabajo de envío masivo"""
+    progress = get_job_progress(db, job_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return progress
+
+
+@app.get("/jobs/")
+def list_jobs(
+    skip: int = 0,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """Listar los trabajos de envío más recientes"""
+    job_ids = db.query(models.DeliveryJob.id).order_by(
+        models.DeliveryJob.id.desc()
+    ).offset(skip).limit(limit).all()
+    return [get_job_progress(db, job_id) for (job_id,) in job_ids]
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_delivery_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.AdminUser = Depends(require_admin)
+):
+    """Cancelar un trabajo: los envíos pendientes no se realizan"""
+    if not cancel_job(db, job_id):
+        raise HTTPException(status_code=400, detail="El trabajo no existe o ya terminó")
+    return {"success": True, "job_id": job_id, "status": "cancelled"}
+
+
 # ========== ENDPOINTS DE CAMPAÑAS ==========
 
 @app.get("/campaigns/")
@@ -5314,7 +4951,7 @@ def delete_campaign(
 # ========== WEBHOOKS ==========
 
 @app.post("/webhooks/whatsapp-status")
-async def whatsapp_status_webhook(
+def whatsapp_status_webhook(
     webhook_data: dict,
     db: Session = Depends(get_db)
 ):
@@ -5374,7 +5011,7 @@ async def whatsapp_status_webhook(
 # ========== ENDPOINTS PÚBLICOS DE TICKETS ==========
 
 @app.get("/ticket/{unique_url}", response_class=HTMLResponse)
-async def view_ticket_pin_form(
+def view_ticket_pin_form(
     unique_url: str,
     request: Request,
     db: Session = Depends(get_db)
@@ -5395,7 +5032,7 @@ async def view_ticket_pin_form(
 
 
 @app.post("/ticket/{unique_url}/verify")
-async def verify_ticket_pin(
+def verify_ticket_pin(
     unique_url: str,
     pin: str,
     db: Session = Depends(get_db)
@@ -5465,19 +5102,19 @@ async def verify_ticket_pin(
 # ========== PÁGINAS LEGALES (Para Meta/Facebook) ==========
 
 @app.get("/privacy", response_class=HTMLResponse)
-async def privacy_policy(request: Request):
+def privacy_policy(request: Request):
     """Política de Privacidad"""
     return templates.TemplateResponse("privacy.html", {"request": request})
 
 
 @app.get("/terms", response_class=HTMLResponse)
-async def terms_of_service(request: Request):
+def terms_of_service(request: Request):
     """Términos del Servicio"""
     return templates.TemplateResponse("terms.html", {"request": request})
 
 
 @app.get("/data-deletion", response_class=HTMLResponse)
-async def data_deletion(request: Request):
+def data_deletion(request: Request):
     """Instrucciones para Eliminación de Datos"""
     return templates.TemplateResponse("data_deletion.html", {"request": request})
 
@@ -5541,7 +5178,7 @@ async def get_gallery_images():
 # ========== PROYECTOS ==========
 
 @app.get("/api/projects")
-async def get_projects(
+def get_projects(
     public_only: bool = False,
     db: Session = Depends(get_db)
 ):
@@ -5569,7 +5206,7 @@ async def get_projects(
 
 
 @app.get("/api/projects/{project_id}")
-async def get_project(
+def get_project(
     project_id: int,
     db: Session = Depends(get_db)
 ):
@@ -5593,7 +5230,7 @@ async def get_project(
 
 
 @app.post("/api/projects")
-async def create_project(
+def create_project(
     project: schemas.ProjectCreate,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
@@ -5618,7 +5255,7 @@ async def create_project(
 
 
 @app.put("/api/projects/{project_id}")
-async def update_project(
+def update_project(
     project_id: int,
     project: schemas.ProjectUpdate,
     db: Session = Depends(get_db),
@@ -5642,7 +5279,7 @@ async def update_project(
 
 
 @app.delete("/api/projects/{project_id}")
-async def delete_project(
+def delete_project(
     project_id: int,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
@@ -5660,7 +5297,7 @@ async def delete_project(
 # ========== EMPRESAS ALIADAS ==========
 
 @app.get("/admin/allied-companies", response_class=HTMLResponse)
-async def admin_allied_companies_page(request: Request, db: Session = Depends(get_db)):
+def admin_allied_companies_page(request: Request, db: Session = Depends(get_db)):
     """Página de administración de empresas aliadas"""
     companies = db.query(models.AlliedCompany).order_by(models.AlliedCompany.display_order).all()
     return templates.TemplateResponse("allied_companies.html", {
@@ -5670,13 +5307,13 @@ async def admin_allied_companies_page(request: Request, db: Session = Depends(ge
 
 
 @app.get("/api/allied-companies")
-async def get_allied_companies(db: Session = Depends(get_db)):
+def get_allied_companies(db: Session = Depends(get_db)):
     """Obtener todas las empresas aliadas"""
     return db.query(models.AlliedCompany).order_by(models.AlliedCompany.display_order).all()
 
 
 @app.get("/api/allied-companies/{company_id}")
-async def get_allied_company(company_id: int, db: Session = Depends(get_db)):
+def get_allied_company(company_id: int, db: Session = Depends(get_db)):
     """Obtener una empresa aliada por ID"""
     company = db.query(models.AlliedCompany).filter(models.AlliedCompany.id == company_id).first()
     if not company:
@@ -5685,7 +5322,7 @@ async def get_allied_company(company_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/api/allied-companies")
-async def create_allied_company(
+def create_allied_company(
     company: schemas.AlliedCompanyCreate,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
@@ -5699,7 +5336,7 @@ async def create_allied_company(
 
 
 @app.put("/api/allied-companies/{company_id}")
-async def update_allied_company(
+def update_allied_company(
     company_id: int,
     company: schemas.AlliedCompanyUpdate,
     db: Session = Depends(get_db),
@@ -5720,7 +5357,7 @@ async def update_allied_company(
 
 
 @app.delete("/api/allied-companies/{company_id}")
-async def delete_allied_company(
+def delete_allied_company(
     company_id: int,
     db: Session = Depends(get_db),
     current_user: models.AdminUser = Depends(require_admin)
@@ -5736,7 +5373,7 @@ async def delete_allied_company(
 
 
 @app.post("/api/allied-companies/{company_id}/upload-logo")
-async def upload_allied_company_logo(
+def upload_allied_company_logo(
     company_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -5762,7 +5399,7 @@ async def upload_allied_company_logo(
 
     # Guardar archivo
     with open(file_path, "wb") as buffer:
-        content = await file.read()
+        content = file.file.read()
         buffer.write(content)
 
     # Actualizar ruta en la base de datos
@@ -5776,7 +5413,7 @@ async def upload_allied_company_logo(
 # ========== CONCURSOS ==========
 
 @app.get("/admin/contests", response_class=HTMLResponse)
-async def admin_contests(request: Request, db: Session = Depends(get_db)):
+def admin_contests(request: Request, db: Session = Depends(get_db)):
     """Pagina de gestion de concursos"""
     contests = db.query(models.Contest).order_by(models.Contest.display_order, models.Contest.created_at.desc()).all()
     return templates.TemplateResponse("contests.html", {
@@ -6030,7 +5667,7 @@ def admin_generate_external_token(
 # ========== PÁGINA DE INICIO PÚBLICA ==========
 
 @app.get("/")
-async def root_redirect(request: Request):
+def root_redirect(request: Request):
     """Redireccionar raíz según el dominio"""
     host = request.headers.get("host", "").lower()
 
@@ -6043,8 +5680,13 @@ async def root_redirect(request: Request):
 
 
 @app.get("/home", response_class=HTMLResponse)
-async def public_home_page(request: Request, db: Session = Depends(get_db)):
-    """Página de inicio pública para ieeetadeo.org"""
+def public_home_page(request: Request, db: Session = Depends(get_db)):
+    """Página de inicio pública para ieeetadeo.org (cacheada, ver public_page_cache)"""
+    return public_page_cache.respond(request, db, "home", lambda: _render_public_home(request, db))
+
+
+def _render_public_home(request: Request, db: Session):
+    """Genera /home. Retorna la respuesta y la hora del próximo evento (cuando pasa a "pasados")."""
     from datetime import datetime
     from sqlalchemy import func
 
@@ -6058,13 +5700,10 @@ async def public_home_page(request: Request, db: Session = Depends(get_db)):
         models.Event.event_date >= datetime.now()
     ).group_by(models.Event.id).order_by(models.Event.event_date.asc()).all()
 
-    # Procesar eventos próximos para incluir ticket_count y gallery_images
+    # Procesar eventos próximos para incluir ticket_count
     upcoming_events = []
     for event, ticket_count in upcoming_events_query:
         event.ticket_count = ticket_count
-        event.gallery_images = db.query(models.EventGalleryImage).filter(
-            models.EventGalleryImage.event_id == event.id
-        ).order_by(models.EventGalleryImage.display_order).all()
         upcoming_events.append(event)
 
     # Obtener últimos 12 eventos pasados (activos y con fecha pasada) ordenados por fecha descendente
@@ -6076,15 +5715,25 @@ async def public_home_page(request: Request, db: Session = Depends(get_db)):
         models.Event.event_date < datetime.now()
     ).group_by(models.Event.id).order_by(models.Event.event_date.desc()).limit(12).all()
 
-    # Procesar eventos pasados para incluir ticket_count y gallery_images
+    # Procesar eventos pasados para incluir ticket_count
     past_events = []
     for event, ticket_count in past_events_query:
         event.ticket_count = ticket_count
-        event.gallery_images = db.query(models.EventGalleryImage).filter(
-            models.EventGalleryImage.event_id == event.id
-        ).order_by(models.EventGalleryImage.display_order).all()
         past_events.append(event)
 
+    # Galerías de todos los eventos en una sola consulta
+    from sqlalchemy.orm.attributes import set_committed_value
+    galleries = {event.id: [] for event in upcoming_events + past_events}
+    if galleries:
+        gallery_images = db.query(models.EventGalleryImage).filter(
+            models.EventGalleryImage.event_id.in_(list(galleries))
+        ).order_by(models.EventGalleryImage.event_id, models.EventGalleryImage.display_order).all()
+        for image in gallery_images:
+            galleries[image.event_id].append(image)
+    for event in upcoming_events + past_events:
+        # Como colección ya cargada: no queda como un cambio pendiente del evento
+        set_committed_value(event, "gallery_images", galleries[event.id])
+
     # Obtener miembros con tag "IEEE Tadeo" (solo los que han editado perfil - tienen nombre)
     ieee_tadeo_tag = db.query(models.Tag).filter(models.Tag.name == "IEEE Tadeo").first()
     members = []
@@ -6202,7 +5851,7 @@ async def public_home_page(request: Request, db: Session = Depends(get_db)):
         models.AlliedCompany.is_active == True
     ).order_by(models.AlliedCompany.display_order).all()
 
-    return templates.TemplateResponse("home.html", {
+    response = templates.TemplateResponse("home.html", {
         "request": request,
         "upcoming_events": upcoming_events,
         "past_events": past_events,
@@ -6219,6 +5868,8 @@ async def public_home_page(request: Request, db: Session = Depends(get_db)):
         "member_skills_soft": member_skills_soft,
         "allied_companies": allied_companies
     })
+    # El primer evento próximo pasa a "pasados" a su hora: ahí vence la página
+    return response, upcoming_events[0].event_date if upcoming_events else None
 
 
 class ContactFormData(BaseModel):
@@ -6230,7 +5881,7 @@ class ContactFormData(BaseModel):
 
 
 @app.post("/api/contact")
-async def submit_contact_form(data: ContactFormData, db: Session = Depends(get_db)):
+def submit_contact_form(data: ContactFormData, db: Session = Depends(get_db)):
     """Procesar formulario de contacto de la página de inicio"""
     try:
         # Enviar email de notificación
@@ -6261,11 +5912,19 @@ async def submit_contact_form(data: ContactFormData, db: Session = Depends(get_d
 # ========== API PÚBLICA DE PERFIL DE MIEMBRO ==========
 
 @app.get("/api/public/member/{user_id}")
-async def get_public_member_profile(user_id: int, db: Session = Depends(get_db)):
+def get_public_member_profile(user_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Obtener perfil público de un miembro IEEE Tadeo.
     Solo devuelve información limitada y pública.
     """
+    return public_page_cache.respond(
+        request, db, f"member:{user_id}",
+        lambda: (JSONResponse(_public_member_profile(db, user_id)), None)
+    )
+
+
+def _public_member_profile(db: Session, user_id: int) -> dict:
+    """Datos públicos del miembro (404 si no es miembro IEEE Tadeo con nombre)"""
     # Verificar que el usuario existe y tiene el tag IEEE Tadeo
     ieee_tadeo_tag = db.query(models.Tag).filter(models.Tag.name == "IEEE Tadeo").first()
     if not ieee_tadeo_tag:
@@ -6328,14 +5987,19 @@ async def get_public_member_profile(user_id: int, db: Session = Depends(get_db))
 # ========== PÁGINA DE PRESENTACIÓN EJECUTIVA ==========
 
 @app.get("/brochure", response_class=HTMLResponse)
-async def brochure_page(request: Request):
+def brochure_page(request: Request):
     """Presentación ejecutiva del sistema IEEE Tadeo Control System"""
     return templates.TemplateResponse("brochure.html", {"request": request})
 
 
 @app.get("/espacio2026", response_class=HTMLResponse)
-async def espacio2026_page(request: Request, db: Session = Depends(get_db)):
+def espacio2026_page(request: Request, db: Session = Depends(get_db)):
     """Propuesta de espacio para IEEE Tadeo - Presentación a la Universidad"""
+    return public_page_cache.respond(request, db, "espacio2026", lambda: (_render_espacio2026(request, db), None))
+
+
+def _render_espacio2026(request: Request, db: Session):
+    """Genera /espacio2026 con los miembros ordenados por rol"""
     # Obtener usuarios con el tag "IEEE Tadeo" que tengan nombre
     ieee_tadeo_tag = db.query(models.Tag).filter(models.Tag.name == "IEEE Tadeo").first()
 
@@ -6395,7 +6059,7 @@ async def espacio2026_page(request: Request, db: Session = Depends(get_db)):
 # ========== PÁGINA DE DEMOSTRACIÓN PARA REVISIÓN DE META ==========
 
 @app.get("/meta-demo", response_class=HTMLResponse)
-async def meta_demo_page(
+def meta_demo_page(
     request: Request,
     db: Session = Depends(get_db)
 ):
@@ -6432,7 +6096,7 @@ async def meta_demo_page(
 
 
 @app.get("/meta-tickets", response_class=HTMLResponse)
-async def meta_tickets_demo(request: Request):
+def meta_tickets_demo(request: Request):
     """
     Página de demostración de tickets para revisores de Meta.
     Muestra la interfaz de tickets con datos ficticios.
@@ -6448,26 +6112,31 @@ if __name__ == "__main__":
 
 
 # Endpoint para servir QR codes (alternativa a archivos estáticos)
-from fastapi.responses import FileResponse
-import os
+from fastapi.responses import Response
+from qr_service import qr_service
 
 @app.get("/api/qr/{ticket_code}")
-async def get_qr_code(ticket_code: str):
-    """Sirve el código QR de un ticket"""
-    # Usar ruta absoluta desde el directorio de la aplicación
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    qr_path = os.path.join(base_dir, "qr_codes", f"{ticket_code}.png")
-
-    if os.path.exists(qr_path):
-        return FileResponse(qr_path, media_type="image/png")
-    else:
-        raise HTTPException(status_code=404, detail=f"QR code not found: {ticket_code}")
+def get_qr_code(ticket_code: str, db: Session = Depends(get_db)):
+    """Sirve el código QR de un ticket (lo genera si aún no existe, p.ej. tickets creados en lote)"""
+    # Solo se generan QRs de tickets que existen; los ya renderizados salen de la caché
+    if not os.path.exists(qr_service.path_for(ticket_code)):
+        exists = db.query(models.Ticket.id).filter(models.Ticket.ticket_code == ticket_code).first()
+        if not exists:
+            raise HTTPException(status_code=404, detail=f"QR code not found: {ticket_code}")
+
+    return Response(content=qr_service.get_png(ticket_code), media_type="image/png")
+
+
+@app.get("/qr/metrics")
+def get_qr_metrics(current_user: models.AdminUser = Depends(require_admin)):
+    """Aciertos de la caché de QRs (memoria / disco / renders) en este proceso"""
+    return qr_service.get_stats()
 
 
 # ========== ENDPOINTS DE GESTIÓN DE WHATSAPP ==========
 
 @app.get("/admin/whatsapp", response_class=HTMLResponse)
-async def admin_whatsapp(
+def admin_whatsapp(
     request: Request
 ):
     """Página de gestión de WhatsApp"""
@@ -0,0 +1,92 @@
+"""
+Script para agregar las columnas birthday_month y birthday_day a users
+Columnas generadas por la base de datos a partir de birthday, con un índice
+(mes, día) para buscar los cumpleaños de hoy, de los próximos días o del mes.
+Ejecutar con: python migrate_birthday_columns.py
+"""
+import sys
+
+from sqlalchemy import text
+from database import SessionLocal, engine
+
+INDEX_NAME = "ix_users_birthday_month_day"
+
+# Expresión de cada columna según la base de datos (la misma que genera models.User)
+BIRTHDAY_COLUMNS = {
+    "mysql": [
+        ("birthday_month", "EXTRACT(month FROM birthday)"),
+        ("birthday_day", "EXTRACT(day FROM birthday)"),
+    ],
+    "sqlite": [
+        ("birthday_month", "CAST(STRFTIME('%m', birthday) AS INTEGER)"),
+        ("birthday_day", "CAST(STRFTIME('%d', birthday) AS INTEGER)"),
+    ],
+}
+
+
+def main():
+    print("=" * 60)
+    print("MIGRACIÓN: Columnas de mes y día de cumpleaños")
+    print("=" * 60)
+
+    db = SessionLocal()
+
+    try:
+        # Detectar tipo de base de datos
+        db_url = str(engine.url)
+        is_mysql = 'mysql' in db_url.lower()
+
+        if is_mysql:
+            result = db.execute(text("SHOW COLUMNS FROM users"))
+            existing_columns = {row[0] for row in result.fetchall()}
+        else:
+            # table_xinfo incluye las columnas generadas (table_info no)
+            result = db.execute(text("PRAGMA table_xinfo(users)"))
+            existing_columns = {row[1] for row in result.fetchall()}
+
+        for column, expression in BIRTHDAY_COLUMNS["mysql" if is_mysql else "sqlite"]:
+            if column in existing_columns:
+                print(f"\n[OK] La columna {column} ya existe")
+                continue
+
+            print(f"\nAgregando columna {column}...")
+            # SQLite solo permite agregar columnas generadas VIRTUAL
+            db.execute(text(
+                f"ALTER TABLE users ADD COLUMN {column} SMALLINT "
+                f"GENERATED ALWAYS AS ({expression}) VIRTUAL"
+            ))
+            db.commit()
+            print("   [OK] Columna agregada")
+
+        if is_mysql:
+            result = db.execute(text("SHOW INDEX FROM users"))
+            existing_indexes = {row[2] for row in result.fetchall()}
+        else:
+            result = db.execute(text("PRAGMA index_list(users)"))
+            existing_indexes = {row[1] for row in result.fetchall()}
+
+        if INDEX_NAME in existing_indexes:
+            print(f"\n[OK] El índice {INDEX_NAME} ya existe")
+        else:
+            print(f"\nCreando índice {INDEX_NAME} (birthday_month, birthday_day)...")
+            db.execute(text(f"CREATE INDEX {INDEX_NAME} ON users (birthday_month, birthday_day)"))
+            db.commit()
+            print("   [OK] Índice creado")
+
+        result = db.execute(text("SELECT COUNT(*) FROM users WHERE birthday_month IS NOT NULL"))
+        print(f"\n   Usuarios con cumpleaños: {result.scalar()}")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRACIÓN COMPLETADA EXITOSAMENTE")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -81,7 +81,8 @@ def migrate_table(sqlite_conn, mysql_conn, table, columns, id_col="id"):
 
 def get_mysql_columns(mysql_cur, table):
     mysql_cur.execute(f"DESCRIBE `{table}`")
-    return {row[0] for row in mysql_cur.fetchall()}
+    # Generated columns (users.birthday_month/birthday_day) cannot be inserted
+    return {row[0] for row in mysql_cur.fetchall() if "GENERATED" not in (row[5] or "").upper()}
 
 def main():
     print("=== Migración SQLite -> MySQL ===")
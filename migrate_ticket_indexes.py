@@ -0,0 +1,65 @@
+"""
+Script para agregar los índices del listado de tickets (/admin/tickets)
+Filtros por evento, usuario y estado de uso, y orden por fecha de creación.
+Ejecutar con: python migrate_ticket_indexes.py
+"""
+import sys
+
+from sqlalchemy import text
+from database import SessionLocal, engine
+
+TICKET_INDEXES = [
+    ("ix_tickets_event_used", "event_id, is_used"),
+    ("ix_tickets_user_id", "user_id"),
+    ("ix_tickets_used_created", "is_used, created_at"),
+    ("ix_tickets_created_at", "created_at"),
+]
+
+
+def main():
+    print("=" * 60)
+    print("MIGRACIÓN: Índices del listado de tickets")
+    print("=" * 60)
+
+    db = SessionLocal()
+
+    try:
+        # Detectar tipo de base de datos
+        db_url = str(engine.url)
+        is_mysql = 'mysql' in db_url.lower()
+
+        if is_mysql:
+            result = db.execute(text("SHOW INDEX FROM tickets"))
+            existing_indexes = {row[2] for row in result.fetchall()}
+        else:
+            result = db.execute(text("PRAGMA index_list(tickets)"))
+            existing_indexes = {row[1] for row in result.fetchall()}
+
+        created = 0
+        for name, columns in TICKET_INDEXES:
+            if name in existing_indexes:
+                print(f"\n[OK] El índice {name} ya existe")
+                continue
+
+            print(f"\nCreando índice {name} ({columns})...")
+            db.execute(text(f"CREATE INDEX {name} ON tickets ({columns})"))
+            db.commit()
+            created += 1
+            print("   [OK] Índice creado")
+
+        print(f"\n   Índices creados: {created}")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRACIÓN COMPLETADA EXITOSAMENTE")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Script para agregar los índices del directorio de usuarios (/admin/users)
+Filtros por universidad, etiqueta y membresía IEEE, y orden por nombre.
+Ejecutar con: python migrate_user_directory_indexes.py
+"""
+import sys
+
+from sqlalchemy import text
+from database import SessionLocal, engine
+
+DIRECTORY_INDEXES = [
+    ("users", "ix_users_name", "name"),
+    ("users", "ix_users_university_id", "university_id"),
+    ("users", "ix_users_is_ieee_member", "is_ieee_member"),
+    ("user_tags", "ix_user_tags_tag_id", "tag_id"),
+]
+
+
+def main():
+    print("=" * 60)
+    print("MIGRACIÓN: Índices del directorio de usuarios")
+    print("=" * 60)
+
+    db = SessionLocal()
+
+    try:
+        # Detectar tipo de base de datos
+        db_url = str(engine.url)
+        is_mysql = 'mysql' in db_url.lower()
+
+        created = 0
+        for table, name, columns in DIRECTORY_INDEXES:
+            if is_mysql:
+                result = db.execute(text(f"SHOW INDEX FROM {table}"))
+                existing_indexes = {row[2] for row in result.fetchall()}
+            else:
+                result = db.execute(text(f"PRAGMA index_list({table})"))
+                existing_indexes = {row[1] for row in result.fetchall()}
+
+            if name in existing_indexes:
+                print(f"\n[OK] El índice {name} ya existe")
+                continue
+
+            print(f"\nCreando índice {name} en {table} ({columns})...")
+            db.execute(text(f"CREATE INDEX {name} ON {table} ({columns})"))
+            db.commit()
+            created += 1
+            print("   [OK] Índice creado")
+
+        print(f"\n   Índices creados: {created}")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRACIÓN COMPLETADA EXITOSAMENTE")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
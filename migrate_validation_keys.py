@@ -0,0 +1,97 @@
+"""
+Script para agregar la llave única validation_key a validation_logs
+Evita la doble entrada cuando dos validadores escanean el mismo ticket a la vez.
+Ejecutar con: python migrate_validation_keys.py
+"""
+import sys
+
+from sqlalchemy import text
+from database import SessionLocal, engine
+from validation_service import build_validation_key
+
+
+def main():
+    print("=" * 60)
+    print("MIGRACIÓN: Llave única de validación en validation_logs")
+    print("=" * 60)
+
+    db = SessionLocal()
+
+    try:
+        # Detectar tipo de base de datos
+        db_url = str(engine.url)
+        is_mysql = 'mysql' in db_url.lower()
+
+        if is_mysql:
+            result = db.execute(text("DESCRIBE validation_logs"))
+            existing_columns = [row[0] for row in result.fetchall()]
+        else:
+            result = db.execute(text("PRAGMA table_info(validation_logs)"))
+            existing_columns = [row[1] for row in result.fetchall()]
+
+        if 'validation_key' not in existing_columns:
+            print("\nAgregando columna validation_key...")
+            db.execute(text("ALTER TABLE validation_logs ADD COLUMN validation_key VARCHAR(64) NULL"))
+            db.commit()
+        else:
+            print("\n[OK] La columna validation_key ya existe")
+
+        # Asignar llaves a las validaciones exitosas existentes.
+        # Solo la primera validación de cada llave la recibe; los duplicados
+        # históricos (causados por escaneos simultáneos) quedan en NULL.
+        print("\nAsignando llaves a validaciones existentes...")
+        rows = db.execute(text("""
+            SELECT vl.id, vl.ticket_id, vl.validated_at, t.validation_mode, vl.validation_key
+            FROM validation_logs vl
+            JOIN tickets t ON t.id = vl.ticket_id
+            WHERE vl.success = 1
+            ORDER BY vl.validated_at, vl.id
+        """)).fetchall()
+
+        used_keys = {row[4] for row in rows if row[4]}
+        assigned = 0
+        duplicates = 0
+        for log_id, ticket_id, validated_at, validation_mode, current_key in rows:
+            if current_key:
+                continue
+            key = build_validation_key(ticket_id, validation_mode, validated_at)
+            if key in used_keys:
+                duplicates += 1
+                continue
+            db.execute(
+                text("UPDATE validation_logs SET validation_key = :key WHERE id = :id"),
+                {"key": key, "id": log_id}
+            )
+            used_keys.add(key)
+            assigned += 1
+        db.commit()
+
+        print(f"   Llaves asignadas: {assigned}")
+        print(f"   Validaciones duplicadas encontradas: {duplicates}")
+
+        # Crear índice único
+        print("\nCreando índice único...")
+        try:
+            db.execute(text(
+                "CREATE UNIQUE INDEX ix_validation_logs_validation_key ON validation_logs (validation_key)"
+            ))
+            db.commit()
+            print("   [OK] Índice creado")
+        except Exception as e:
+            db.rollback()
+            print(f"   [AVISO] No se creó el índice (¿ya existe?): {e}")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRACIÓN COMPLETADA EXITOSAMENTE")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Enum, Table
+from sqlalchemy import Column, Integer, SmallInteger, String, Date, DateTime, Boolean, ForeignKey, Text, Enum, Table, Float, Index, Computed, extract
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -27,7 +28,8 @@ user_tags = Table(
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
     Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
-    Column('created_at', DateTime, default=datetime.utcnow)
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Index('ix_user_tags_tag_id', 'tag_id')
 )
 
 # Tabla de asociación many-to-many entre Users y IEEESocieties
@@ -295,6 +297,9 @@ class User(Base):
     phone = Column(String(20), nullable=True)
     identification = Column(String(50), nullable=True)  # Cédula
     birthday = Column(DateTime, nullable=True)  # Fecha de cumpleaños
+    # Mes y día del cumpleaños, calculados por la base de datos (ver migrate_birthday_columns.py)
+    birthday_month = Column(SmallInteger, Computed(extract('month', birthday)), nullable=True)
+    birthday_day = Column(SmallInteger, Computed(extract('day', birthday)), nullable=True)
 
     # ============================================================
     # INFORMACIÓN ACADÉMICA
@@ -362,6 +367,15 @@ class User(Base):
     skills = relationship("Skill", secondary=user_skills, back_populates="users")
     studies = relationship("UserStudy", back_populates="user", cascade="all, delete-orphan")
 
+    # Índices de los filtros y órdenes del directorio (ver migrate_user_directory_indexes.py)
+    __table_args__ = (
+        Index('ix_users_name', 'name'),
+        Index('ix_users_university_id', 'university_id'),
+        Index('ix_users_is_ieee_member', 'is_ieee_member'),
+        # Cumpleaños de hoy, de los próximos días y del mes
+        Index('ix_users_birthday_month_day', 'birthday_month', 'birthday_day'),
+    )
+
 
 class UserStudy(Base):
     """Estudios adicionales del usuario (pregrado, posgrado, etc.)"""
@@ -380,6 +394,25 @@ class UserStudy(Base):
     user = relationship("User", back_populates="studies")
 
 
+class UserSearchToken(Base):
+    """
+    Índice de búsqueda de usuarios: una fila por palabra normalizada (sin tildes,
+    en minúscula) de nombre, emails, cédula y teléfono. Se busca por prefijo
+    sobre el índice de token (ver user_search_service.py).
+    """
+    __tablename__ = "user_search_tokens"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # Comparación binaria en MySQL: la búsqueda por prefijo es un rango sobre el índice
+    token = Column(String(100).with_variant(mysql.VARCHAR(100, collation='utf8mb4_bin'), 'mysql'), primary_key=True)
+    # Peso del campo de origen para ordenar resultados (nombre > email > otros)
+    weight = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        Index('ix_user_search_tokens_token', 'token', 'user_id'),
+    )
+
+
 class Event(Base):
     """Modelo de Evento"""
     __tablename__ = "events"
@@ -451,6 +484,14 @@ class Ticket(Base):
     event = relationship("Event", back_populates="tickets")
     validations = relationship("ValidationLog", back_populates="ticket")
 
+    # Índices de los filtros del listado de tickets (ver migrate_ticket_indexes.py)
+    __table_args__ = (
+        Index('ix_tickets_event_used', 'event_id', 'is_used'),
+        Index('ix_tickets_user_id', 'user_id'),
+        Index('ix_tickets_used_created', 'is_used', 'created_at'),
+        Index('ix_tickets_created_at', 'created_at'),
+    )
+
 
 class BranchRoleEnum(enum.Enum):
     """Roles internos de la rama estudiantil IEEE"""
@@ -511,11 +552,29 @@ class ValidationLog(Base):
     success = Column(Boolean, default=True)
     notes = Column(Text, nullable=True)
 
+    # Llave única de la validación exitosa: "<ticket_id>:once" o "<ticket_id>:<YYYY-MM-DD>" (modo daily).
+    # Garantiza a nivel de BD que dos validadores simultáneos no registren doble entrada.
+    validation_key = Column(String(64), unique=True, nullable=True)
+
     # Relaciones
     ticket = relationship("Ticket")
     validator = relationship("AdminUser", back_populates="validations")
 
 
+class EventValidationStats(Base):
+    """Contadores de tickets y validaciones por evento, actualizados en cada cambio"""
+    __tablename__ = "event_validation_stats"
+
+    event_id = Column(Integer, ForeignKey("events.id"), primary_key=True)
+    total_tickets = Column(Integer, default=0, nullable=False)
+    once_tickets = Column(Integer, default=0, nullable=False)
+    daily_tickets = Column(Integer, default=0, nullable=False)
+    total_validations = Column(Integer, default=0, nullable=False)  # Validaciones exitosas
+    validated_tickets = Column(Integer, default=0, nullable=False)  # Tickets con al menos una validación exitosa
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    reconciled_at = Column(DateTime, nullable=True)  # Última reconstrucción desde las tablas
+
+
 class BirthdayCheckLog(Base):
     """Registro de ejecuciones del sistema de cumpleaños"""
     __tablename__ = "birthday_check_logs"
@@ -532,6 +591,30 @@ class BirthdayCheckLog(Base):
     notes = Column(Text, nullable=True)  # Notas adicionales
 
 
+class BirthdayDelivery(Base):
+    """Felicitación de cumpleaños de un usuario por un canal en un día (ver birthday_dispatcher.py)"""
+    __tablename__ = "birthday_deliveries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    channel = Column(String(20), nullable=False)  # "email" o "whatsapp"
+    greeting_date = Column(Date, nullable=False)  # Día del cumpleaños que se felicita (Bogotá)
+    status = Column(String(20), default="pending")  # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)  # Inicio del envío en curso
+    sent_at = Column(DateTime, nullable=True)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        # Una sola felicitación por usuario, canal y día: re-ejecutar no reenvía
+        Index('ux_birthday_deliveries_user_channel_day', 'user_id', 'channel', 'greeting_date', unique=True),
+        Index('ix_birthday_deliveries_day_status', 'greeting_date', 'status'),
+    )
+
+
 class MessageCampaign(Base):
     """Campaña de mensajes masivos"""
     __tablename__ = "message_campaigns"
@@ -590,6 +673,111 @@ class MessageRecipient(Base):
     user = relationship("User")
 
 
+class DeliveryJob(Base):
+    """Trabajo de envío masivo procesado en segundo plano por job_worker.py"""
+    __tablename__ = "delivery_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(50), nullable=False)  # "campaign", "event_tickets_whatsapp"
+    status = Column(String(20), default="queued", index=True)  # queued, running, completed, failed, cancelled
+    payload = Column(Text, nullable=True)  # JSON con los parámetros comunes del envío
+
+    # Progreso
+    total_tasks = Column(Integer, default=0)
+    completed_tasks = Column(Integer, default=0)
+    failed_tasks = Column(Integer, default=0)
+
+    campaign_id = Column(Integer, ForeignKey("message_campaigns.id"), nullable=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=True)
+    created_by = Column(Integer, ForeignKey("admin_users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Relaciones
+    tasks = relationship("DeliveryTask", back_populates="job", cascade="all, delete-orphan")
+
+
+class DeliveryTask(Base):
+    """Envío individual (un destinatario por canal) dentro de un DeliveryJob"""
+    __tablename__ = "delivery_tasks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("delivery_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    channel = Column(String(20), nullable=False)  # "email" o "whatsapp"
+    target_id = Column(Integer, nullable=False)  # MessageRecipient.id o Ticket.id según el tipo de trabajo
+    status = Column(String(20), default="pending", index=True)  # pending, running, sent, failed
+    attempts = Column(Integer, default=0)
+    error = Column(String(500), nullable=True)
+
+    # Bloqueo del worker que la procesa (para recuperar tareas si el worker muere)
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    # Relaciones
+    job = relationship("DeliveryJob", back_populates="tasks")
+
+
+class SendStreamRun(Base):
+    """Envío masivo de tickets con progreso en vivo (SSE), ver send_streams.py"""
+    __tablename__ = "send_stream_runs"
+
+    id = Column(String(32), primary_key=True)  # run_id que recibe el navegador
+    channel = Column(String(20), nullable=False)  # "email" o "whatsapp"
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
+    status = Column(String(20), default="running", index=True)  # running, completed, failed
+    # "canal:evento" mientras corre (NULL al terminar): un solo envío en curso por evento y canal
+    active_key = Column(String(50), nullable=True, unique=True)
+    worker = Column(String(100), nullable=True)  # host:pid del worker que envía
+    created_by = Column(Integer, ForeignKey("admin_users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=True)  # Última publicación del worker
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SendStreamEvent(Base):
+    """Evento publicado por un SendStreamRun; seq es el id del evento SSE"""
+    __tablename__ = "send_stream_events"
+    __table_args__ = (
+        Index('ix_send_stream_events_run_seq', 'run_id', 'seq', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(String(32), ForeignKey("send_stream_runs.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON del evento
+
+
+class WhatsAppRateLimit(Base):
+    """Token bucket de envío por número de WhatsApp, compartido entre workers"""
+    __tablename__ = "whatsapp_rate_limits"
+
+    phone_number_id = Column(String(50), primary_key=True)
+    tokens = Column(Float, nullable=False)  # Tokens disponibles en el bucket
+    rate = Column(Float, nullable=False)  # Mensajes por segundo actuales (baja al recibir throttling)
+    last_refill = Column(Float, nullable=False)  # Timestamp unix del último rellenado
+    blocked_until = Column(Float, nullable=True)  # Timestamp unix hasta el que Meta pidió esperar
+    throttle_count = Column(Integer, default=0)
+    last_error_code = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class WhatsAppMediaCache(Base):
+    """Media IDs ya subidos a Meta, por contenido, para no subir la misma imagen en cada envío"""
+    __tablename__ = "whatsapp_media_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(120), unique=True, nullable=False)  # "{phone_number_id}:{sha256 del contenido}"
+    media_id = Column(String(100), nullable=False)
+    mime_type = Column(String(50), nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    use_count = Column(Integer, default=0)
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)  # Meta conserva los medios subidos 30 días
+
+
 class WhatsAppTemplate(Base):
     """Templates de WhatsApp para Meta Cloud API"""
     __tablename__ = "whatsapp_templates"
@@ -687,6 +875,24 @@ class WhatsAppConversation(Base):
     user = relationship("User", backref="whatsapp_conversation")
 
 
+class WhatsAppWebhookInbox(Base):
+    """Webhooks de WhatsApp recibidos y aún por procesar, ver whatsapp_inbox.py"""
+    __tablename__ = "whatsapp_webhook_inbox"
+    __table_args__ = (
+        Index('ix_whatsapp_webhook_inbox_status', 'status', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    payload = Column(Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=False)  # Cuerpo tal como llegó
+    status = Column(String(20), default="pending")  # pending, processing, processed, failed
+    attempts = Column(Integer, default=0)
+    error = Column(String(500), nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    locked_by = Column(String(100), nullable=True)  # Consumidor que lo procesa
+    locked_at = Column(DateTime, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+
 class UserOTP(Base):
     """Códigos OTP para autenticación de usuarios del portal"""
     __tablename__ = "user_otps"
@@ -759,6 +965,15 @@ class AlliedCompany(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class CacheVersion(Base):
+    """Versión de una caché en memoria, compartida entre workers (ver public_page_cache.py)"""
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)  # "public_pages"
+    version = Column(Integer, default=0, nullable=False)  # Sube con cada cambio de los datos cacheados
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 # ============================================================
 # MÓDULOS EXTERNOS Y API
 # ============================================================
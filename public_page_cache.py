@@ -0,0 +1,286 @@
+"""
+Caché de las páginas públicas (/home, /espacio2026, /api/public/member/{id})
+
+Cada página se genera una vez y se guarda en memoria ya renderizada (bytes)
+con su ETag. Las visitas siguientes no tocan la base de datos, y un
+navegador que envía If-None-Match con el ETag vigente recibe un 304 vacío.
+
+Invalidación explícita: cualquier commit que cambie eventos, imágenes de
+galería, etiquetas, proyectos, empresas aliadas, catálogos o los campos
+públicos del perfil de un usuario sube la versión "public_pages" de
+cache_versions (eventos de sesión de SQLAlchemy, abajo). El worker que hizo
+el cambio vacía su caché al instante; los demás leen la versión como mucho
+cada PUBLIC_PAGE_CACHE_CHECK_SECONDS y la vacían al ver que cambió.
+
+Lo que se escribe sin el ORM (inserciones masivas, UPDATE directos) debe
+llamar a mark_public_pages_changed(db) antes del commit.
+
+Los conteos de tickets de /home no invalidan la caché (cambian con cada
+registro): se refrescan con PUBLIC_PAGE_CACHE_TTL_SECONDS, igual que el paso
+de un evento de "próximos" a "pasados", que además vence la página a la
+hora del siguiente evento.
+
+Variables de entorno:
+    PUBLIC_PAGE_CACHE_ENABLED        "false" para desactivarla (default true)
+    PUBLIC_PAGE_CACHE_TTL_SECONDS    Vida máxima de una página (default 300)
+    PUBLIC_PAGE_CACHE_CHECK_SECONDS  Cada cuánto se revisa la versión compartida (default 5)
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from itertools import chain
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import event, inspect, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+PUBLIC_PAGE_CACHE_ENABLED = os.getenv("PUBLIC_PAGE_CACHE_ENABLED", "true").lower() == "true"
+PUBLIC_PAGE_CACHE_TTL_SECONDS = float(os.getenv("PUBLIC_PAGE_CACHE_TTL_SECONDS", "300"))
+PUBLIC_PAGE_CACHE_CHECK_SECONDS = float(os.getenv("PUBLIC_PAGE_CACHE_CHECK_SECONDS", "5"))
+
+# Máximo de páginas en memoria (cada perfil de miembro es una)
+PUBLIC_PAGE_CACHE_MAX_ENTRIES = 1000
+
+CACHE_VERSION_NAME = "public_pages"
+
+# El navegador puede guardar la página pero debe revalidarla (ETag) en cada visita
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+
+# Modelos que aparecen en las páginas públicas: cualquier cambio invalida
+PUBLIC_MODELS = (
+    models.Event, models.EventGalleryImage, models.Tag, models.UserStudy, models.Skill,
+    models.Project, models.AlliedCompany, models.AcademicProgram, models.University,
+    models.SemesterRange, models.IEEESociety, models.InterestArea
+)
+
+# De User solo invalidan los campos que se publican (no last_login, login_count...)
+PUBLIC_USER_FIELDS = (
+    'name', 'nick', 'photo_path', 'branch_role', 'is_professor', 'ieee_member_id',
+    'university_id', 'academic_program_id', 'semester_range_id', 'interest_area_id',
+    'university', 'academic_program', 'semester_range', 'interest_area',
+    'tags', 'skills', 'ieee_societies', 'studies'
+)
+
+_CHANGED_KEY = "public_pages_changed"
+
+
+class CachedPage:
+    """Página renderizada con su ETag"""
+
+    __slots__ = ("body", "media_type", "etag", "expires_at")
+
+    def __init__(self, body: bytes, media_type: Optional[str], expires_at: float):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.expires_at = expires_at
+
+
+class PublicPageCache:
+    """Páginas públicas renderizadas, por llave ("home", "member:12"...)"""
+
+    def __init__(self, ttl: float = PUBLIC_PAGE_CACHE_TTL_SECONDS, check_interval: float = PUBLIC_PAGE_CACHE_CHECK_SECONDS,
+                 max_entries: int = PUBLIC_PAGE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._pages: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._render_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def respond(self, request: Request, db: Session, key: str,
+                render: Callable[[], Tuple[Response, Optional[datetime]]]) -> Response:
+        """
+        Respuesta de la página `key`, desde la caché o renderizándola.
+
+        Args:
+            render: genera la respuesta y, opcionalmente, la hora (local, naive)
+                    hasta la que es válida. Sus excepciones (404...) no se cachean.
+        """
+        if not PUBLIC_PAGE_CACHE_ENABLED:
+            response, _ = render()
+            return response
+
+        self._sync_version(db)
+        page = self._get(key)
+        if page is None:
+            page = self._render(key, render)
+        return self._response(request, page)
+
+    def invalidate(self):
+        """Vacía las páginas de este worker"""
+        with self._lock:
+            self._pages.clear()
+            self._generation += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": PUBLIC_PAGE_CACHE_ENABLED,
+                "pages": len(self._pages),
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _sync_version(self, db: Session):
+        """Vacía la caché si otro worker cambió los datos (a lo sumo una consulta cada check_interval)"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = db.query(models.CacheVersion.version).filter(
+            models.CacheVersion.name == CACHE_VERSION_NAME
+        ).scalar() or 0
+        with self._lock:
+            if version != self._version:
+                self._pages.clear()
+                self._generation += 1
+                self._version = version
+
+    def _get(self, key: str) -> Optional[CachedPage]:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                return None
+            if page.expires_at <= time.monotonic():
+                del self._pages[key]
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def _render(self, key: str, render) -> CachedPage:
+        # Una sola generación por llave: tras una invalidación, las visitas
+        # simultáneas esperan la misma página en lugar de consultar todas a MySQL
+        with self._lock:
+            render_lock = self._render_locks.setdefault(key, threading.Lock())
+        with render_lock:
+            page = self._get(key)
+            if page is not None:
+                return page
+
+            with self._lock:
+                generation = self._generation
+                self.misses += 1
+            response, valid_until = render()
+
+            expires_at = time.monotonic() + self.ttl
+            if valid_until is not None:
+                expires_at = min(expires_at, time.monotonic() + max((valid_until - datetime.now()).total_seconds(), 0))
+            page = CachedPage(response.body, response.media_type, expires_at)
+
+            with self._lock:
+                # Si los datos cambiaron mientras se generaba, no se guarda
+                if generation == self._generation:
+                    self._pages[key] = page
+                    self._pages.move_to_end(key)
+                    while len(self._pages) > self.max_entries:
+                        self._pages.popitem(last=False)
+                self._render_locks.pop(key, None)
+            return page
+
+    def _response(self, request: Request, page: CachedPage) -> Response:
+        headers = {"ETag": page.etag, "Cache-Control": PUBLIC_CACHE_CONTROL}
+        if _etag_matches(request.headers.get("if-none-match"), page.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=page.body, media_type=page.media_type, headers=headers)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # Comparación débil (RFC 9110): W/"x" equivale a "x"
+    return "*" in candidates or etag in [value[2:] if value.startswith("W/") else value for value in candidates]
+
+
+# Instancia global (una por proceso)
+public_page_cache = PublicPageCache()
+
+
+# ============================================================
+# INVALIDACIÓN
+# ============================================================
+
+def mark_public_pages_changed(db: Session):
+    """Invalida las páginas públicas cuando la transacción de `db` haga commit"""
+    db.info[_CHANGED_KEY] = True
+
+
+def bump_public_pages_version(bind):
+    """Sube la versión compartida y vacía la caché de este worker"""
+    public_page_cache.invalidate()
+    table = models.CacheVersion.__table__
+    try:
+        with bind.begin() as connection:
+            changed = connection.execute(
+                update(table).where(table.c.name == CACHE_VERSION_NAME).values(
+                    version=table.c.version + 1, updated_at=datetime.utcnow()
+                )
+            ).rowcount
+            if not changed:
+                connection.execute(table.insert().values(name=CACHE_VERSION_NAME, version=1, updated_at=datetime.utcnow()))
+    except IntegrityError:
+        # Otro worker creó la fila al mismo tiempo: ya hay una versión nueva
+        pass
+    except Exception as e:
+        print(f"[CACHE] No se pudo actualizar la versión de las páginas públicas: {e}")
+
+
+def _affects_public_pages(obj) -> bool:
+    """Si un objeto modificado (ni nuevo ni borrado) cambia lo que se publica"""
+    if isinstance(obj, PUBLIC_MODELS):
+        return True
+    if isinstance(obj, models.User):
+        state = inspect(obj)
+        return any(state.attrs[field].history.has_changes() for field in PUBLIC_USER_FIELDS)
+    return False
+
+
+@event.listens_for(Session, "after_flush")
+def _track_public_changes(session, flush_context):
+    # En after_flush new, dirty y deleted todavía tienen el estado previo al flush
+    if session.info.get(_CHANGED_KEY):
+        return
+    changed = any(isinstance(obj, PUBLIC_MODELS + (models.User,)) for obj in chain(session.new, session.deleted)) or any(
+        session.is_modified(obj) and _affects_public_pages(obj) for obj in session.dirty
+    )
+    if changed:
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_bulk_update")
+def _track_public_bulk_update(update_context):
+    if issubclass(update_context.mapper.class_, PUBLIC_MODELS + (models.User,)):
+        update_context.session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_bulk_delete")
+def _track_public_bulk_delete(delete_context):
+    if issubclass(delete_context.mapper.class_, PUBLIC_MODELS + (models.User,)):
+        delete_context.session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_public_changes(session):
+    if session.info.pop(_CHANGED_KEY, False):
+        bump_public_pages_version(session.get_bind())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_public_changes(session):
+    session.info.pop(_CHANGED_KEY, None)
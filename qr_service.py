@@ -0,0 +1,201 @@
+"""
+Servicio unificado de renderizado de QRs
+
+Un QR de ticket depende solo del ticket_code y de los parámetros de dibujo,
+así que se renderiza una vez y se reutiliza: primero desde un LRU en memoria,
+luego desde disco (qr_codes/), y solo si no está en ninguno se dibuja. Del
+mismo PNG salen los bytes, el data URL base64 y la ruta del archivo.
+"""
+import base64
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Tuple
+
+import qrcode
+
+# Cantidad de PNGs que se mantienen en memoria
+QR_CACHE_MEMORY_ITEMS = int(os.getenv("QR_CACHE_MEMORY_ITEMS", "512"))
+
+# Parámetros de dibujo por defecto (los mismos que usaba TicketService)
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 4
+DEFAULT_ERROR_CORRECTION = "H"
+
+_ERROR_CORRECTION_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+def render_qr_png(
+    ticket_code: str,
+    box_size: int = DEFAULT_BOX_SIZE,
+    border: int = DEFAULT_BORDER,
+    error_correction: str = DEFAULT_ERROR_CORRECTION
+) -> bytes:
+    """
+    Dibuja el QR como PNG RGB de 8 bits (WhatsApp no acepta imágenes de 1 bit).
+    Función de módulo para poder usarla desde un ProcessPool.
+    """
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=_ERROR_CORRECTION_LEVELS[error_correction],
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(ticket_code)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    if hasattr(img, 'get_image'):
+        img = img.get_image()
+    img = img.convert('RGB')
+
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def render_qr_file(ticket_code: str, path: str, **params) -> str:
+    """Dibuja el QR y lo escribe en `path` (para generación en lote en un ProcessPool)"""
+    _write_atomic(Path(path), render_qr_png(ticket_code, **params))
+    return path
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Escribe a un archivo temporal y lo renombra para no servir PNGs a medio escribir"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _is_current_format(data: bytes) -> bool:
+    """True si el PNG es RGB de 8 bits (los QRs antiguos en disco eran de 1 bit)"""
+    # IHDR: byte 24 = profundidad de bits, byte 25 = tipo de color (2 = RGB)
+    return len(data) > 25 and data[:8] == b"\x89PNG\r\n\x1a\n" and data[24] == 8 and data[25] == 2
+
+
+class QRService:
+    """Renderizado de QRs con caché en memoria (LRU) y en disco"""
+
+    def __init__(self, directory: str = "qr_codes", memory_items: int = QR_CACHE_MEMORY_ITEMS):
+        self.directory = Path(directory)
+        self.directory.mkdir(exist_ok=True)
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+
+    @staticmethod
+    def _params_key(box_size: int, border: int, error_correction: str) -> Tuple[int, int, str]:
+        return (box_size, border, error_correction)
+
+    def path_for(
+        self,
+        ticket_code: str,
+        box_size: int = DEFAULT_BOX_SIZE,
+        border: int = DEFAULT_BORDER,
+        error_correction: str = DEFAULT_ERROR_CORRECTION
+    ) -> str:
+        """Ruta en disco del QR. Con los parámetros por defecto es qr_codes/{ticket_code}.png"""
+        if self._params_key(box_size, border, error_correction) == self._params_key(DEFAULT_BOX_SIZE, DEFAULT_BORDER, DEFAULT_ERROR_CORRECTION):
+            return str(self.directory / f"{ticket_code}.png")
+        return str(self.directory / f"{ticket_code}-{error_correction}{box_size}b{border}.png")
+
+    def get_png(
+        self,
+        ticket_code: str,
+        box_size: int = DEFAULT_BOX_SIZE,
+        border: int = DEFAULT_BORDER,
+        error_correction: str = DEFAULT_ERROR_CORRECTION
+    ) -> bytes:
+        """PNG del QR: memoria -> disco -> render"""
+        key = (ticket_code,) + self._params_key(box_size, border, error_correction)
+
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        path = Path(self.path_for(ticket_code, box_size, border, error_correction))
+        data = None
+        if path.exists():
+            try:
+                data = path.read_bytes()
+            except OSError:
+                data = None
+            if data is not None and not _is_current_format(data):
+                data = None
+
+        if data is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            data = render_qr_png(ticket_code, box_size, border, error_correction)
+            _write_atomic(path, data)
+            with self._lock:
+                self.renders += 1
+
+        self._remember(key, data)
+        return data
+
+    def get_base64(self, ticket_code: str, **params) -> str:
+        """QR como data URL base64 (para emails, WhatsApp y páginas)"""
+        return f"data:image/png;base64,{base64.b64encode(self.get_png(ticket_code, **params)).decode()}"
+
+    def get_path(self, ticket_code: str, **params) -> str:
+        """Ruta del archivo del QR, generándolo si aún no existe en disco"""
+        path = self.path_for(ticket_code, **params)
+        if os.path.exists(path):
+            with self._lock:
+                self.disk_hits += 1
+            return path
+        data = self.get_png(ticket_code, **params)
+        if not os.path.exists(path):
+            # Estaba en memoria pero el archivo se borró del disco
+            _write_atomic(Path(path), data)
+        return path
+
+    def invalidate(self, ticket_code: str):
+        """Descarta las copias en memoria y el archivo por defecto de un ticket"""
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == ticket_code]:
+                del self._memory[key]
+        path = Path(self.path_for(ticket_code))
+        if path.exists():
+            path.unlink()
+
+    def get_stats(self) -> Dict:
+        """Contadores de aciertos de la caché en este proceso"""
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.renders
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "renders": self.renders,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / total, 3) if total else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.memory_items
+            }
+
+    def _remember(self, key: Tuple, data: bytes):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+
+# Instancia global del servicio
+qr_service = QRService()
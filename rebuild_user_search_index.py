@@ -0,0 +1,51 @@
+"""
+Reconstrucción del índice de búsqueda de usuarios (user_search_tokens)
+
+La primera ejecución pobla el índice con los usuarios existentes. Después solo
+hace falta si se insertaron usuarios por fuera del ORM o con scripts que no
+importan user_search_service (por ejemplo import_users_with_tags.py).
+
+Ejecutar con: python rebuild_user_search_index.py [--batch-size 1000]
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+# Configurar codificacion UTF-8 para stdout en Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Agregar el directorio actual al path para importar modulos
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models
+from database import SessionLocal, engine
+from user_search_service import rebuild_user_search_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye el índice de búsqueda de usuarios")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Usuarios por lote")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        indexed = rebuild_user_search_index(db, batch_size=args.batch_size)
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] No se pudo reconstruir el índice: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[OK] {indexed} usuario(s) indexado(s) en {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
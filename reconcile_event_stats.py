@@ -0,0 +1,66 @@
+"""
+Reconciliación de contadores de validación por evento
+
+Reconstruye event_validation_stats desde tickets y validation_logs y reporta
+los eventos cuyo contador guardado se había desviado. La primera ejecución
+también sirve para poblar la tabla con los eventos existentes.
+
+Se puede programar periódicamente (cron / tarea programada), por ejemplo
+cada noche o después de cada evento.
+
+Ejecutar con: python reconcile_event_stats.py [--event-id ID]
+Sale con código 2 si encontró desvíos (para alertas del cron).
+"""
+import argparse
+import io
+import sys
+from pathlib import Path
+
+# Configurar codificacion UTF-8 para stdout en Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Agregar el directorio actual al path para importar modulos
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models
+from database import SessionLocal, engine
+from event_stats_service import rebuild_event_stats, reconcile_all_event_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye los contadores de validación por evento")
+    parser.add_argument("--event-id", type=int, help="Solo este evento")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        if args.event_id:
+            result = rebuild_event_stats(db, args.event_id)
+            db.commit()
+            events = 1
+            with_drift = [result] if result["drift"] else []
+        else:
+            summary = reconcile_all_event_stats(db)
+            events = summary["events"]
+            with_drift = summary["events_with_drift"]
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] No se pudo reconciliar: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[OK] {events} evento(s) reconciliado(s)")
+    for result in with_drift:
+        print(f"   [DESVÍO] Evento {result['event_id']}: {result['drift']} (corregido)")
+
+    if with_drift:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
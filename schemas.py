@@ -3,6 +3,8 @@ from pydantic import BaseModel, EmailStr, validator
 from datetime import datetime
 from typing import Optional, List
 
+from template_service import validate_template
+
 
 # Schemas de Tag/Etiqueta
 class TagCreate(BaseModel):
@@ -236,6 +238,14 @@ class OrganizationCreate(BaseModel):
     instagram: Optional[str] = None
     twitter: Optional[str] = None
 
+    @validator('email_template')
+    def validate_email_template(cls, v):
+        return validate_template(v, "email")
+
+    @validator('whatsapp_template')
+    def validate_whatsapp_template(cls, v):
+        return validate_template(v, "whatsapp")
+
 
 class OrganizationUpdate(BaseModel):
     """Schema para actualizar organización"""
@@ -253,6 +263,14 @@ class OrganizationUpdate(BaseModel):
     twitter: Optional[str] = None
     is_active: Optional[bool] = None
 
+    @validator('email_template')
+    def validate_email_template(cls, v):
+        return validate_template(v, "email")
+
+    @validator('whatsapp_template')
+    def validate_whatsapp_template(cls, v):
+        return validate_template(v, "whatsapp")
+
 
 class OrganizationResponse(BaseModel):
     """Schema para respuesta de organización"""
@@ -437,6 +455,14 @@ class EventCreate(BaseModel):
             raise ValueError('El tipo de evento debe ser "organized" o "participation"')
         return v
 
+    @validator('email_template')
+    def validate_email_template(cls, v):
+        return validate_template(v, "email")
+
+    @validator('whatsapp_template')
+    def validate_whatsapp_template(cls, v):
+        return validate_template(v, "whatsapp")
+
 
 class EventUpdate(BaseModel):
     """Schema para actualizar evento"""
@@ -460,6 +486,14 @@ class EventUpdate(BaseModel):
             raise ValueError('El tipo de evento debe ser "organized" o "participation"')
         return v
 
+    @validator('email_template')
+    def validate_email_template(cls, v):
+        return validate_template(v, "email")
+
+    @validator('whatsapp_template')
+    def validate_whatsapp_template(cls, v):
+        return validate_template(v, "whatsapp")
+
 
 class EventResponse(BaseModel):
     """Schema para respuesta de evento"""
@@ -571,6 +605,23 @@ class TicketValidationResponse(BaseModel):
     is_second_validation: Optional[bool] = False  # Si es la segunda validación del día
 
 
+class OfflineValidationEntry(BaseModel):
+    """Validación realizada sin conexión por el validador"""
+    local_id: str  # ID generado en el dispositivo (para mapear el resultado)
+    ticket_code: str
+    scanned_at: datetime  # Hora local de Bogotá en que se escaneó
+    device_id: Optional[str] = None
+
+
+class OfflineSyncRequest(BaseModel):
+    """Lote de validaciones offline con la cabecera del manifiesto usado"""
+    event_id: int
+    issued_at: str  # Cabecera firmada del manifiesto descargado
+    digest: str
+    signature: str
+    entries: List[OfflineValidationEntry]
+
+
 # Schemas de Autenticación
 class LoginRequest(BaseModel):
     """Schema para solicitud de login"""
@@ -0,0 +1,492 @@
+"""
+Envíos masivos de tickets con progreso en vivo (Server-Sent Events)
+
+/tickets/send-email-by-event-stream y /tickets/send-whatsapp-by-event-stream
+inician un envío (SendStreamRun) que corre en un hilo propio del worker,
+independiente de la conexión: cerrar la pestaña no lo detiene. Los envíos
+van a un pool acotado (SEND_STREAM_CONCURRENCY en vuelo; el email además
+agrupa con EmailTransport) y cada resultado se publica apenas termina, así
+que los eventos de progreso pueden llegar en otro orden que los tickets.
+
+Cada evento publicado se guarda en send_stream_events con un número
+consecutivo que viaja como `id:` del SSE. Al reconectar, el navegador manda
+run_id y la cabecera Last-Event-ID y recibe solo lo que no vio, desde
+cualquier worker. Pedir otra vez el envío de un evento que ya se está
+enviando se une al envío en curso en lugar de duplicarlo: la llave única
+active_key de send_stream_runs garantiza un solo envío en curso por evento y
+canal, aunque dos peticiones lleguen a la vez.
+
+Variables de entorno:
+    SEND_STREAM_CONCURRENCY      Envíos simultáneos de WhatsApp por ejecución (default 4)
+    SEND_STREAM_RETENTION_HOURS  Horas que se guardan los eventos (default 24)
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+
+import models
+from database import SessionLocal
+from email_service import email_service, EMAIL_BATCH_SIZE
+from timezone_utils import get_bogota_now_naive
+
+SEND_STREAM_CONCURRENCY = int(os.getenv("SEND_STREAM_CONCURRENCY", "4"))
+SEND_STREAM_RETENTION_HOURS = float(os.getenv("SEND_STREAM_RETENTION_HOURS", "24"))
+
+# Cada cuánto revisa un lector si hay eventos nuevos de un envío de otro worker
+SEND_STREAM_POLL_SECONDS = 0.5
+
+# Comentario SSE para que los proxies no cierren una conexión sin eventos
+SEND_STREAM_KEEPALIVE_SECONDS = 15
+
+# Un envío sin publicar nada en este tiempo quedó de un worker que se detuvo
+SEND_STREAM_STALE_AFTER = timedelta(minutes=5)
+
+# Eventos que lee un lector por consulta
+_READ_LIMIT = 500
+
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Despierta a los lectores de este worker cuando se publica algo
+_published = threading.Condition()
+
+
+def _sse(payload: Dict, seq: Optional[int] = None) -> str:
+    data = json.dumps(payload) if isinstance(payload, dict) else payload
+    return f"id: {seq}\ndata: {data}\n\n" if seq is not None else f"data: {data}\n\n"
+
+
+class StreamPublisher:
+    """Publica los eventos de un envío en orden; se puede usar desde varios hilos"""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def publish(self, *payloads: Dict):
+        # El lock cubre el commit: un lector nunca ve el evento n+1 sin el n
+        with self._lock:
+            rows = []
+            for payload in payloads:
+                self.seq += 1
+                rows.append({"run_id": self.run_id, "seq": self.seq, "payload": json.dumps(payload)})
+            self._write(rows)
+        with _published:
+            _published.notify_all()
+
+    def finish(self, status: str):
+        with self._lock:
+            self._write([], status=status)
+        with _published:
+            _published.notify_all()
+
+    def _write(self, rows: List[Dict], status: Optional[str] = None):
+        now = get_bogota_now_naive()
+        values = {"heartbeat_at": now}
+        if status:
+            values.update(status=status, finished_at=now, active_key=None)
+        db = SessionLocal()
+        try:
+            if rows:
+                db.execute(insert(models.SendStreamEvent), rows)
+            db.query(models.SendStreamRun).filter(
+                models.SendStreamRun.id == self.run_id
+            ).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def start_or_join_run(db: Session, channel: str, event_id: int, created_by: Optional[int],
+                      target: Callable, *args) -> Tuple[str, bool]:
+    """
+    Registra un envío y lo ejecuta en un hilo del worker, o se une al que ya
+    está en curso para el mismo evento y canal
+
+    Args:
+        target: target(publisher, *args) hace los envíos y publica el progreso
+
+    Returns:
+        Tuple[str, bool]: (run_id, True si se inició un envío nuevo)
+    """
+    _purge_old_runs(db)
+
+    active_key = f"{channel}:{event_id}"
+    error = None
+    for _ in range(2):
+        now = get_bogota_now_naive()
+        run_id = uuid.uuid4().hex
+        db.add(models.SendStreamRun(
+            id=run_id,
+            channel=channel,
+            event_id=event_id,
+            status="running",
+            active_key=active_key,
+            worker=_WORKER_ID,
+            created_by=created_by,
+            created_at=now,
+            heartbeat_at=now
+        ))
+        try:
+            db.commit()
+        except IntegrityError as e:
+            error = e
+            # Otra petición tiene el envío en curso: unirse, salvo que su worker se haya detenido
+            db.rollback()
+            active = db.query(models.SendStreamRun.id, models.SendStreamRun.heartbeat_at).filter(
+                models.SendStreamRun.active_key == active_key
+            ).first()
+            if active is None:
+                continue
+            if active.heartbeat_at and active.heartbeat_at >= now - SEND_STREAM_STALE_AFTER:
+                return active.id, False
+            _release_stale_run(db, active.id)
+            continue
+
+        threading.Thread(
+            target=_execute, args=(run_id, target, args), name=f"send-stream-{run_id[:8]}", daemon=True
+        ).start()
+        return run_id, True
+
+    raise error
+
+
+def _release_stale_run(db: Session, run_id: str):
+    """Da por fallido un envío cuyo worker dejó de publicar y libera su active_key"""
+    now = get_bogota_now_naive()
+    db.query(models.SendStreamRun).filter(
+        models.SendStreamRun.id == run_id,
+        models.SendStreamRun.heartbeat_at < now - SEND_STREAM_STALE_AFTER
+    ).update({"status": "failed", "finished_at": now, "active_key": None}, synchronize_session=False)
+    db.commit()
+
+
+def _execute(run_id: str, target: Callable, args: Tuple):
+    publisher = StreamPublisher(run_id)
+    try:
+        target(publisher, *args)
+        publisher.finish("completed")
+    except Exception as e:
+        print(f"[STREAM] Envío {run_id} falló: {e}")
+        try:
+            publisher.publish({'event': 'error', 'message': str(e)})
+        finally:
+            publisher.finish("failed")
+
+
+def _purge_old_runs(db: Session):
+    """Borra los envíos terminados hace más de SEND_STREAM_RETENTION_HOURS"""
+    cutoff = get_bogota_now_naive() - timedelta(hours=SEND_STREAM_RETENTION_HOURS)
+    old_runs = db.query(models.SendStreamRun.id).filter(
+        models.SendStreamRun.status != "running",
+        models.SendStreamRun.finished_at < cutoff
+    ).all()
+    if not old_runs:
+        return
+    old_ids = [run_id for run_id, in old_runs]
+    db.query(models.SendStreamEvent).filter(
+        models.SendStreamEvent.run_id.in_(old_ids)
+    ).delete(synchronize_session=False)
+    db.query(models.SendStreamRun).filter(
+        models.SendStreamRun.id.in_(old_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def follow_run(run_id: str, last_event_id: int = 0) -> Iterator[str]:
+    """
+    Eventos SSE de un envío desde last_event_id hasta que termina
+
+    Cerrar la conexión solo detiene este generador, no el envío.
+    """
+    after = last_event_id
+    last_write = time.monotonic()
+    while True:
+        db = SessionLocal()
+        try:
+            # El estado se lee antes que los eventos: si ya terminó, sus eventos ya están guardados
+            run = db.query(models.SendStreamRun.status, models.SendStreamRun.heartbeat_at).filter(
+                models.SendStreamRun.id == run_id
+            ).first()
+            events = db.query(models.SendStreamEvent.seq, models.SendStreamEvent.payload).filter(
+                models.SendStreamEvent.run_id == run_id,
+                models.SendStreamEvent.seq > after
+            ).order_by(models.SendStreamEvent.seq).limit(_READ_LIMIT).all()
+        finally:
+            db.close()
+
+        if run is None:
+            yield _sse({'event': 'error', 'message': 'Envío no encontrado'})
+            return
+
+        for seq, payload in events:
+            after = seq
+            yield _sse(payload, seq)
+        if events:
+            last_write = time.monotonic()
+            if len(events) == _READ_LIMIT:
+                continue
+
+        status, heartbeat_at = run
+        if status != "running":
+            return
+        if heartbeat_at and heartbeat_at < get_bogota_now_naive() - SEND_STREAM_STALE_AFTER:
+            yield _sse({'event': 'error', 'message': 'El envío se interrumpió (el servidor se reinició)'})
+            return
+
+        if time.monotonic() - last_write >= SEND_STREAM_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_write = time.monotonic()
+
+        with _published:
+            _published.wait(SEND_STREAM_POLL_SECONDS)
+
+
+def _load_event(db: Session, event_id: int):
+    """Evento, su organización y sus tickets con usuario, listos para usar fuera de la sesión"""
+    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    if not event:
+        return None, None, []
+
+    organization = None
+    if event.organization_id:
+        organization = db.query(models.Organization).filter(
+            models.Organization.id == event.organization_id
+        ).first()
+
+    tickets = db.query(models.Ticket).options(
+        joinedload(models.Ticket.user)
+    ).filter(
+        models.Ticket.event_id == event_id
+    ).all()
+    return event, organization, tickets
+
+
+# ============================================================
+# EMAIL
+# ============================================================
+
+def send_event_emails(publisher: StreamPublisher, event_id: int, base_url: str):
+    """Envía el ticket de cada asistente del evento por email"""
+    db = SessionLocal()
+    try:
+        event, organization, tickets = _load_event(db, event_id)
+    finally:
+        # Los objetos quedan cargados y desligados de la sesión
+        db.close()
+
+    if not event:
+        publisher.publish({'event': 'error', 'message': 'Evento no encontrado'})
+        return
+    if not tickets:
+        publisher.publish({'event': 'error', 'message': 'No se encontraron tickets para este evento'})
+        return
+
+    total = len(tickets)
+    publisher.publish({'event': 'start', 'run_id': publisher.run_id, 'total': total, 'event_name': event.name})
+
+    # De a EMAIL_BATCH_SIZE tickets: el transporte agrupa y paraleliza los envíos de cada tanda
+    sent_count = 0
+    skipped_count = 0
+    errors = []
+    positions = {ticket.id: idx + 1 for idx, ticket in enumerate(tickets)}
+
+    for start in range(0, total, EMAIL_BATCH_SIZE):
+        messages = []
+        users = {}
+        progress = []
+        for ticket in tickets[start:start + EMAIL_BATCH_SIZE]:
+            user = ticket.user
+            idx = positions[ticket.id]
+
+            # Verificar que el usuario tenga email
+            if not user.email:
+                skipped_count += 1
+                errors.append(f"{user.name}: Sin correo electrónico")
+                progress.append({'event': 'skip', 'index': idx, 'total': total, 'user': user.name, 'reason': 'Sin email'})
+                continue
+
+            try:
+                messages.append((ticket.id, email_service.build_ticket_email(
+                    to_email=user.email,
+                    user_name=user.name,
+                    event_name=event.name,
+                    event_date=event.event_date,
+                    event_location=event.location,
+                    ticket_code=ticket.ticket_code,
+                    ticket_url=f"{base_url}/ticket/{ticket.unique_url}",
+                    access_pin=ticket.access_pin,
+                    companions=ticket.companions,
+                    organization=organization,
+                    event=event
+                )))
+                users[ticket.id] = user
+            except Exception as e:
+                skipped_count += 1
+                errors.append(f"{user.name}: {str(e)}")
+                progress.append({'event': 'error', 'index': idx, 'total': total, 'user': user.name, 'reason': str(e)})
+                continue
+
+            progress.append({'event': 'sending', 'index': idx, 'total': total, 'user': user.name, 'email': user.email})
+
+        if progress:
+            publisher.publish(*progress)
+
+        # Resultado de cada ticket apenas termina su envío
+        for ticket_id, result in email_service.iter_send_batch(messages, idempotency_prefix=publisher.run_id):
+            user = users[ticket_id]
+            idx = positions[ticket_id]
+            if result["success"]:
+                sent_count += 1
+                publisher.publish({'event': 'success', 'index': idx, 'total': total, 'user': user.name, 'email': user.email})
+            else:
+                skipped_count += 1
+                errors.append(f"{user.name}: Error al enviar email")
+                print(f"[ERROR] Ticket {ticket_id} a {user.email}: {result['error']}")
+                publisher.publish({'event': 'error', 'index': idx, 'total': total, 'user': user.name, 'reason': 'Error al enviar'})
+
+    publisher.publish({'event': 'complete', 'sent': sent_count, 'skipped': skipped_count, 'total': total, 'errors': errors})
+
+
+# ============================================================
+# WHATSAPP
+# ============================================================
+
+def send_event_whatsapp(publisher: StreamPublisher, event_id: int, base_url: str,
+                        use_template: bool, template_name: str,
+                        concurrency: int = SEND_STREAM_CONCURRENCY):
+    """Envía el ticket de cada asistente del evento por WhatsApp, varios a la vez"""
+    from whatsapp_client import get_whatsapp_client
+
+    db = SessionLocal()
+    try:
+        event, organization, tickets = _load_event(db, event_id)
+    finally:
+        db.close()
+
+    if not event:
+        publisher.publish({'event': 'error', 'message': 'Evento no encontrado'})
+        return
+    if not get_whatsapp_client().is_ready():
+        publisher.publish({'event': 'error', 'message': 'Servicio de WhatsApp no disponible'})
+        return
+    if not tickets:
+        publisher.publish({'event': 'error', 'message': 'No se encontraron tickets para este evento'})
+        return
+
+    total = len(tickets)
+    publisher.publish({'event': 'start', 'run_id': publisher.run_id, 'total': total, 'event_name': event.name})
+
+    sent_count = 0
+    skipped_count = 0
+    errors = []
+    event_date_formatted = event.event_date.strftime('%d/%m/%Y a las %H:%M')
+
+    # El ritmo lo controla whatsapp_rate_limiter, compartido por todos los hilos y workers
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        futures = {}
+        for idx, ticket in enumerate(tickets, start=1):
+            user = ticket.user
+            # Verificar que el usuario tenga teléfono
+            if not user.phone or not user.country_code:
+                skipped_count += 1
+                errors.append(f"{user.name}: Sin número de teléfono")
+                publisher.publish({'event': 'skip', 'index': idx, 'total': total, 'user': user.name, 'reason': 'Sin teléfono'})
+                continue
+
+            future = pool.submit(
+                _send_ticket_whatsapp, publisher, idx, total, ticket, user, event, organization,
+                event_date_formatted, base_url, use_template, template_name
+            )
+            futures[future] = (idx, user)
+
+        for future in as_completed(futures):
+            idx, user = futures[future]
+            try:
+                success, error_reason = future.result()
+            except Exception as e:
+                success, error_reason = False, str(e)
+
+            if success:
+                sent_count += 1
+                publisher.publish({'event': 'success', 'index': idx, 'total': total, 'user': user.name, 'phone': f'{user.country_code}{user.phone}', 'method': 'template' if use_template else 'free_text'})
+            else:
+                skipped_count += 1
+                errors.append(f"{user.name}: {error_reason}")
+                publisher.publish({'event': 'error', 'index': idx, 'total': total, 'user': user.name, 'reason': error_reason})
+
+    publisher.publish({'event': 'complete', 'sent_count': sent_count, 'skipped_count': skipped_count, 'total_tickets': total, 'errors': errors})
+
+
+def _send_ticket_whatsapp(publisher: StreamPublisher, idx: int, total: int, ticket: models.Ticket,
+                          user: models.User, event: models.Event, organization: Optional[models.Organization],
+                          event_date_formatted: str, base_url: str, use_template: bool,
+                          template_name: str) -> Tuple[bool, Optional[str]]:
+    """Un envío de WhatsApp (corre en el pool); retorna (éxito, motivo del error)"""
+    from whatsapp_client import send_ticket_whatsapp, send_ticket_with_template
+
+    publisher.publish({'event': 'sending', 'index': idx, 'total': total, 'user': user.name, 'phone': f'{user.country_code}{user.phone}'})
+
+    ticket_url = f"{base_url}/ticket/{ticket.unique_url}"
+
+    if not use_template:
+        # Mensaje libre
+        success = send_ticket_whatsapp(
+            phone=user.phone,
+            country_code=user.country_code,
+            user_name=user.name,
+            event_name=event.name,
+            event_location=event.location,
+            event_date=event_date_formatted,
+            ticket_code=ticket.ticket_code,
+            ticket_url=ticket_url,
+            access_pin=ticket.access_pin,
+            companions=ticket.companions or 0,
+            organization=organization,
+            event=event
+        )
+        return success, "Error al enviar mensaje"
+
+    # Template de Meta: para tickets_event el QR es OBLIGATORIO (header IMAGE)
+    qr_base64 = None
+    needs_qr = template_name == "tickets_event"
+    if needs_qr or event.send_qr_with_whatsapp:
+        try:
+            from ticket_service import ticket_service
+            qr_base64 = ticket_service.generate_qr_base64(
+                ticket_code=ticket.ticket_code,
+                user_name=user.name,
+                event_name=event.name,
+                event_date=event_date_formatted
+            )
+        except Exception as qr_err:
+            print(f"[WARNING] No se pudo generar QR para template: {qr_err}")
+            if needs_qr:
+                # Si el template requiere QR y no se pudo generar, es un error
+                return False, f"El template '{template_name}' requiere QR: {qr_err}"
+
+    result = send_ticket_with_template(
+        phone=user.phone,
+        country_code=user.country_code,
+        user_name=user.name,
+        event_name=event.name,
+        event_location=event.location,
+        event_date=event_date_formatted,
+        ticket_code=ticket.ticket_code,
+        ticket_url=ticket_url,
+        access_pin=ticket.access_pin,
+        companions=ticket.companions or 0,
+        template_name=template_name,
+        qr_image_base64=qr_base64
+    )
+    return result.get("success", False), result.get("error", "Error al enviar template")
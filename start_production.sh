@@ -35,5 +35,11 @@ echo "✅ Iniciando aplicación..."
 echo "🌐 La aplicación estará disponible en http://0.0.0.0:8000"
 echo "📝 Presiona Ctrl+C para detener"
 
+# Iniciar worker de envíos masivos en segundo plano
+echo "📨 Iniciando worker de envíos masivos (logs/job_worker.log)..."
+uv run python job_worker.py >> logs/job_worker.log 2>&1 &
+JOB_WORKER_PID=$!
+trap "kill $JOB_WORKER_PID 2>/dev/null" EXIT
+
 # Ejecutar con 4 workers para mejor rendimiento
 uv run uvicorn main:app --host 0.0.0.0 --port 8000 --workers 4 --log-level info
@@ -17,9 +17,9 @@ sq.row_factory = sqlite3.Row
 my = pymysql.connect(**MYSQL_CONFIG, autocommit=False)
 mycur = my.cursor()
 
-# Get MySQL columns
+# Get MySQL columns (generated columns such as birthday_month cannot be written)
 mycur.execute("DESCRIBE users")
-mysql_cols = {r[0] for r in mycur.fetchall()}
+mysql_cols = {r[0] for r in mycur.fetchall() if "GENERATED" not in (r[5] or "").upper()}
 
 # Get all SQLite users
 rows = sq.cursor().execute("SELECT * FROM users").fetchall()
@@ -1,10 +1,153 @@
 """
 Servicio de templates personalizables para organizaciones
+
+Los templates usan la sintaxis de str.format: {user_name} es una variable y
+las llaves literales (por ejemplo las del CSS) se escriben dobles, {{ y }}.
+
+Cada template se compila una sola vez (CompiledTemplate: trozos de texto
+fijos y huecos para las variables) y se guarda en memoria por dueño
+(evento, organización o el predeterminado). La versión de la entrada es el
+propio texto del template: al editarlo, el siguiente envío lo recompila.
+Renderizar es rellenar los huecos y unir los trozos, sin volver a
+analizar varios KB de HTML por cada ticket.
+
+Los templates se validan al guardarlos (validate_template, desde los
+schemas de eventos y organizaciones). Si uno guardado antes de la
+validación tiene llaves sueltas o variables desconocidas, se dejan tal cual
+en el texto en lugar de fallar el envío.
 """
-from typing import Optional, Dict
+import re
+import string
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 import models
 
+# Variables disponibles en cada canal
+EMAIL_PLACEHOLDERS = (
+    "user_name", "event_name", "event_date", "event_location", "ticket_code",
+    "ticket_url", "access_pin", "companions", "companions_info", "qr_base64"
+)
+WHATSAPP_PLACEHOLDERS = (
+    "user_name", "event_name", "event_date", "event_location", "ticket_code",
+    "ticket_url", "access_pin", "companions", "companions_text"
+)
+TEMPLATE_PLACEHOLDERS = {"email": EMAIL_PLACEHOLDERS, "whatsapp": WHATSAPP_PLACEHOLDERS}
+
+# Máximo de templates compilados en memoria (uno por evento/organización y canal)
+TEMPLATE_CACHE_MAX_ENTRIES = 500
+
+# {{, }} o una variable {nombre}; cualquier otra llave es texto
+_TOKEN_RE = re.compile(r"\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class TemplateError(ValueError):
+    """Template con llaves sin escapar o variables que no existen"""
+
+
+class CompiledTemplate:
+    """Template analizado: trozos fijos y la posición de cada variable"""
+
+    __slots__ = ("parts", "slots")
+
+    def __init__(self, text: str, placeholders: Tuple[str, ...]):
+        self.parts: List[str] = []
+        self.slots: List[Tuple[int, str]] = []
+        literal: List[str] = []
+        last = 0
+        for match in _TOKEN_RE.finditer(text):
+            literal.append(text[last:match.start()])
+            last = match.end()
+            token, name = match.group(0), match.group(1)
+            if name is None:
+                literal.append(token[0])
+            elif name in placeholders:
+                self.parts.append("".join(literal))
+                literal = []
+                self.slots.append((len(self.parts), name))
+                self.parts.append("")
+            else:
+                literal.append(token)
+        literal.append(text[last:])
+        self.parts.append("".join(literal))
+
+    def render(self, values: Dict[str, str]) -> str:
+        parts = self.parts[:]
+        for index, name in self.slots:
+            parts[index] = values[name]
+        return "".join(parts)
+
+
+def validate_template(text: Optional[str], channel: str) -> Optional[str]:
+    """
+    Verifica un template antes de guardarlo
+
+    Args:
+        text: Template (None o vacío = usar el de la jerarquía)
+        channel: "email" o "whatsapp"
+
+    Returns:
+        str: El mismo template
+
+    Raises:
+        TemplateError: Llaves sin escapar, variables desconocidas o con formato
+    """
+    if not text:
+        return text
+    placeholders = TEMPLATE_PLACEHOLDERS[channel]
+    try:
+        fields = [
+            (name, spec, conversion)
+            for _, name, spec, conversion in string.Formatter().parse(text)
+            if name is not None
+        ]
+    except ValueError:
+        raise TemplateError(
+            "El template tiene una llave { o } suelta: las llaves literales "
+            "(por ejemplo las del CSS) se escriben dobles, {{ y }}"
+        )
+
+    unknown = sorted({name for name, _, _ in fields if name not in placeholders})
+    if unknown:
+        raise TemplateError(
+            f"Variables desconocidas en el template: {', '.join('{' + name + '}' for name in unknown)}. "
+            f"Disponibles: {', '.join('{' + name + '}' for name in placeholders)}. "
+            "Si son llaves literales (por ejemplo CSS), escríbelas dobles: {{ y }}"
+        )
+    formatted = sorted({name for name, spec, conversion in fields if spec or conversion})
+    if formatted:
+        raise TemplateError(
+            f"Las variables no admiten formato (:, !): {', '.join('{' + name + '}' for name in formatted)}"
+        )
+    return text
+
+
+_compiled: Dict[tuple, Tuple[str, CompiledTemplate]] = {}
+
+
+def compiled_template(channel: str, owner_type: str, owner_id: Optional[int], text: str) -> CompiledTemplate:
+    """Template compilado de un dueño; se recompila si su texto cambió"""
+    key = (channel, owner_type, owner_id)
+    entry = _compiled.get(key)
+    if entry is not None and entry[0] == text:
+        return entry[1]
+    template = CompiledTemplate(text, TEMPLATE_PLACEHOLDERS[channel])
+    if len(_compiled) >= TEMPLATE_CACHE_MAX_ENTRIES:
+        _compiled.clear()
+    _compiled[key] = (text, template)
+    return template
+
+
+def resolve_template(channel: str, organization: Optional[models.Organization],
+                     event: Optional[models.Event]) -> CompiledTemplate:
+    """Jerarquía de templates: Evento > Organización > Default"""
+    field = f"{channel}_template"
+    if event is not None and getattr(event, field):
+        return compiled_template(channel, "event", event.id, getattr(event, field))
+    if organization is not None and getattr(organization, field):
+        return compiled_template(channel, "organization", organization.id, getattr(organization, field))
+    default = TemplateService.DEFAULT_EMAIL_TEMPLATE if channel == "email" else TemplateService.DEFAULT_WHATSAPP_TEMPLATE
+    return compiled_template(channel, "default", None, default)
+
 
 class TemplateService:
     """Servicio para generar templates personalizados por organización"""
@@ -237,13 +380,7 @@ IEEE Tadeo Student Branch"""
         Returns:
             str: HTML del email renderizado
         """
-        # Jerarquía de templates: Evento > Organización > Default
-        if event and event.email_template:
-            template = event.email_template
-        elif organization and organization.email_template:
-            template = organization.email_template
-        else:
-            template = TemplateService.DEFAULT_EMAIL_TEMPLATE
+        template = resolve_template("email", organization, event)
 
         # Preparar información de acompañantes
         companions_info = ""
@@ -251,18 +388,18 @@ IEEE Tadeo Student Branch"""
             companions_info = f'<div class="info-item"><strong>Acompañantes:</strong> {companions} persona{"s" if companions != 1 else ""}</div>'
 
         # Reemplazar variables en el template
-        html = template.format(
-            user_name=user_name,
-            event_name=event_name,
-            event_date=event_date,
-            event_location=event_location,
-            ticket_code=ticket_code,
-            ticket_url=ticket_url,
-            access_pin=access_pin,
-            companions=companions,
-            companions_info=companions_info,
-            qr_base64=qr_base64
-        )
+        html = template.render({
+            "user_name": str(user_name),
+            "event_name": str(event_name),
+            "event_date": str(event_date),
+            "event_location": str(event_location),
+            "ticket_code": str(ticket_code),
+            "ticket_url": str(ticket_url),
+            "access_pin": str(access_pin),
+            "companions": str(companions),
+            "companions_info": companions_info,
+            "qr_base64": str(qr_base64)
+        })
 
         return html
 
@@ -297,13 +434,7 @@ IEEE Tadeo Student Branch"""
         Returns:
             str: Mensaje de WhatsApp renderizado
         """
-        # Jerarquía de templates: Evento > Organización > Default
-        if event and event.whatsapp_template:
-            template = event.whatsapp_template
-        elif organization and organization.whatsapp_template:
-            template = organization.whatsapp_template
-        else:
-            template = TemplateService.DEFAULT_WHATSAPP_TEMPLATE
+        template = resolve_template("whatsapp", organization, event)
 
         # Preparar información de acompañantes
         companions_text = ""
@@ -311,17 +442,17 @@ IEEE Tadeo Student Branch"""
             companions_text = f"\n👥 *Acompañantes:* {companions} persona{'s' if companions != 1 else ''}"
 
         # Reemplazar variables en el template
-        message = template.format(
-            user_name=user_name,
-            event_name=event_name,
-            event_date=event_date,
-            event_location=event_location,
-            ticket_code=ticket_code,
-            ticket_url=ticket_url,
-            access_pin=access_pin,
-            companions=companions,
-            companions_text=companions_text
-        )
+        message = template.render({
+            "user_name": str(user_name),
+            "event_name": str(event_name),
+            "event_date": str(event_date),
+            "event_location": str(event_location),
+            "ticket_code": str(ticket_code),
+            "ticket_url": str(ticket_url),
+            "access_pin": str(access_pin),
+            "companions": str(companions),
+            "companions_text": companions_text
+        })
 
         return message
 
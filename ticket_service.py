@@ -1,4 +1,3 @@
-import qrcode
 import hashlib
 import secrets
 import json
@@ -6,9 +5,16 @@ import string
 from pathlib import Path
 from datetime import datetime
 from cryptography.fernet import Fernet
-from io import BytesIO
 import base64
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 from timezone_utils import get_bogota_now_naive
+from qr_service import qr_service, render_qr_file
+
+# Procesos para generar QRs en lote y tamaño mínimo del lote para usarlos
+QR_PROCESS_WORKERS = int(os.getenv("QR_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+QR_PROCESS_MIN_BATCH = int(os.getenv("QR_PROCESS_MIN_BATCH", "50"))
 
 
 class TicketService:
@@ -65,59 +71,38 @@ class TicketService:
         """Genera la imagen del código QR y retorna la ruta del archivo"""
         # Usar solo el código del ticket (más simple y fácil de escanear)
         # El QR contendrá solo el ticket_code hash SHA-256 (64 caracteres)
-        qr_data = ticket_code
-
-        # Generar QR
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
+        return qr_service.get_path(ticket_code)
 
-        # Crear imagen
-        img = qr.make_image(fill_color="black", back_color="white")
+    def qr_path_for(self, ticket_code: str) -> str:
+        """Ruta donde queda (o quedará) el QR de un ticket, sin generarlo"""
+        return qr_service.path_for(ticket_code)
 
-        # Guardar imagen
-        filename = f"{ticket_code}.png"
-        filepath = self.qr_directory / filename
-        img.save(filepath)
+    def generate_qr_codes_bulk(self, ticket_codes: List[str]) -> int:
+        """
+        Genera los QRs de muchos tickets. Los lotes grandes se reparten en un
+        ProcessPool para no serializar la codificación PNG en un solo núcleo.
 
-        return str(filepath)
+        Returns:
+            Cantidad de QRs generados
+        """
+        pending = [code for code in ticket_codes if not os.path.exists(self.qr_path_for(code))]
+        if not pending:
+            return 0
 
-    def generate_qr_base64(self, ticket_code: str, user_name: str, event_name: str, event_date: str) -> str:
-        """Genera el QR como base64 para mostrar en web"""
-        # Usar solo el código del ticket (más simple y fácil de escanear)
-        qr_data = ticket_code
-
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        # Convertir a RGB (WhatsApp requiere RGB/RGBA 8-bit, no imagen 1-bit)
-        if hasattr(img, 'convert'):
-            img = img.convert('RGB')
+        if len(pending) < QR_PROCESS_MIN_BATCH or QR_PROCESS_WORKERS <= 1:
+            for code in pending:
+                qr_service.get_path(code)
         else:
-            # Para versiones antiguas de qrcode, obtener la imagen PIL
-            from PIL import Image
-            if hasattr(img, 'get_image'):
-                img = img.get_image().convert('RGB')
+            paths = [self.qr_path_for(code) for code in pending]
+            with ProcessPoolExecutor(max_workers=QR_PROCESS_WORKERS) as pool:
+                list(pool.map(render_qr_file, pending, paths, chunksize=25))
 
-        # Convertir a base64
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        return len(pending)
 
-        return f"data:image/png;base64,{img_str}"
+    def generate_qr_base64(self, ticket_code: str, user_name: str, event_name: str, event_date: str) -> str:
+        """Genera el QR como base64 para mostrar en web"""
+        # Misma imagen en caché que usan los archivos (RGB 8-bit, apta para WhatsApp)
+        return qr_service.get_base64(ticket_code)
 
     def save_qr_as_file(self, ticket_code: str, user_name: str, event_name: str, event_date: str) -> str:
         """
@@ -126,33 +111,15 @@ class TicketService:
         Returns:
             str: URL pública del QR guardado
         """
-        import os
-        from pathlib import Path
-
-        # Usar solo el código del ticket
-        qr_data = ticket_code
-
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        # Crear directorio si no existe
+        # Copiar el PNG ya renderizado a static/ en lugar de dibujarlo otra vez
         qr_dir = Path("static/qr_codes")
         qr_dir.mkdir(parents=True, exist_ok=True)
 
         # Nombre del archivo basado en ticket_code (limpio para filesystem)
         safe_filename = ticket_code.replace("/", "-").replace("\\", "-")
         file_path = qr_dir / f"{safe_filename}.png"
-
-        # Guardar imagen
-        img.save(str(file_path))
+        if not file_path.exists():
+            file_path.write_bytes(qr_service.get_png(ticket_code))
 
         # Obtener BASE_URL del .env
         base_url = os.getenv("BASE_URL", "http://127.0.0.1:8000")
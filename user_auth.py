@@ -43,7 +43,7 @@ def create_reset_token() -> str:
     """Genera un token aleatorio para recuperación de contraseña"""
     return secrets.token_urlsafe(32)
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> models.User:
@@ -0,0 +1,243 @@
+"""
+Directorio de usuarios para /admin/users
+
+Devuelve los usuarios por tramos con paginación por llave (keyset): cada
+respuesta trae un cursor con el último valor ordenado y su id, y el siguiente
+tramo continúa desde ahí con un WHERE sobre el índice en lugar de un OFFSET.
+Así el costo y el tamaño de cada respuesta no dependen del número de miembros.
+
+Filtros: universidad, etiqueta, membresía IEEE, ventana de cumpleaños y texto
+(el texto usa el índice de user_search_service).
+Las etiquetas, la universidad y el conteo de tickets se cargan solo para los
+usuarios del tramo (una consulta cada uno).
+"""
+import base64
+import json
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+import models
+from birthday_utils import birthday_window_filter, get_birthday_status
+from user_search_service import search_filter
+
+# Columnas por las que se puede ordenar (todas con índice; el id desempata)
+DIRECTORY_SORTS = {
+    "id": models.User.id,
+    "name": models.User.name,
+    "email": models.User.email,
+}
+
+# Ventanas de cumpleaños: días hacia adelante desde hoy (igual que get_birthday_status)
+BIRTHDAY_WINDOWS = {
+    "today": 0,
+    "week": 7,
+    "month": 30,
+}
+
+DIRECTORY_MAX_LIMIT = 200
+
+
+def encode_cursor(value, user_id: int) -> str:
+    """Cursor opaco con el último valor ordenado y su id"""
+    raw = json.dumps([value, user_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Inverso de encode_cursor. Lanza ValueError si el cursor no es válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, user_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return value, int(user_id)
+    except Exception:
+        raise ValueError("Cursor no válido")
+
+
+def _birthday_filter(window: str):
+    if window == "has":
+        return models.User.birthday.isnot(None)
+    if window == "missing":
+        return models.User.birthday.is_(None)
+    if window in BIRTHDAY_WINDOWS:
+        return birthday_window_filter(BIRTHDAY_WINDOWS[window])
+    raise ValueError(f"Filtro de cumpleaños no válido: {window}")
+
+
+def _search_filter(search: str):
+    conditions = []
+    tokens_match = search_filter(search)
+    if tokens_match is not None:
+        conditions.append(tokens_match)
+    if search.isdigit():
+        conditions.append(models.User.id == int(search))
+    return or_(*conditions) if conditions else models.User.id.is_(None)
+
+
+def build_directory_filters(
+    university_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    is_ieee_member: Optional[bool] = None,
+    birthday: Optional[str] = None,
+    q: Optional[str] = None
+) -> List:
+    """Condiciones WHERE sobre users para los filtros del directorio"""
+    filters = []
+    if university_id:
+        filters.append(models.User.university_id == university_id)
+    if tag_id:
+        filters.append(models.User.id.in_(
+            select(models.user_tags.c.user_id).where(models.user_tags.c.tag_id == tag_id)
+        ))
+    if is_ieee_member is True:
+        filters.append(models.User.is_ieee_member == True)
+    elif is_ieee_member is False:
+        filters.append(or_(models.User.is_ieee_member == False, models.User.is_ieee_member.is_(None)))
+    if birthday and birthday != "all":
+        filters.append(_birthday_filter(birthday))
+    search = (q or "").strip()
+    if search:
+        filters.append(_search_filter(search))
+    return filters
+
+
+def get_user_directory(
+    db: Session,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    sort: str = "id",
+    order: str = "desc",
+    **filter_args
+) -> Dict:
+    """
+    Un tramo del directorio.
+
+    Returns:
+        Dict con users, next_cursor (None al final) y total (solo en el primer
+        tramo, para no volver a contar en cada "cargar más")
+    """
+    if sort not in DIRECTORY_SORTS:
+        raise ValueError(f"Orden no válido: {sort}")
+    limit = min(max(limit, 1), DIRECTORY_MAX_LIMIT)
+    descending = order != "asc"
+    sort_column = DIRECTORY_SORTS[sort]
+
+    filters = build_directory_filters(**filter_args)
+
+    total = None
+    if cursor is None:
+        total = db.query(func.count(models.User.id)).filter(*filters).scalar() or 0
+
+    query = db.query(
+        models.User.id,
+        models.User.name,
+        models.User.nick,
+        models.User.email,
+        models.User.identification,
+        models.User.country_code,
+        models.User.phone,
+        models.User.is_ieee_member,
+        models.User.birthday,
+        models.User.photo_path,
+        models.User.branch_role,
+        models.University.id,
+        models.University.name,
+        models.University.short_name
+    ).outerjoin(
+        models.University, models.User.university_id == models.University.id
+    ).filter(*filters)
+
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        if sort == "id":
+            query = query.filter(models.User.id < last_id if descending else models.User.id > last_id)
+        elif descending:
+            query = query.filter(or_(
+                sort_column < last_value,
+                and_(sort_column == last_value, models.User.id < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > last_value,
+                and_(sort_column == last_value, models.User.id > last_id)
+            ))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), models.User.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), models.User.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    user_ids = [row[0] for row in rows]
+    ticket_counts = _ticket_counts(db, user_ids)
+    tags_by_user = _tags_by_user(db, user_ids)
+
+    users = []
+    for (user_id, name, nick, email, identification, country_code, phone, is_ieee_member,
+         birthday, photo_path, branch_role, university_id, university_name, university_short) in rows:
+        users.append({
+            "id": user_id,
+            "name": name,
+            "nick": nick,
+            "email": email,
+            "identification": identification,
+            "country_code": country_code,
+            "phone": phone,
+            "is_ieee_member": bool(is_ieee_member),
+            "birthday": birthday.isoformat() if birthday else None,
+            "birthday_status": get_birthday_status(birthday),
+            "photo_path": photo_path,
+            "branch_role": branch_role,
+            "university": {
+                "id": university_id,
+                "name": university_name,
+                "short_name": university_short
+            } if university_id else None,
+            "tags": tags_by_user.get(user_id, []),
+            "ticket_count": ticket_counts.get(user_id, 0)
+        })
+
+    next_cursor = None
+    if has_more and users:
+        last = users[-1]
+        next_cursor = encode_cursor(last[sort] if sort != "id" else last["id"], last["id"])
+
+    return {"users": users, "next_cursor": next_cursor, "total": total}
+
+
+def _ticket_counts(db: Session, user_ids: List[int]) -> Dict[int, int]:
+    if not user_ids:
+        return {}
+    return dict(db.query(
+        models.Ticket.user_id, func.count(models.Ticket.id)
+    ).filter(models.Ticket.user_id.in_(user_ids)).group_by(models.Ticket.user_id).all())
+
+
+def _tags_by_user(db: Session, user_ids: List[int]) -> Dict[int, List[Dict]]:
+    if not user_ids:
+        return {}
+    rows = db.query(
+        models.user_tags.c.user_id,
+        models.Tag.id,
+        models.Tag.name,
+        models.Tag.color,
+        models.Tag.description
+    ).join(
+        models.Tag, models.Tag.id == models.user_tags.c.tag_id
+    ).filter(
+        models.user_tags.c.user_id.in_(user_ids)
+    ).order_by(models.Tag.name).all()
+
+    tags_by_user: Dict[int, List[Dict]] = {}
+    for user_id, tag_id, name, color, description in rows:
+        tags_by_user.setdefault(user_id, []).append({
+            "id": tag_id,
+            "name": name,
+            "color": color,
+            "description": description
+        })
+    return tags_by_user
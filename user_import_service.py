@@ -0,0 +1,221 @@
+"""
+Importación de usuarios desde CSV por lotes
+
+El archivo se lee fila a fila (sin cargarlo completo en memoria) y se procesa
+en lotes: por cada lote se consulta de una vez qué emails ya existen, se
+insertan los usuarios nuevos con un solo INSERT, se agregan las etiquetas con
+un INSERT masivo en user_tags y se confirma. Un error en un lote solo descarta
+ese lote; los anteriores ya quedaron guardados.
+"""
+import codecs
+import csv
+import os
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+import models
+from public_page_cache import mark_public_pages_changed
+from timezone_utils import get_bogota_now_naive
+from user_search_service import index_user_rows
+
+# Filas por lote (una transacción por lote)
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", "500"))
+
+# Máximo de errores que se devuelven en la respuesta
+USER_IMPORT_MAX_ERRORS = 50
+
+REQUIRED_FIELDS = ('name', 'email', 'phone')
+TRUE_VALUES = ('true', '1', 'yes', 'sí', 'si')
+
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[Dict[str, str]]:
+    """Lee el CSV subido de forma incremental (acepta UTF-8 con o sin BOM)"""
+    reader = codecs.getreader('utf-8-sig')(stream)
+    yield from csv.DictReader(reader)
+
+
+def _clean(row: Dict, field: str) -> str:
+    return (row.get(field) or '').strip()
+
+
+class UserCSVImporter:
+    """Importa usuarios de un CSV y les asigna una etiqueta, por lotes"""
+
+    def __init__(self, db: Session, tag: models.Tag, dry_run: bool = False, batch_size: int = USER_IMPORT_BATCH_SIZE):
+        self.db = db
+        self.tag = tag
+        self.dry_run = dry_run
+        self.batch_size = max(1, batch_size)
+        self.stats = {
+            'created': 0,
+            'duplicates': 0,
+            'tag_added': 0,
+            'tag_already_exists': 0,
+            'errors': 0,
+            'total_processed': 0,
+            'batches': 0
+        }
+        self.errors: List[str] = []
+        self._seen_emails = set()
+
+        # Mapa nombre -> id de universidades, cargado una sola vez
+        self.universities = {
+            name: university_id
+            for university_id, name in db.query(models.University.id, models.University.name).all()
+        }
+
+    def run(self, rows: Iterator[Dict[str, str]]) -> Iterator[Dict]:
+        """
+        Procesa las filas y produce un resumen de progreso después de cada lote.
+        Consumir el iterador completo para terminar la importación.
+        """
+        batch = []
+        try:
+            for line, row in enumerate(rows, start=1):
+                batch.append((line, row))
+                if len(batch) >= self.batch_size:
+                    self._process_batch(batch)
+                    batch = []
+                    yield self.progress()
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Los lotes anteriores ya quedaron guardados; se procesa lo leído hasta aquí
+            self._add_error(f"Error al leer el archivo CSV: {str(e)}")
+
+        if batch:
+            self._process_batch(batch)
+            yield self.progress()
+
+    def import_all(self, rows: Iterator[Dict[str, str]]) -> Dict:
+        """Procesa todas las filas y retorna las estadísticas finales"""
+        for _ in self.run(rows):
+            pass
+        return self.stats
+
+    def progress(self) -> Dict:
+        return {
+            'processed': self.stats['total_processed'],
+            'batches': self.stats['batches'],
+            'created': self.stats['created'],
+            'duplicates': self.stats['duplicates'],
+            'errors': self.stats['errors']
+        }
+
+    def _add_error(self, message: str):
+        self.stats['errors'] += 1
+        if len(self.errors) < USER_IMPORT_MAX_ERRORS:
+            self.errors.append(message)
+
+    def _parse_row(self, line: int, row: Dict[str, str]) -> Optional[Dict]:
+        """Valida una fila y la convierte en valores para models.User (None si es inválida)"""
+        values = {field: _clean(row, field) for field in REQUIRED_FIELDS}
+        values['email'] = values['email'].lower()
+
+        missing = [field for field in REQUIRED_FIELDS if not values[field]]
+        if missing:
+            self._add_error(f"Fila {line}: Campos obligatorios vacíos: {', '.join(missing)}")
+            return None
+
+        university_name = _clean(row, 'university_name')
+        university_id = None
+        if university_name:
+            university_id = self.universities.get(university_name)
+
+        values.update({
+            'country_code': _clean(row, 'country_code') or '+57',
+            'identification': _clean(row, 'identification') or None,
+            'university_id': university_id,
+            'is_ieee_member': _clean(row, 'is_ieee_member').lower() in TRUE_VALUES,
+            'ieee_member_id': _clean(row, 'ieee_member_id') or None
+        })
+        return values
+
+    def _users_by_email(self, emails: List[str]) -> Dict[str, int]:
+        """
+        IDs de los usuarios con esos emails, indexados por el email en minúsculas.
+        El índice único de MySQL no distingue mayúsculas: 'Juan@X.com' ya existe
+        para la fila 'juan@x.com' del CSV y no debe volver a insertarse.
+        """
+        column = models.User.email
+        if self.db.get_bind().dialect.name != 'mysql':
+            # Otros motores comparan distinguiendo mayúsculas
+            column = func.lower(column)
+        rows = self.db.execute(select(models.User.email, models.User.id).where(column.in_(emails))).all()
+        return {email.lower(): user_id for email, user_id in rows}
+
+    def _process_batch(self, batch: List):
+        self.stats['batches'] += 1
+        self.stats['total_processed'] += len(batch)
+
+        # 1. Validar y descartar emails repetidos dentro del mismo archivo
+        parsed = []
+        for line, row in batch:
+            values = self._parse_row(line, row)
+            if values is None:
+                continue
+            if values['email'] in self._seen_emails:
+                self.stats['duplicates'] += 1
+                self.stats['tag_already_exists'] += 1
+                continue
+            self._seen_emails.add(values['email'])
+            parsed.append(values)
+
+        if not parsed:
+            return
+
+        try:
+            # 2. Usuarios existentes del lote en una sola consulta
+            existing = self._users_by_email([values['email'] for values in parsed])
+
+            new_rows = [values for values in parsed if values['email'] not in existing]
+            if new_rows and not self.dry_run:
+                now = get_bogota_now_naive()
+                self.db.execute(insert(models.User), [dict(values, created_at=now) for values in new_rows])
+
+            # 3. Etiquetas: solo los existentes pueden tenerla ya
+            tagged = set()
+            if existing:
+                tagged = set(self.db.execute(
+                    select(models.user_tags.c.user_id).where(
+                        models.user_tags.c.tag_id == self.tag.id,
+                        models.user_tags.c.user_id.in_(list(existing.values()))
+                    )
+                ).scalars())
+
+            if not self.dry_run:
+                user_ids = dict(existing)
+                if new_rows:
+                    # MySQL no soporta RETURNING: se leen los IDs recién creados
+                    user_ids.update(self._users_by_email([values['email'] for values in new_rows]))
+
+                # Los usuarios insertados sin el ORM se indexan para la búsqueda aquí
+                index_user_rows(self.db, [
+                    (user_ids[values['email']], values) for values in new_rows
+                ])
+
+                links = [
+                    {'user_id': user_id, 'tag_id': self.tag.id, 'created_at': get_bogota_now_naive()}
+                    for user_id in user_ids.values() if user_id not in tagged
+                ]
+                if links:
+                    self.db.execute(insert(models.user_tags), links)
+                # Inserciones sin el ORM: invalidar a mano las páginas públicas
+                mark_public_pages_changed(self.db)
+                self.db.commit()
+
+        except Exception as e:
+            self.db.rollback()
+            first_line, last_line = batch[0][0], batch[-1][0]
+            self._add_error(f"Filas {first_line}-{last_line}: lote descartado: {str(e)}")
+            # El resto del lote cuenta como error (ya se contó uno arriba)
+            self.stats['errors'] += len(parsed) - 1
+            for values in parsed:
+                self._seen_emails.discard(values['email'])
+            return
+
+        existing_tagged = sum(1 for user_id in existing.values() if user_id in tagged)
+        self.stats['created'] += len(new_rows)
+        self.stats['duplicates'] += len(existing)
+        self.stats['tag_already_exists'] += existing_tagged
+        self.stats['tag_added'] += len(existing) - existing_tagged
@@ -25,6 +25,7 @@ from user_auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from email_service import email_service
+from birthday_utils import get_birthday_calendar
 from auth import create_access_token as create_admin_token
 
 # Importar WhatsApp client si está disponible
@@ -153,7 +154,7 @@ def generate_otp_code() -> str:
     return ''.join(random.choices(string.digits, k=6))
 
 
-async def send_otp_email(email: str, code: str, user_name: str) -> bool:
+def send_otp_email(email: str, code: str, user_name: str) -> bool:
     """Envía el código OTP por email"""
     try:
         print(f"[OTP] Intentando enviar código OTP a {email}...")
@@ -201,7 +202,7 @@ async def send_otp_email(email: str, code: str, user_name: str) -> bool:
         return False
 
 
-async def send_otp_whatsapp(phone: str, code: str, user_name: str) -> bool:
+def send_otp_whatsapp(phone: str, code: str, user_name: str) -> bool:
     """Envía el código OTP por WhatsApp"""
     if not WHATSAPP_AVAILABLE or not whatsapp_api:
         return False
@@ -224,25 +225,25 @@ async def send_otp_whatsapp(phone: str, code: str, user_name: str) -> bool:
 
 # ========== PÁGINAS HTML ==========
 @router.get("/login", response_class=HTMLResponse)
-async def login_page(request: Request):
+def login_page(request: Request):
     """Página de login del portal de usuarios"""
     return templates.TemplateResponse("portal_login.html", {"request": request})
 
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def dashboard_page(request: Request):
+def dashboard_page(request: Request):
     """Página principal del portal de usuarios (requiere autenticación en el frontend)"""
     return templates.TemplateResponse("portal_dashboard.html", {"request": request})
 
 
 @router.get("/reset-password", response_class=HTMLResponse)
-async def reset_password_page(request: Request):
+def reset_password_page(request: Request):
     """Página para restablecer contraseña con token"""
     return templates.TemplateResponse("portal_reset_password.html", {"request": request})
 
 
 @router.get("/ticket/{unique_url}", response_class=HTMLResponse)
-async def public_ticket_page(request: Request, unique_url: str):
+def public_ticket_page(request: Request, unique_url: str):
     """Página pública para ver un ticket (no requiere autenticación)"""
     return templates.TemplateResponse("public_ticket.html", {
         "request": request,
@@ -252,7 +253,7 @@ async def public_ticket_page(request: Request, unique_url: str):
 
 # ========== ENDPOINTS DE AUTENTICACIÓN OTP ==========
 @router.post("/auth/otp/request")
-async def request_otp(
+def request_otp(
     otp_request: OTPRequest,
     db: Session = Depends(get_db)
 ):
@@ -328,13 +329,13 @@ async def request_otp(
         elif primary_type == 'email_ieee' and user.email_ieee:
             email_to_send = user.email_ieee
 
-        sent = await send_otp_email(email_to_send, code, user.name)
+        sent = send_otp_email(email_to_send, code, user.name)
     elif otp_request.method == "whatsapp":
         if WHATSAPP_AVAILABLE:
             phone_to_send = user.phone
             if user.country_code and not user.phone.startswith("+"):
                 phone_to_send = user.country_code + user.phone
-            sent = await send_otp_whatsapp(phone_to_send, code, user.name)
+            sent = send_otp_whatsapp(phone_to_send, code, user.name)
         else:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -358,7 +359,7 @@ async def request_otp(
 
 
 @router.post("/auth/otp/verify")
-async def verify_otp(
+def verify_otp(
     otp_verify: OTPVerify,
     db: Session = Depends(get_db)
 ):
@@ -428,7 +429,7 @@ async def verify_otp(
 
 
 @router.get("/auth/otp/methods")
-async def get_otp_methods(
+def get_otp_methods(
     email: Optional[str] = None,
     phone: Optional[str] = None,
     db: Session = Depends(get_db)
@@ -486,7 +487,7 @@ async def get_otp_methods(
 
 # ========== ENDPOINTS DE AUTENTICACIÓN ==========
 @router.post("/auth/login")
-async def user_login(
+def user_login(
     login_data: UserLoginRequest,
     db: Session = Depends(get_db)
 ):
@@ -533,7 +534,7 @@ async def user_login(
 
 
 @router.post("/auth/request-password-reset")
-async def request_password_reset(
+def request_password_reset(
     request_data: UserPasswordResetRequest,
     db: Session = Depends(get_db)
 ):
@@ -586,7 +587,7 @@ async def request_password_reset(
 
 
 @router.post("/auth/reset-password")
-async def reset_password(
+def reset_password(
     reset_data: UserPasswordReset,
     db: Session = Depends(get_db)
 ):
@@ -619,7 +620,7 @@ async def reset_password(
 
 
 @router.post("/auth/change-password")
-async def change_password(
+def change_password(
     password_data: UserPasswordChange,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -666,7 +667,7 @@ async def change_password(
 
 # ========== ENDPOINTS DE CATÁLOGOS ==========
 @router.get("/catalogs/academic-programs")
-async def get_academic_programs(db: Session = Depends(get_db)):
+def get_academic_programs(db: Session = Depends(get_db)):
     """Obtiene los programas académicos disponibles"""
     programs = db.query(models.AcademicProgram).filter(
         models.AcademicProgram.is_active == True
@@ -675,7 +676,7 @@ async def get_academic_programs(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/semester-ranges")
-async def get_semester_ranges(db: Session = Depends(get_db)):
+def get_semester_ranges(db: Session = Depends(get_db)):
     """Obtiene los rangos de semestre disponibles"""
     ranges = db.query(models.SemesterRange).filter(
         models.SemesterRange.is_active == True
@@ -684,7 +685,7 @@ async def get_semester_ranges(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/english-levels")
-async def get_english_levels(db: Session = Depends(get_db)):
+def get_english_levels(db: Session = Depends(get_db)):
     """Obtiene los niveles de inglés disponibles"""
     levels = db.query(models.EnglishLevel).filter(
         models.EnglishLevel.is_active == True
@@ -693,7 +694,7 @@ async def get_english_levels(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/ieee-membership-statuses")
-async def get_ieee_membership_statuses(db: Session = Depends(get_db)):
+def get_ieee_membership_statuses(db: Session = Depends(get_db)):
     """Obtiene los estados de membresía IEEE disponibles"""
     statuses = db.query(models.IEEEMembershipStatus).filter(
         models.IEEEMembershipStatus.is_active == True
@@ -702,7 +703,7 @@ async def get_ieee_membership_statuses(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/ieee-societies")
-async def get_ieee_societies(db: Session = Depends(get_db)):
+def get_ieee_societies(db: Session = Depends(get_db)):
     """Obtiene las sociedades IEEE disponibles"""
     societies = db.query(models.IEEESociety).filter(
         models.IEEESociety.is_active == True
@@ -711,7 +712,7 @@ async def get_ieee_societies(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/interest-areas")
-async def get_interest_areas(db: Session = Depends(get_db)):
+def get_interest_areas(db: Session = Depends(get_db)):
     """Obtiene las áreas de interés disponibles"""
     areas = db.query(models.InterestArea).filter(
         models.InterestArea.is_active == True
@@ -720,7 +721,7 @@ async def get_interest_areas(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/availability-levels")
-async def get_availability_levels(db: Session = Depends(get_db)):
+def get_availability_levels(db: Session = Depends(get_db)):
     """Obtiene los niveles de disponibilidad disponibles"""
     levels = db.query(models.AvailabilityLevel).filter(
         models.AvailabilityLevel.is_active == True
@@ -729,7 +730,7 @@ async def get_availability_levels(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/communication-channels")
-async def get_communication_channels(db: Session = Depends(get_db)):
+def get_communication_channels(db: Session = Depends(get_db)):
     """Obtiene los canales de comunicación disponibles"""
     channels = db.query(models.CommunicationChannel).filter(
         models.CommunicationChannel.is_active == True
@@ -738,7 +739,7 @@ async def get_communication_channels(db: Session = Depends(get_db)):
 
 
 @router.get("/catalogs/skills")
-async def get_skills(db: Session = Depends(get_db)):
+def get_skills(db: Session = Depends(get_db)):
     """Obtiene las habilidades disponibles"""
     skills = db.query(models.Skill).filter(
         models.Skill.is_active == True
@@ -748,7 +749,7 @@ async def get_skills(db: Session = Depends(get_db)):
 
 # ========== ENDPOINTS DE PERFIL ==========
 @router.get("/profile")
-async def get_profile(
+def get_profile(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -826,7 +827,7 @@ async def get_profile(
 
 
 @router.put("/profile")
-async def update_profile(
+def update_profile(
     profile_data: UserUpdateProfile,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1013,7 +1014,7 @@ async def update_profile(
 
 # ========== ENDPOINTS DE TICKETS ==========
 @router.get("/tickets")
-async def get_user_tickets(
+def get_user_tickets(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1044,7 +1045,7 @@ async def get_user_tickets(
 
 
 @router.get("/tickets/{ticket_id}")
-async def get_user_ticket(
+def get_user_ticket(
     ticket_id: int,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1080,7 +1081,7 @@ async def get_user_ticket(
 
 # ========== ENDPOINTS PÚBLICOS (SIN AUTENTICACIÓN) ==========
 @router.get("/api/public/ticket/{unique_url}")
-async def get_public_ticket(
+def get_public_ticket(
     unique_url: str,
     db: Session = Depends(get_db)
 ):
@@ -1118,7 +1119,7 @@ async def get_public_ticket(
 
 # ========== ENDPOINT DE FOTO DE PERFIL ==========
 @router.post("/profile/photo")
-async def upload_profile_photo(
+def upload_profile_photo(
     photo: UploadFile = File(...),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1142,7 +1143,7 @@ async def upload_profile_photo(
 
     # Leer el archivo
     try:
-        content = await photo.read()
+        content = photo.file.read()
         if len(content) > 10 * 1024 * 1024:  # 10 MB máximo
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -1206,7 +1207,7 @@ async def upload_profile_photo(
 
 
 @router.delete("/profile/photo")
-async def delete_profile_photo(
+def delete_profile_photo(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1239,7 +1240,7 @@ async def delete_profile_photo(
 # ========== ENDPOINTS DE ESTUDIOS DEL USUARIO ==========
 
 @router.get("/profile/studies")
-async def get_user_studies(
+def get_user_studies(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1263,7 +1264,7 @@ async def get_user_studies(
 
 
 @router.post("/profile/studies")
-async def add_user_study(
+def add_user_study(
     study_data: schemas.UserStudyCreate,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1319,7 +1320,7 @@ async def add_user_study(
 
 
 @router.put("/profile/studies/{study_id}")
-async def update_user_study(
+def update_user_study(
     study_id: int,
     study_data: schemas.UserStudyUpdate,
     current_user: models.User = Depends(get_current_user),
@@ -1390,7 +1391,7 @@ async def update_user_study(
 
 
 @router.delete("/profile/studies/{study_id}")
-async def delete_user_study(
+def delete_user_study(
     study_id: int,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1415,7 +1416,7 @@ async def delete_user_study(
 
 # ========== ENDPOINT DE CROSS-LOGIN (PORTAL <-> ADMIN) ==========
 @router.get("/auth/admin-token")
-async def get_admin_token(
+def get_admin_token(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1517,34 +1518,16 @@ def generate_external_token(
 
 
 @router.get("/birthdays")
-async def get_member_birthdays(
+def get_member_birthdays(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Retorna los cumpleaños de todos los miembros con fecha registrada"""
-    users = db.query(models.User).options(
-        joinedload(models.User.academic_program)
-    ).filter(
-        models.User.birthday.isnot(None)
-    ).all()
-
-    birthdays = []
-    for user in users:
-        bday = user.birthday
-        birthdays.append({
-            "name": user.name,
-            "photo_path": user.photo_path,
-            "month": bday.month,
-            "day": bday.day,
-            "academic_program": user.academic_program.name if user.academic_program else None,
-        })
-
-    birthdays.sort(key=lambda x: (x["month"], x["day"]))
-    return birthdays
+    """Retorna los cumpleaños de todos los miembros con fecha registrada (en caché hasta medianoche)"""
+    return get_birthday_calendar(db)
 
 
 @router.get("/events")
-async def get_portal_events(
+def get_portal_events(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
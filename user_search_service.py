@@ -0,0 +1,309 @@
+"""
+Búsqueda de usuarios por nombre, email, cédula y teléfono
+
+En lugar de ILIKE '%q%' sobre cuatro columnas (que recorre toda la tabla en
+cada tecla), cada usuario tiene sus palabras normalizadas en user_search_tokens:
+sin tildes, en minúscula, y el teléfono solo con dígitos (con y sin indicativo,
+igual que country_codes.format_phone_number). La búsqueda es por prefijo de
+palabra, así que usa el índice de token:
+
+    "andres gom"  -> usuarios con una palabra que empiece por "andres"
+                     y otra que empiece por "gom" (Andrés Gómez)
+    "300 123 45"  -> teléfonos que empiecen por 30012345 (con o sin +57)
+    "4567"        -> también teléfonos que terminen en 4567 (o en 7 dígitos)
+
+Los pares de palabras del nombre (seguidas o saltando una) también se
+indexan, así que "maria lopez" se resuelve con un solo rango del índice.
+
+Los resultados se ordenan por relevancia: palabra exacta antes que prefijo,
+nombre antes que email/cédula/teléfono, y luego los nombres que empiezan por
+la búsqueda completa.
+
+El índice se actualiza solo al crear, editar o borrar un User por el ORM
+(eventos de SQLAlchemy). Las inserciones masivas deben llamar a
+index_user_rows, y rebuild_user_search_index.py reconstruye todo.
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, event, insert, inspect, select
+from sqlalchemy.orm import Session, aliased
+
+import models
+from country_codes import format_phone_number
+
+# Pesos por campo de origen
+WEIGHT_NAME = 3
+WEIGHT_CONTACT = 2
+WEIGHT_PARTIAL = 1
+
+# Terminaciones del teléfono que también se indexan ("últimos 4 dígitos")
+PHONE_SUFFIX_LENGTHS = (4, 7)
+
+# Máximo de candidatos que se leen del índice por palabra
+SEARCH_CANDIDATES = 500
+
+TOKEN_MAX_LENGTH = 100
+
+# Campos de User que alimentan el índice
+INDEXED_FIELDS = (
+    'name', 'nick', 'email', 'email_personal', 'email_institutional', 'email_ieee',
+    'identification', 'phone', 'country_code'
+)
+
+_WORD_SPLIT = re.compile(r'[^a-z0-9]+')
+_PHONE_QUERY = re.compile(r'^[+\d\s().\-]+$')
+
+
+def fold_text(value: Optional[str]) -> str:
+    """Minúsculas y sin tildes ('Andrés Peña' -> 'andres pena')"""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize('NFKD', value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+
+def phone_digits(value: Optional[str]) -> str:
+    return re.sub(r'\D', '', value or "")
+
+
+def _words(value: Optional[str]) -> List[str]:
+    return [word for word in _WORD_SPLIT.split(fold_text(value)) if word]
+
+
+def build_user_tokens(fields: Dict) -> Dict[str, int]:
+    """
+    Palabras del índice para un usuario y el peso de cada una.
+
+    Args:
+        fields: valores de INDEXED_FIELDS (un dict o un User vía user_fields)
+    """
+    tokens: Dict[str, int] = {}
+
+    def add(token: str, weight: int):
+        token = token[:TOKEN_MAX_LENGTH]
+        if token and tokens.get(token, 0) < weight:
+            tokens[token] = weight
+
+    name_words = _words(fields.get('name'))
+    for word in name_words:
+        add(word, WEIGHT_NAME)
+    # Pares de palabras del nombre ("maria lopez") para búsquedas de nombre
+    # completo; también saltando una palabra ("maria gomez" en "María Camila Gómez")
+    for gap in (1, 2):
+        for first, second in zip(name_words, name_words[gap:]):
+            add(f"{first} {second}", WEIGHT_NAME)
+    for word in _words(fields.get('nick')):
+        add(word, WEIGHT_CONTACT)
+
+    for key in ('email', 'email_personal', 'email_institutional', 'email_ieee'):
+        email = fold_text(fields.get(key))
+        if not email:
+            continue
+        add(email, WEIGHT_CONTACT)
+        local_part = email.split('@')[0]
+        add(local_part, WEIGHT_CONTACT)
+        for word in _WORD_SPLIT.split(local_part):
+            add(word, WEIGHT_CONTACT)
+
+    identification = "".join(_words(fields.get('identification')))
+    add(identification, WEIGHT_CONTACT)
+
+    phone = fields.get('phone')
+    if phone:
+        national = phone_digits(phone)
+        add(national, WEIGHT_CONTACT)
+        for length in PHONE_SUFFIX_LENGTHS:
+            if len(national) > length:
+                add(national[-length:], WEIGHT_PARTIAL)
+        add(phone_digits(format_phone_number(fields.get('country_code') or "", phone)), WEIGHT_CONTACT)
+
+    return tokens
+
+
+def user_fields(user: models.User) -> Dict:
+    return {field: getattr(user, field) for field in INDEXED_FIELDS}
+
+
+def parse_query(query: str) -> List[str]:
+    """
+    Palabras a buscar. Un número de teléfono escrito con espacios o guiones
+    ('+57 300-123 4567') se toma como una sola palabra de dígitos.
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+    if _PHONE_QUERY.match(query) and phone_digits(query):
+        return [phone_digits(query)[:TOKEN_MAX_LENGTH]]
+
+    terms = []
+    for chunk in query.split():
+        if '@' in chunk:
+            terms.append(fold_text(chunk)[:TOKEN_MAX_LENGTH])
+        else:
+            terms.extend(word[:TOKEN_MAX_LENGTH] for word in _words(chunk))
+    # Sin repetidos, conservando el orden
+    return list(dict.fromkeys(term for term in terms if term))
+
+
+# Mayor que cualquier carácter de una palabra indexada ([a-z0-9@._+-] y el
+# espacio de los pares de palabras del nombre): el rango
+# [palabra, palabra + "~") son exactamente los tokens que empiezan por la palabra
+_PREFIX_END = "~"
+
+
+def _token_matches(term: str):
+    """Prefijo como rango sobre el índice (LIKE 'x%' no lo usa en todas las bases)"""
+    token = models.UserSearchToken.token
+    return and_(token >= term, token < term + _PREFIX_END)
+
+
+# ============================================================
+# ESCRITURA DEL ÍNDICE
+# ============================================================
+
+def _replace_tokens(connection, user_tokens: Dict[int, Dict[str, int]]):
+    """Reemplaza las palabras de los usuarios dados (conexión o sesión)"""
+    if not user_tokens:
+        return
+    table = models.UserSearchToken.__table__
+    connection.execute(delete(table).where(table.c.user_id.in_(list(user_tokens))))
+    rows = [
+        {"user_id": user_id, "token": token, "weight": weight}
+        for user_id, tokens in user_tokens.items()
+        for token, weight in tokens.items()
+    ]
+    if rows:
+        connection.execute(insert(table), rows)
+
+
+def index_user_rows(db: Session, rows: Iterable[Tuple[int, Dict]]):
+    """Indexa usuarios insertados sin el ORM: [(user_id, campos), ...]. No hace commit."""
+    _replace_tokens(db, {user_id: build_user_tokens(fields) for user_id, fields in rows})
+
+
+def rebuild_user_search_index(db: Session, batch_size: int = 1000) -> int:
+    """Reconstruye el índice de todos los usuarios por lotes (commit por lote)"""
+    columns = [getattr(models.User, field) for field in INDEXED_FIELDS]
+    last_id = 0
+    indexed = 0
+    while True:
+        rows = db.query(models.User.id, *columns).filter(
+            models.User.id > last_id
+        ).order_by(models.User.id).limit(batch_size).all()
+        if not rows:
+            break
+        index_user_rows(db, [(row[0], dict(zip(INDEXED_FIELDS, row[1:]))) for row in rows])
+        db.commit()
+        indexed += len(rows)
+        last_id = rows[-1][0]
+    return indexed
+
+
+@event.listens_for(models.User, "after_insert")
+def _index_new_user(mapper, connection, target):
+    _replace_tokens(connection, {target.id: build_user_tokens(user_fields(target))})
+
+
+@event.listens_for(models.User, "after_update")
+def _reindex_user(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS):
+        _replace_tokens(connection, {target.id: build_user_tokens(user_fields(target))})
+
+
+@event.listens_for(models.User, "before_delete")
+def _unindex_user(mapper, connection, target):
+    table = models.UserSearchToken.__table__
+    connection.execute(delete(table).where(table.c.user_id == target.id))
+
+
+# ============================================================
+# BÚSQUEDA
+# ============================================================
+
+def search_filter(query: str):
+    """
+    Condición sobre users.id para combinar la búsqueda con otros filtros
+    (directorio de usuarios). None si la búsqueda no tiene palabras.
+    """
+    terms = parse_query(query)
+    if not terms:
+        return None
+    token = models.UserSearchToken
+    return and_(*[
+        models.User.id.in_(select(token.user_id).where(_token_matches(term)))
+        for term in terms
+    ])
+
+
+def _match_scores(db: Session, driving: str, others: List[str], driving_words: int = 1) -> Dict[int, int]:
+    """
+    Candidatos y su puntaje en una sola consulta. La palabra `driving` se lee
+    del índice de token en orden (la exacta va primero) hasta SEARCH_CANDIDATES;
+    las demás se verifican por la llave primaria (user_id, token) de cada candidato.
+
+    Puntaje por palabra: peso x2 si la palabra es exacta, peso si es prefijo.
+    """
+    token = models.UserSearchToken
+    columns = [token.user_id, token.token, token.weight]
+    query = db.query(*columns).filter(_token_matches(driving))
+    other_tokens = []
+    for other in others:
+        other_token = aliased(models.UserSearchToken)
+        other_tokens.append(other_token)
+        query = query.join(other_token, and_(
+            other_token.user_id == token.user_id,
+            other_token.token >= other,
+            other_token.token < other + _PREFIX_END
+        ))
+    query = query.add_columns(*[column for other_token in other_tokens for column in (other_token.token, other_token.weight)])
+    query = query.order_by(token.token).limit(SEARCH_CANDIDATES)
+
+    def score(term, value, weight):
+        return weight * 2 if value == term else weight
+
+    scores: Dict[int, int] = {}
+    for row in query.all():
+        user_id = row[0]
+        total = score(driving, row[1], row[2]) * driving_words
+        for index, other in enumerate(others):
+            total += score(other, row[3 + index * 2], row[4 + index * 2])
+        if total > scores.get(user_id, 0):
+            scores[user_id] = total
+    return scores
+
+
+def search_users(db: Session, query: str, limit: int = 20) -> List[models.User]:
+    """Usuarios que coinciden con todas las palabras, ordenados por relevancia"""
+    terms = parse_query(query)
+    if not terms:
+        return []
+
+    scores = {}
+    if len(terms) >= 2 and not any(c.isdigit() for c in terms[0] + terms[1]):
+        # "maria lo": el par de palabras del nombre es mucho más selectivo que
+        # cada palabra por separado; también en orden inverso ("lopez maria")
+        scores = _match_scores(db, f"{terms[0]} {terms[1]}", terms[2:], driving_words=2)
+        if not scores:
+            scores = _match_scores(db, f"{terms[1]} {terms[0]}", terms[2:], driving_words=2)
+    if not scores:
+        # Las palabras en cualquier orden y posición ("andres 3001").
+        # Primero la más selectiva: las que tienen dígitos (cédula, teléfono,
+        # email) y luego la más larga
+        ordered = sorted(terms, key=lambda term: (any(c.isdigit() for c in term), len(term)), reverse=True)
+        scores = _match_scores(db, ordered[0], ordered[1:])
+    if not scores:
+        return []
+
+    ranked = sorted(scores, key=lambda user_id: -scores[user_id])[:max(limit * 3, limit)]
+    users = db.query(models.User).filter(models.User.id.in_(ranked)).all()
+
+    folded_query = " ".join(_words(query))
+
+    def sort_key(user):
+        starts_with = 1 if folded_query and " ".join(_words(user.name)).startswith(folded_query) else 0
+        return (-(scores[user.id] + starts_with * WEIGHT_NAME), fold_text(user.name), user.id)
+
+    return sorted(users, key=sort_key)[:limit]
@@ -0,0 +1,241 @@
+"""
+Feed en vivo de validaciones por evento
+
+Los coordinadores se suscriben a /events/{id}/validation-feed (SSE) y reciben
+cada validación exitosa con los totales del evento. En cada worker hay un solo
+sondeo por evento con suscriptores, compartido por todas sus conexiones: lee
+las validaciones nuevas de validation_logs (que es lo que reparte el feed entre
+varios workers de uvicorn) y la fila de event_validation_stats.
+
+Cuando la validación ocurre en el mismo worker, validate_ticket llama a
+notify() y el sondeo se adelanta, así que la entrega es inmediata; las de otros
+workers llegan en el siguiente sondeo (VALIDATION_FEED_POLL_SECONDS).
+
+El sondeo avanza por id de validation_logs, no por validated_at: la
+sincronización offline registra escaneos con su hora original, que puede ser
+de hace horas. Los ids que faltan al avanzar (transacciones que aún no hacen
+commit) se vuelven a consultar durante VALIDATION_FEED_GRACE_SECONDS.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import func, or_
+
+import models
+from database import SessionLocal
+from event_stats_service import get_event_stats
+
+# Segundos entre sondeos por evento
+VALIDATION_FEED_POLL_SECONDS = float(os.getenv("VALIDATION_FEED_POLL_SECONDS", "1"))
+
+# Margen para validaciones de otros workers cuyo commit llega después de un sondeo
+VALIDATION_FEED_GRACE_SECONDS = 30
+
+# Máximo de validation_logs (de todos los eventos) por sondeo y de mensajes en cola por conexión
+VALIDATION_FEED_BATCH = 1000
+VALIDATION_FEED_QUEUE_SIZE = 500
+
+
+def _fetch_new_validations(event_id: int, last_id: Optional[int], retry_ids: List[int]) -> Dict:
+    """
+    Validaciones exitosas del evento con id posterior a `last_id` (o en
+    `retry_ids`), y los totales. Retorna también el nuevo cursor y los ids que
+    faltan antes de él. Con `last_id=None` solo ubica el cursor al final.
+    """
+    db = SessionLocal()
+    try:
+        log = models.ValidationLog
+        if last_id is None:
+            return {"items": [], "totals": None, "last_id": db.query(func.max(log.id)).scalar() or 0, "missing": []}
+
+        # Ids confirmados tras el cursor (todos los eventos) para detectar huecos
+        committed = [
+            log_id for (log_id,) in db.query(log.id).filter(
+                log.id > last_id
+            ).order_by(log.id).limit(VALIDATION_FEED_BATCH).all()
+        ]
+        new_last_id = committed[-1] if committed else last_id
+        # Los ids aún sin commit son recientes: se buscan solo entre los últimos del tramo
+        low = max(last_id, new_last_id - VALIDATION_FEED_BATCH)
+        missing = sorted(set(range(low + 1, new_last_id + 1)) - set(committed))
+
+        if not committed and not retry_ids:
+            return {"items": [], "totals": None, "last_id": last_id, "missing": []}
+        window = (log.id > last_id) & (log.id <= new_last_id)
+        if retry_ids:
+            window = or_(window, log.id.in_(retry_ids))
+
+        rows = db.query(
+            log.id,
+            log.ticket_id,
+            log.validated_at,
+            models.Ticket.companions,
+            models.Ticket.validation_mode,
+            models.User.name,
+            models.AdminUser.full_name,
+            models.AdminUser.username
+        ).join(
+            models.Ticket, log.ticket_id == models.Ticket.id
+        ).join(
+            models.User, models.Ticket.user_id == models.User.id
+        ).join(
+            models.AdminUser, log.validator_id == models.AdminUser.id
+        ).filter(
+            models.Ticket.event_id == event_id,
+            log.success == True,
+            window
+        ).order_by(log.id).all()
+
+        items = [
+            {
+                "validation_id": log_id,
+                "ticket_id": ticket_id,
+                "user_name": user_name,
+                "validator_name": full_name or username,
+                "companions": companions or 0,
+                "validation_mode": validation_mode,
+                "validated_at": validated_at.isoformat()
+            }
+            for log_id, ticket_id, validated_at, companions, validation_mode, user_name, full_name, username in rows
+        ]
+
+        totals = get_event_stats(db, event_id) if items else None
+        return {"items": items, "totals": totals, "last_id": new_last_id, "missing": missing}
+    finally:
+        db.close()
+
+
+def load_event_name(event_id: int) -> Optional[str]:
+    """Nombre del evento, o None si no existe (para abrir el stream)"""
+    db = SessionLocal()
+    try:
+        return db.query(models.Event.name).filter(models.Event.id == event_id).scalar()
+    finally:
+        db.close()
+
+
+def load_totals(event_id: int) -> Dict:
+    """Totales actuales del evento (para el mensaje inicial del stream)"""
+    db = SessionLocal()
+    try:
+        return get_event_stats(db, event_id)
+    finally:
+        db.close()
+
+
+class _EventChannel:
+    """Suscriptores y sondeo de un evento en este worker"""
+
+    def __init__(self, event_id: int):
+        self.event_id = event_id
+        self.queues: Set[asyncio.Queue] = set()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        # Último id de validation_logs revisado (None: se ubica en el primer
+        # sondeo, así solo se envían validaciones posteriores a la suscripción)
+        self.last_id: Optional[int] = None
+        # Ids saltados que aún pueden aparecer -> momento hasta el que se reintentan
+        self.retry: Dict[int, float] = {}
+
+
+class ValidationFeed:
+    """Reparte las validaciones de cada evento a sus conexiones SSE"""
+
+    def __init__(self, poll_seconds: float = VALIDATION_FEED_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._channels: Dict[int, _EventChannel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, event_id: int) -> asyncio.Queue:
+        """Registra una conexión y arranca el sondeo del evento si es la primera"""
+        self._loop = asyncio.get_running_loop()
+        channel = self._channels.get(event_id)
+        if channel is None:
+            channel = self._channels[event_id] = _EventChannel(event_id)
+        queue = asyncio.Queue(maxsize=VALIDATION_FEED_QUEUE_SIZE)
+        channel.queues.add(queue)
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.create_task(self._poll(channel))
+        return queue
+
+    def unsubscribe(self, event_id: int, queue: asyncio.Queue):
+        """Quita una conexión; el sondeo termina solo cuando no quedan suscriptores"""
+        channel = self._channels.get(event_id)
+        if channel is None:
+            return
+        channel.queues.discard(queue)
+        if not channel.queues:
+            channel.wakeup.set()
+
+    def notify(self, event_id: int):
+        """
+        Avisa que hubo una validación en este worker para adelantar el sondeo.
+        Se puede llamar desde los hilos del threadpool (endpoints síncronos).
+        """
+        loop = self._loop
+        channel = self._channels.get(event_id)
+        if loop is None or channel is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(channel.wakeup.set)
+
+    def get_stats(self) -> Dict:
+        return {
+            event_id: len(channel.queues)
+            for event_id, channel in self._channels.items()
+        }
+
+    async def _poll(self, channel: _EventChannel):
+        try:
+            while channel.queues:
+                if channel.last_id is not None:
+                    try:
+                        await asyncio.wait_for(channel.wakeup.wait(), timeout=self.poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                channel.wakeup.clear()
+                if not channel.queues:
+                    break
+
+                try:
+                    await self._poll_once(channel)
+                except Exception as e:
+                    print(f"[FEED] Error consultando validaciones del evento {channel.event_id}: {e}")
+                    await asyncio.sleep(self.poll_seconds)
+        finally:
+            if not channel.queues and self._channels.get(channel.event_id) is channel:
+                del self._channels[channel.event_id]
+
+    async def _poll_once(self, channel: _EventChannel):
+        result = await asyncio.to_thread(
+            _fetch_new_validations, channel.event_id, channel.last_id, list(channel.retry)
+        )
+        channel.last_id = result["last_id"]
+
+        now = time.monotonic()
+        for log_id in result["missing"]:
+            channel.retry[log_id] = now + VALIDATION_FEED_GRACE_SECONDS
+        for item in result["items"]:
+            channel.retry.pop(item["validation_id"], None)
+        channel.retry = {log_id: until for log_id, until in channel.retry.items() if until > now}
+        if not result["items"]:
+            return
+
+        self._broadcast(channel, [
+            dict(item, event="validation", totals=result["totals"])
+            for item in result["items"]
+        ])
+
+    @staticmethod
+    def _broadcast(channel: _EventChannel, messages: List[Dict]):
+        for queue in list(channel.queues):
+            for message in messages:
+                if queue.full():
+                    # Conexión lenta: se descarta lo más antiguo
+                    queue.get_nowait()
+                queue.put_nowait(message)
+
+
+# Instancia global del feed
+validation_feed = ValidationFeed()
@@ -0,0 +1,657 @@
+"""
+Motor de validación de tickets para la entrada de eventos.
+
+Resuelve ticket, usuario, evento y el estado de validaciones previas en una
+sola consulta, decide según el modo ('once' / 'daily') y registra la
+validación sin recargar el ticket. Mide la latencia de cada escaneo para
+poder verificar que se mantiene dentro del presupuesto configurado.
+
+También genera el manifiesto firmado por evento que usa el validador en modo
+sin conexión y concilia los lotes de validaciones offline que se suben después.
+"""
+import hashlib
+import hmac
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, Load, noload
+
+import models
+import schemas
+from auth import SECRET_KEY
+from event_stats_service import record_validation
+from timezone_utils import (
+    BOGOTA_TZ,
+    get_bogota_now_naive,
+    format_datetime_bogota,
+    is_same_day_bogota,
+    get_date_only_bogota
+)
+
+# Clave para firmar los manifiestos offline y vigencia de cada manifiesto
+# (ventana, desde su emisión, en la que se pueden escanear tickets con él)
+MANIFEST_SECRET = os.getenv("VALIDATION_MANIFEST_SECRET", SECRET_KEY)
+MANIFEST_TTL = timedelta(hours=int(os.getenv("VALIDATION_MANIFEST_TTL_HOURS", "48")))
+# Desfase tolerado entre el reloj del dispositivo y el del servidor
+MANIFEST_CLOCK_SKEW = timedelta(minutes=int(os.getenv("VALIDATION_MANIFEST_CLOCK_SKEW_MINUTES", "10")))
+
+
+class ValidationService:
+    """Servicio de validación de tickets en la puerta con métricas de latencia"""
+
+    def __init__(self, budget_ms: float = 150.0, window_size: int = 1000):
+        # Presupuesto de latencia por escaneo (ms) y ventana de muestras recientes
+        self.budget_ms = budget_ms
+        self._timings = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def _fetch_scan_row(self, db: Session, ticket_code: str):
+        """
+        Obtiene en una sola consulta el ticket, su usuario, su evento, el número de
+        validaciones exitosas y la fecha de la última validación exitosa.
+        """
+        success_count = select(func.count(models.ValidationLog.id)).where(
+            models.ValidationLog.ticket_id == models.Ticket.id,
+            models.ValidationLog.success == True
+        ).correlate(models.Ticket).scalar_subquery()
+
+        last_validated_at = select(func.max(models.ValidationLog.validated_at)).where(
+            models.ValidationLog.ticket_id == models.Ticket.id,
+            models.ValidationLog.success == True
+        ).correlate(models.Ticket).scalar_subquery()
+
+        # Las relaciones no se cargan: la respuesta del escáner solo usa columnas
+        # propias de ticket, usuario y evento, y así evitamos cargas perezosas.
+        return db.query(
+            models.Ticket,
+            models.User,
+            models.Event,
+            success_count.label("validation_count"),
+            last_validated_at.label("last_validated_at")
+        ).outerjoin(
+            models.User, models.Ticket.user_id == models.User.id
+        ).outerjoin(
+            models.Event, models.Ticket.event_id == models.Event.id
+        ).filter(
+            models.Ticket.ticket_code == ticket_code
+        ).options(
+            Load(models.Ticket).noload("*"),
+            Load(models.User).noload("*"),
+            Load(models.Event).noload("*")
+        ).first()
+
+    def validate(self, db: Session, ticket_code: str, validator: models.AdminUser) -> schemas.TicketValidationResponse:
+        """
+        Valida un ticket y registra la validación.
+
+        Args:
+            db: Sesión de base de datos
+            ticket_code: Código del ticket escaneado
+            validator: Usuario que realiza la validación
+
+        Returns:
+            TicketValidationResponse con el resultado de la validación
+        """
+        started = time.perf_counter()
+        try:
+            return self._validate(db, ticket_code, validator)
+        except Exception as e:
+            db.rollback()
+            return schemas.TicketValidationResponse(
+                valid=False,
+                message=f"Error al validar ticket: {str(e)}"
+            )
+        finally:
+            self._record_timing((time.perf_counter() - started) * 1000)
+
+    def _validate(self, db: Session, ticket_code: str, validator: models.AdminUser) -> schemas.TicketValidationResponse:
+        row = self._fetch_scan_row(db, ticket_code)
+
+        if not row:
+            return schemas.TicketValidationResponse(
+                valid=False,
+                message="Ticket no encontrado o inválido"
+            )
+
+        ticket, user, event, validation_count, last_validated_at = row
+
+        if not user or not event:
+            return schemas.TicketValidationResponse(
+                valid=False,
+                message="Error: Usuario o evento no encontrado"
+            )
+
+        validation_count = validation_count or 0
+        current_time_bogota = get_bogota_now_naive()
+
+        rejection, message = self._check_previous(ticket, validation_count, last_validated_at, current_time_bogota)
+        if rejection:
+            return rejection
+
+        db.add(models.ValidationLog(
+            ticket_id=ticket.id,
+            validator_id=validator.id,
+            validated_at=current_time_bogota,
+            success=True,
+            notes=f"Validación en modo {ticket.validation_mode}",
+            validation_key=build_validation_key(ticket.id, ticket.validation_mode, current_time_bogota)
+        ))
+
+        # Actualizar campos deprecated para compatibilidad
+        ticket.is_used = True
+        ticket.used_at = current_time_bogota
+
+        # Construir la respuesta antes del commit: tras el commit los objetos
+        # quedan expirados y leerlos forzaría una recarga desde la BD
+        response = schemas.TicketValidationResponse(
+            valid=True,
+            message=message,
+            ticket=schemas.TicketResponse.model_validate(ticket),
+            user=schemas.UserResponse.model_validate(user),
+            event=schemas.EventResponse.model_validate(event),
+            validation_count=validation_count + 1,
+            is_second_validation=(validation_count > 0)
+        )
+
+        try:
+            # Contadores del evento, en la misma transacción que la validación
+            record_validation(db, event.id, first_for_ticket=(validation_count == 0))
+            db.commit()
+        except IntegrityError:
+            # Otro validador registró la misma entrada al mismo tiempo:
+            # la llave única de validation_logs rechazó este registro
+            db.rollback()
+            return self._concurrent_rejection(db, ticket_code, current_time_bogota)
+
+        return response
+
+    def _check_previous(self, ticket: models.Ticket, validation_count: int, last_validated_at, current_time_bogota):
+        """
+        Decide si el ticket puede validarse según su modo y la última validación exitosa.
+
+        Returns:
+            Tupla (respuesta de rechazo o None, mensaje de éxito)
+        """
+        if ticket.validation_mode == 'once':
+            if validation_count > 0:
+                last_validation_time = format_datetime_bogota(last_validated_at, '%d/%m/%Y %H:%M')
+                return schemas.TicketValidationResponse(
+                    valid=False,
+                    message=f"Ticket ya fue utilizado el {last_validation_time}",
+                    validation_count=validation_count
+                ), None
+            return None, "Ticket válido - Acceso permitido"
+
+        if validation_count > 0:
+            # Modo diario: la última validación basta para saber si ya entró hoy
+            if is_same_day_bogota(last_validated_at, current_time_bogota):
+                last_validation_time = format_datetime_bogota(last_validated_at, '%d/%m/%Y %H:%M')
+                return schemas.TicketValidationResponse(
+                    valid=False,
+                    message=f"Ticket ya fue validado hoy a las {last_validation_time}. En modo diario solo se permite 1 validación por día.",
+                    validation_count=validation_count
+                ), None
+            last_validation_date = format_datetime_bogota(last_validated_at, '%d/%m/%Y')
+            return None, f"Ticket válido - Acceso permitido. Validación #{validation_count + 1}. Última validación: {last_validation_date}"
+
+        return None, "Ticket válido - Acceso permitido. Primera validación"
+
+    def _concurrent_rejection(self, db: Session, ticket_code: str, current_time_bogota) -> schemas.TicketValidationResponse:
+        """Respuesta para el validador que perdió la carrera por el mismo ticket"""
+        row = self._fetch_scan_row(db, ticket_code)
+        if row:
+            ticket, _, _, validation_count, last_validated_at = row
+            rejection, _ = self._check_previous(ticket, validation_count or 0, last_validated_at, current_time_bogota)
+            if rejection:
+                return rejection
+
+        return schemas.TicketValidationResponse(
+            valid=False,
+            message="Ticket validado simultáneamente por otro validador"
+        )
+
+    def _record_timing(self, elapsed_ms: float):
+        """Registra la duración de un escaneo en la ventana de muestras"""
+        with self._lock:
+            self._timings.append(elapsed_ms)
+
+    def get_timing_stats(self) -> Dict:
+        """
+        Obtiene percentiles de latencia de los escaneos recientes de este worker.
+
+        Returns:
+            Dict con p50, p95, máximo y si el p95 está dentro del presupuesto
+        """
+        with self._lock:
+            samples = sorted(self._timings)
+
+        if not samples:
+            return {
+                "samples": 0,
+                "p50_ms": None,
+                "p95_ms": None,
+                "max_ms": None,
+                "budget_ms": self.budget_ms,
+                "within_budget": True
+            }
+
+        p95 = _percentile(samples, 95)
+        return {
+            "samples": len(samples),
+            "p50_ms": round(_percentile(samples, 50), 2),
+            "p95_ms": round(p95, 2),
+            "max_ms": round(samples[-1], 2),
+            "budget_ms": self.budget_ms,
+            "within_budget": p95 <= self.budget_ms
+        }
+
+    # ========== HISTORIAL ==========
+
+    def get_history(
+        self,
+        db: Session,
+        event_id: Optional[int] = None,
+        validator_id: Optional[int] = None,
+        before: Optional[str] = None,
+        days: Optional[int] = None
+    ) -> Dict:
+        """
+        Historial de validaciones exitosas por evento o por validador, paginado por día.
+
+        El número de validación de cada registro (1ª, 2ª... entrada del ticket) se
+        calcula con una función de ventana en la misma consulta, así que la cantidad
+        de consultas no depende del tamaño del historial.
+
+        Args:
+            event_id: Filtra por evento
+            validator_id: Filtra por validador (el conteo por ticket incluye a todos los validadores)
+            before: Cursor 'YYYY-MM-DD'; solo se incluyen días anteriores
+            days: Cantidad de días por página (None = todos)
+
+        Returns:
+            Dict con rows [(log, ticket, user, validator, event, validation_count)],
+            day_keys de la página, next_cursor y totales del historial completo
+        """
+        log = models.ValidationLog
+        filters = [log.success == True]
+        if event_id is not None:
+            filters.append(models.Ticket.event_id == event_id)
+        if validator_id is not None:
+            filters.append(log.validator_id == validator_id)
+
+        def scoped(query):
+            return query.join(models.Ticket, log.ticket_id == models.Ticket.id).filter(*filters)
+
+        # Totales del historial completo (una consulta)
+        total_validations, unique_tickets, unique_events = scoped(db.query(
+            func.count(log.id),
+            func.count(func.distinct(log.ticket_id)),
+            func.count(func.distinct(models.Ticket.event_id))
+        )).one()
+
+        # Días de la página (los validated_at se guardan en hora de Bogotá)
+        day_column = func.date(log.validated_at)
+        day_query = scoped(db.query(day_column.label("day")))
+        if before:
+            day_query = day_query.filter(log.validated_at < datetime.strptime(before, '%Y-%m-%d'))
+        day_query = day_query.group_by(day_column).order_by(day_column.desc())
+        if days:
+            day_query = day_query.limit(days + 1)
+        day_keys = [str(day) for (day,) in day_query.all()]
+
+        next_cursor = None
+        if days and len(day_keys) > days:
+            day_keys = day_keys[:days]
+            next_cursor = day_keys[-1]
+
+        if not day_keys:
+            return {
+                "rows": [],
+                "day_keys": [],
+                "next_cursor": None,
+                "total_validations": total_validations,
+                "unique_tickets": unique_tickets,
+                "unique_events": unique_events
+            }
+
+        # Conteo acumulado por ticket sobre todas las validaciones exitosas de los
+        # tickets en alcance (no solo las de la página ni las del validador)
+        ticket_scope = scoped(db.query(log.ticket_id)).distinct().subquery()
+        ranked = select(
+            log.id.label("log_id"),
+            func.count(log.id).over(partition_by=log.ticket_id, order_by=log.id).label("validation_count")
+        ).where(
+            log.success == True,
+            log.ticket_id.in_(select(ticket_scope.c.ticket_id))
+        ).subquery()
+
+        range_start = datetime.strptime(day_keys[-1], '%Y-%m-%d')
+        range_end = datetime.strptime(day_keys[0], '%Y-%m-%d') + timedelta(days=1)
+
+        rows = scoped(db.query(
+            log,
+            models.Ticket,
+            models.User,
+            models.AdminUser,
+            models.Event,
+            ranked.c.validation_count
+        )).join(
+            ranked, ranked.c.log_id == log.id
+        ).join(
+            models.User, models.Ticket.user_id == models.User.id
+        ).join(
+            models.AdminUser, log.validator_id == models.AdminUser.id
+        ).join(
+            models.Event, models.Ticket.event_id == models.Event.id
+        ).filter(
+            log.validated_at >= range_start,
+            log.validated_at < range_end
+        ).options(
+            Load(log).noload("*"),
+            Load(models.Ticket).noload("*"),
+            Load(models.User).noload("*"),
+            Load(models.AdminUser).noload("*"),
+            Load(models.Event).noload("*")
+        ).order_by(
+            log.validated_at.desc(), log.id.desc()
+        ).all()
+
+        return {
+            "rows": rows,
+            "day_keys": day_keys,
+            "next_cursor": next_cursor,
+            "total_validations": total_validations,
+            "unique_tickets": unique_tickets,
+            "unique_events": unique_events
+        }
+
+    # ========== MODO OFFLINE ==========
+
+    def build_manifest(self, db: Session, event: models.Event) -> Dict:
+        """
+        Genera el manifiesto compacto de un evento para validar sin conexión.
+
+        Los tickets se indexan por el SHA-256 de su código, de modo que el
+        manifiesto no expone códigos válidos. Cada entrada incluye modo de
+        validación, acompañantes, nombre del titular, número de validaciones
+        exitosas y el día (Bogotá) de la última.
+
+        Returns:
+            Dict con la cabecera firmada (issued_at, digest, signature) y los tickets
+        """
+        stats = db.query(
+            models.ValidationLog.ticket_id.label("ticket_id"),
+            func.count(models.ValidationLog.id).label("validation_count"),
+            func.max(models.ValidationLog.validated_at).label("last_validated_at")
+        ).join(
+            models.Ticket, models.ValidationLog.ticket_id == models.Ticket.id
+        ).filter(
+            models.Ticket.event_id == event.id,
+            models.ValidationLog.success == True
+        ).group_by(models.ValidationLog.ticket_id).subquery()
+
+        rows = db.query(
+            models.Ticket.ticket_code,
+            models.Ticket.validation_mode,
+            models.Ticket.companions,
+            models.User.name,
+            stats.c.validation_count,
+            stats.c.last_validated_at
+        ).join(
+            models.User, models.Ticket.user_id == models.User.id
+        ).outerjoin(
+            stats, stats.c.ticket_id == models.Ticket.id
+        ).filter(
+            models.Ticket.event_id == event.id
+        ).all()
+
+        tickets = {}
+        for ticket_code, mode, companions, user_name, validation_count, last_validated_at in rows:
+            tickets[hash_ticket_code(ticket_code)] = {
+                "m": mode,
+                "c": companions or 0,
+                "n": user_name,
+                "v": validation_count or 0,
+                "d": get_date_only_bogota(last_validated_at) if last_validated_at else None
+            }
+
+        issued_at = get_bogota_now_naive().isoformat(timespec="seconds")
+        digest = hashlib.sha256(
+            json.dumps(tickets, sort_keys=True, separators=(",", ":")).encode()
+        ).hexdigest()
+
+        return {
+            "event_id": event.id,
+            "event_name": event.name,
+            "issued_at": issued_at,
+            "expires_at": (datetime.fromisoformat(issued_at) + MANIFEST_TTL).isoformat(),
+            "digest": digest,
+            "signature": _sign_manifest(event.id, issued_at, digest),
+            "tickets": tickets
+        }
+
+    def verify_manifest(self, event_id: int, issued_at: str, digest: str, signature: str) -> Optional[datetime]:
+        """
+        Verifica la firma de la cabecera de un manifiesto.
+
+        La vigencia no se mide aquí sino por escaneo (ver reconcile_offline):
+        un dispositivo puede pasar más de MANIFEST_TTL sin conexión y subir
+        después validaciones hechas cuando el manifiesto estaba vigente.
+
+        Returns:
+            Fecha de emisión del manifiesto, o None si la cabecera no es válida
+        """
+        expected = _sign_manifest(event_id, issued_at, digest)
+        if not hmac.compare_digest(expected, signature):
+            return None
+        try:
+            return datetime.fromisoformat(issued_at)
+        except ValueError:
+            return None
+
+    def reconcile_offline(self, db: Session, sync: schemas.OfflineSyncRequest, validator: models.AdminUser) -> Dict:
+        """
+        Concilia un lote de validaciones hechas sin conexión.
+
+        Reglas de resolución:
+        - Las validaciones exitosas ya registradas en el servidor prevalecen,
+          aunque sean posteriores al escaneo offline: entre lotes gana el que
+          se sube primero, no el que se escaneó primero.
+        - Dentro del lote se procesan por (scanned_at, device_id, local_id).
+        - 'once': solo la primera validación del ticket es exitosa.
+        - 'daily': solo la primera validación de cada día (Bogotá) es exitosa.
+        - Se rechazan los escaneos hechos fuera de la vigencia del manifiesto
+          (antes de su emisión o más de MANIFEST_TTL después) o con una hora
+          futura para el servidor, con MANIFEST_CLOCK_SKEW de tolerancia.
+        Las entradas en conflicto se registran con success=False para auditoría,
+        y las ya sincronizadas (mismo ticket y hora) se ignoran, por lo que subir
+        el mismo lote dos veces no duplica registros.
+
+        Raises:
+            ValueError: Si la firma del manifiesto no es válida
+        """
+        issued = self.verify_manifest(sync.event_id, sync.issued_at, sync.digest, sync.signature)
+        if issued is None:
+            raise ValueError("Manifiesto inválido")
+        latest_scan = get_bogota_now_naive() + MANIFEST_CLOCK_SKEW
+
+        codes = {entry.ticket_code for entry in sync.entries}
+        tickets = {}
+        if codes:
+            tickets = {
+                ticket.ticket_code: ticket
+                for ticket in db.query(models.Ticket).filter(
+                    models.Ticket.event_id == sync.event_id,
+                    models.Ticket.ticket_code.in_(codes)
+                ).options(noload("*")).all()
+            }
+
+        # Estado actual del servidor para los tickets del lote
+        synced_keys = set()
+        success_days = defaultdict(set)
+        if tickets:
+            existing = db.query(
+                models.ValidationLog.ticket_id,
+                models.ValidationLog.validated_at,
+                models.ValidationLog.success
+            ).filter(
+                models.ValidationLog.ticket_id.in_([t.id for t in tickets.values()])
+            ).all()
+            for ticket_id, validated_at, success in existing:
+                synced_keys.add((ticket_id, validated_at))
+                if success:
+                    success_days[ticket_id].add(get_date_only_bogota(validated_at))
+
+        results = []
+        counts = {"accepted": 0, "rejected": 0, "duplicate": 0, "not_found": 0}
+
+        ordered = sorted(
+            sync.entries,
+            key=lambda e: (_to_bogota_naive(e.scanned_at), e.device_id or "", e.local_id)
+        )
+        for entry in ordered:
+            ticket = tickets.get(entry.ticket_code)
+            if not ticket:
+                counts["not_found"] += 1
+                results.append({
+                    "local_id": entry.local_id,
+                    "status": "not_found",
+                    "message": "Ticket no encontrado en este evento"
+                })
+                continue
+
+            scanned_at = _to_bogota_naive(entry.scanned_at)
+            out_of_window = (
+                scanned_at < issued - MANIFEST_CLOCK_SKEW
+                or scanned_at - issued > MANIFEST_TTL
+                or scanned_at > latest_scan
+            )
+            if out_of_window:
+                counts["rejected"] += 1
+                results.append({
+                    "local_id": entry.local_id,
+                    "status": "rejected",
+                    "message": "Escaneo fuera de la vigencia del manifiesto"
+                })
+                continue
+
+            if (ticket.id, scanned_at) in synced_keys:
+                counts["duplicate"] += 1
+                results.append({
+                    "local_id": entry.local_id,
+                    "status": "duplicate",
+                    "message": "Validación ya sincronizada"
+                })
+                continue
+
+            days = success_days[ticket.id]
+            scan_day = get_date_only_bogota(scanned_at)
+            if ticket.validation_mode == 'once':
+                conflict = bool(days)
+                reason = "el ticket ya había sido validado"
+            else:
+                conflict = scan_day in days
+                reason = "el ticket ya había sido validado ese día"
+
+            device = entry.device_id or "desconocido"
+            if not conflict:
+                try:
+                    # Savepoint: si una validación en línea tomó la misma llave
+                    # mientras tanto, solo se descarta esta entrada
+                    with db.begin_nested():
+                        db.add(models.ValidationLog(
+                            ticket_id=ticket.id,
+                            validator_id=validator.id,
+                            validated_at=scanned_at,
+                            success=True,
+                            notes=f"Validación offline en modo {ticket.validation_mode} (dispositivo {device})",
+                            validation_key=build_validation_key(ticket.id, ticket.validation_mode, scanned_at)
+                        ))
+                except IntegrityError:
+                    conflict = True
+                else:
+                    record_validation(db, sync.event_id, first_for_ticket=not days)
+                    days.add(scan_day)
+                    ticket.is_used = True
+                    if not ticket.used_at or scanned_at > ticket.used_at:
+                        ticket.used_at = scanned_at
+
+            if conflict:
+                db.add(models.ValidationLog(
+                    ticket_id=ticket.id,
+                    validator_id=validator.id,
+                    validated_at=scanned_at,
+                    success=False,
+                    notes=f"Validación offline rechazada en sincronización: {reason} (dispositivo {device})"
+                ))
+            synced_keys.add((ticket.id, scanned_at))
+
+            status = "rejected" if conflict else "accepted"
+            counts[status] += 1
+            results.append({
+                "local_id": entry.local_id,
+                "status": status,
+                "message": f"Conflicto: {reason}" if conflict else "Validación registrada"
+            })
+
+        db.commit()
+
+        return {
+            "event_id": sync.event_id,
+            "processed": len(results),
+            **counts,
+            "results": results
+        }
+
+
+def build_validation_key(ticket_id: int, validation_mode: str, validated_at: datetime) -> str:
+    """
+    Llave única de una validación exitosa.
+
+    En modo 'once' hay una sola llave por ticket; en modo 'daily' una por día
+    de Bogotá. La restricción UNIQUE sobre validation_logs.validation_key hace
+    que el INSERT sea condicional y atómico entre workers.
+    """
+    if validation_mode == 'daily':
+        return f"{ticket_id}:{get_date_only_bogota(validated_at)}"
+    return f"{ticket_id}:once"
+
+
+def hash_ticket_code(ticket_code: str) -> str:
+    """Hash con el que se indexa un ticket en el manifiesto offline"""
+    return hashlib.sha256(ticket_code.encode()).hexdigest()
+
+
+def _sign_manifest(event_id: int, issued_at: str, digest: str) -> str:
+    """Firma HMAC-SHA256 de la cabecera de un manifiesto"""
+    message = f"{event_id}|{issued_at}|{digest}".encode()
+    return hmac.new(MANIFEST_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _to_bogota_naive(dt: datetime) -> datetime:
+    """Normaliza una fecha del dispositivo a hora de Bogotá sin timezone"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(BOGOTA_TZ).replace(tzinfo=None)
+    return dt.replace(microsecond=0)
+
+
+def _percentile(sorted_samples: list, percent: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not sorted_samples:
+        return None
+    index = max(0, math.ceil(percent / 100 * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+# Instancia global del servicio
+validation_service = ValidationService(
+    budget_ms=float(os.getenv("VALIDATION_BUDGET_MS", "150"))
+)
@@ -2,11 +2,11 @@
 Cliente para WhatsApp Business API (Cloud API de Meta)
 Documentación: https://developers.facebook.com/docs/whatsapp/cloud-api
 """
-import requests
 import base64
 import os
 from typing import Optional, Dict
 from dotenv import load_dotenv
+from http_pool import get_graph_session
 
 load_dotenv()
 
@@ -69,7 +69,7 @@ class WhatsAppAPIClient:
         }
 
         try:
-            response = requests.post(
+            response = get_graph_session().post(
                 f"{self.base_url}/messages",
                 headers=self.headers,
                 json=payload,
@@ -146,7 +146,7 @@ class WhatsAppAPIClient:
                 }
             }
 
-            response = requests.post(
+            response = get_graph_session().post(
                 f"{self.base_url}/messages",
                 headers=self.headers,
                 json=payload,
@@ -212,7 +212,7 @@ class WhatsAppAPIClient:
                 "type": mime_type
             }
 
-            response = requests.post(
+            response = get_graph_session().post(
                 f"{self.base_url}/media",
                 headers=headers,
                 files=files,
@@ -245,7 +245,7 @@ class WhatsAppAPIClient:
             URL del medio si se obtiene exitosamente
         """
         try:
-            response = requests.get(
+            response = get_graph_session().get(
                 f"https://graph.facebook.com/{self.api_version}/{media_id}",
                 headers=self.headers,
                 timeout=30
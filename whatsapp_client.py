@@ -6,14 +6,213 @@ Documentación: https://developers.facebook.com/docs/whatsapp/cloud-api
 import requests
 import base64
 import os
-from typing import Optional, List, Dict
+import time
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
 from dotenv import load_dotenv
 from country_codes import format_phone_number
 import models
 from template_service import template_service
+from whatsapp_rate_limiter import whatsapp_rate_limiter
+from http_pool import get_graph_session
+from whatsapp_media_cache import whatsapp_media_cache, hash_content, MEDIA_EXPIRED_ERROR_CODES
 
 load_dotenv()
 
+# Reintentos ante throttling de Meta y espera máxima aceptada antes de desistir
+WHATSAPP_THROTTLE_RETRIES = int(os.getenv("WHATSAPP_THROTTLE_RETRIES", "2"))
+WHATSAPP_MAX_BACKOFF_SECONDS = float(os.getenv("WHATSAPP_MAX_BACKOFF_SECONDS", "60"))
+
+
+def _recipient_number(phone: str, country_code: Optional[str] = None) -> str:
+    """Número en formato internacional sin '+', espacios ni guiones, como lo espera Meta"""
+    full_phone = format_phone_number(country_code, phone) if country_code else phone
+    return full_phone.replace("+", "").replace(" ", "").replace("-", "")
+
+
+def _text_payload(full_phone: str, message: str) -> Dict:
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": full_phone,
+        "type": "text",
+        "text": {
+            "preview_url": True,
+            "body": message
+        }
+    }
+
+
+def _image_payload(full_phone: str, media_id: str, caption: str) -> Dict:
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": full_phone,
+        "type": "image",
+        "image": {
+            "id": media_id,
+            "caption": caption
+        }
+    }
+
+
+def _template_payload(
+    full_phone: str,
+    template_name: str,
+    language: str,
+    variables: Optional[List[str]] = None,
+    header_image_id: Optional[str] = None,
+    header_image_link: Optional[str] = None
+) -> Dict:
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": full_phone,
+        "type": "template",
+        "template": {
+            "name": template_name,
+            "language": {"code": language}
+        }
+    }
+
+    # Construir componentes
+    components = []
+
+    # Agregar header de imagen si se proporciona
+    if header_image_id:
+        components.append({
+            "type": "header",
+            "parameters": [{"type": "image", "image": {"id": header_image_id}}]
+        })
+    elif header_image_link:
+        components.append({
+            "type": "header",
+            "parameters": [{"type": "image", "image": {"link": header_image_link}}]
+        })
+
+    # Agregar variables del body si existen
+    if variables:
+        components.append({
+            "type": "body",
+            "parameters": [
+                {"type": "text", "text": var} for var in variables
+            ]
+        })
+
+    if components:
+        payload["template"]["components"] = components
+
+    return payload
+
+
+def _decode_image(image_base64: str) -> bytes:
+    """Decodifica una imagen base64 (con o sin prefijo data:image/...)"""
+    if "base64," in image_base64:
+        image_base64 = image_base64.split("base64,")[1]
+    return base64.b64decode(image_base64)
+
+
+def _media_upload_parts(image_bytes: bytes, filename: str):
+    """Archivos y campos del formulario para subir una imagen a /media"""
+    # Determinar tipo MIME basado en extensión
+    mime_type = "image/jpeg"
+    if filename.lower().endswith(".png"):
+        mime_type = "image/png"
+    elif filename.lower().endswith(".gif"):
+        mime_type = "image/gif"
+
+    files = {
+        "file": (filename, image_bytes, mime_type)
+    }
+    data = {
+        "messaging_product": "whatsapp",
+        "type": mime_type
+    }
+    return files, data
+
+
+def _media_id_from_response(response) -> Optional[str]:
+    if response.status_code == 200:
+        media_id = response.json().get("id")
+        print(f"[OK] Imagen subida a WhatsApp. Media ID: {media_id}")
+        return media_id
+
+    print(f"[ERROR] Error al subir imagen: {response.json()}")
+    return None
+
+
+@lru_cache(maxsize=16)
+def _load_image_data_url(path: str, mtime: float) -> str:
+    """
+    Lee una imagen del disco como data URL. Se cachea por (ruta, mtime): el
+    banner de un evento se lee una vez, no una por destinatario.
+    """
+    with open(path, 'rb') as f:
+        image_data = f.read()
+    ext = os.path.splitext(path)[1].lower()
+    mime_types = {
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.png': 'image/png',
+        '.gif': 'image/gif'
+    }
+    mime_type = mime_types.get(ext, 'image/jpeg')
+    return f"data:{mime_type};base64,{base64.b64encode(image_data).decode()}"
+
+
+def _is_media_error(response) -> bool:
+    """True si Meta rechazó el mensaje por un media ID vencido o inválido"""
+    if response.status_code == 200:
+        return False
+    try:
+        return response.json().get("error", {}).get("code") in MEDIA_EXPIRED_ERROR_CODES
+    except ValueError:
+        return False
+
+
+def _message_result(response, include_status: bool = False, include_full_error: bool = False, **extra) -> Dict:
+    """Convierte la respuesta de /messages al formato de resultado del cliente"""
+    if response.status_code == 200:
+        result = response.json()
+        return {
+            "success": True,
+            "messageId": result.get("messages", [{}])[0].get("id"),
+            **extra,
+            "response": result
+        }
+
+    error_data = response.json()
+    error = {
+        "success": False,
+        "error": error_data.get("error", {}).get("message", "Error desconocido"),
+        "error_code": error_data.get("error", {}).get("code")
+    }
+    if include_status:
+        error["status_code"] = response.status_code
+    if include_full_error:
+        error["full_error"] = error_data
+    return error
+
+
+def _throttle_backoff(phone_number_id: str, response) -> Optional[float]:
+    """Segundos a esperar antes de reintentar si Meta respondió con throttling, None si no"""
+    if response.status_code == 200:
+        return None
+
+    try:
+        error_code = response.json().get("error", {}).get("code")
+    except ValueError:
+        error_code = None
+
+    backoff = whatsapp_rate_limiter.report_response(
+        phone_number_id,
+        response.status_code,
+        error_code,
+        response.headers.get("Retry-After")
+    )
+    if backoff is None or backoff > WHATSAPP_MAX_BACKOFF_SECONDS:
+        return None
+    return backoff
+
 
 class WhatsAppClient:
     """Cliente para la API oficial de WhatsApp Business (Meta Cloud API)"""
@@ -42,7 +241,7 @@ class WhatsAppClient:
 
         try:
             # Verificar conectividad con la API de Meta
-            response = requests.get(
+            response = get_graph_session().get(
                 f"https://graph.facebook.com/{self.api_version}/{self.phone_number_id}",
                 headers=self.headers,
                 timeout=15
@@ -78,6 +277,29 @@ class WhatsAppClient:
         """Verifica si WhatsApp está listo para enviar mensajes"""
         return bool(self.phone_number_id and self.access_token)
 
+    def _post_message(self, payload: Dict) -> requests.Response:
+        """
+        Envía un payload a /messages respetando el límite de envío del número.
+        Si Meta responde con throttling, espera lo indicado y reintenta.
+        """
+        for attempt in range(WHATSAPP_THROTTLE_RETRIES + 1):
+            whatsapp_rate_limiter.acquire(self.phone_number_id)
+
+            response = get_graph_session().post(
+                f"{self.base_url}/messages",
+                headers=self.headers,
+                json=payload,
+                timeout=30
+            )
+
+            backoff = _throttle_backoff(self.phone_number_id, response)
+            if backoff is None or attempt == WHATSAPP_THROTTLE_RETRIES:
+                return response
+
+            time.sleep(backoff)
+
+        return response
+
     def send_message(self, phone: str, message: str, country_code: Optional[str] = None) -> Dict:
         """
         Envía un mensaje de texto por WhatsApp
@@ -90,49 +312,11 @@ class WhatsAppClient:
         Returns:
             Dict con el resultado del envío
         """
-        # Si se proporciona country_code, formatear el número completo
-        if country_code:
-            full_phone = format_phone_number(country_code, phone)
-        else:
-            full_phone = phone
-
-        # Limpiar número de teléfono (remover + y espacios)
-        full_phone = full_phone.replace("+", "").replace(" ", "").replace("-", "")
-
-        payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": full_phone,
-            "type": "text",
-            "text": {
-                "preview_url": True,
-                "body": message
-            }
-        }
+        payload = _text_payload(_recipient_number(phone, country_code), message)
 
         try:
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "messageId": result.get("messages", [{}])[0].get("id"),
-                    "response": result
-                }
-            else:
-                error_data = response.json()
-                return {
-                    "success": False,
-                    "error": error_data.get("error", {}).get("message", "Error desconocido"),
-                    "error_code": error_data.get("error", {}).get("code"),
-                    "status_code": response.status_code
-                }
+            response = self._post_message(payload)
+            return _message_result(response, include_status=True)
 
         except requests.exceptions.RequestException as e:
             return {
@@ -215,56 +399,58 @@ class WhatsAppClient:
             Media ID si se sube exitosamente, None en caso contrario
         """
         try:
-            # Limpiar base64 (remover prefijo si existe)
-            if "base64," in image_base64:
-                image_base64 = image_base64.split("base64,")[1]
-
-            # Decodificar base64 a bytes
-            image_bytes = base64.b64decode(image_base64)
-
-            # Determinar tipo MIME basado en extensión
-            mime_type = "image/jpeg"
-            if filename.lower().endswith(".png"):
-                mime_type = "image/png"
-            elif filename.lower().endswith(".gif"):
-                mime_type = "image/gif"
-
-            # Preparar archivos para upload
-            files = {
-                "file": (filename, image_bytes, mime_type)
-            }
-
-            headers = {
-                "Authorization": f"Bearer {self.access_token}"
-            }
+            return self._upload_media_bytes(_decode_image(image_base64), filename)
+        except Exception as e:
+            print(f"[ERROR] Excepción al subir imagen: {e}")
+            return None
 
-            data = {
-                "messaging_product": "whatsapp",
-                "type": mime_type
-            }
+    def _upload_media_bytes(self, image_bytes: bytes, filename: str) -> Optional[str]:
+        try:
+            files, data = _media_upload_parts(image_bytes, filename)
 
-            response = requests.post(
+            response = get_graph_session().post(
                 f"{self.base_url}/media",
-                headers=headers,
+                headers={"Authorization": f"Bearer {self.access_token}"},
                 files=files,
                 data=data,
                 timeout=60
             )
 
-            if response.status_code == 200:
-                result = response.json()
-                media_id = result.get("id")
-                print(f"[OK] Imagen subida a WhatsApp. Media ID: {media_id}")
-                return media_id
-            else:
-                error_data = response.json()
-                print(f"[ERROR] Error al subir imagen: {error_data}")
-                return None
+            return _media_id_from_response(response)
 
         except Exception as e:
             print(f"[ERROR] Excepción al subir imagen: {e}")
             return None
 
+    def get_media_id(self, image_base64: str, filename: str = "image.jpg", refresh: bool = False) -> Tuple[Optional[str], bool]:
+        """
+        Media ID de una imagen, reutilizando el de whatsapp_media_cache si el
+        mismo contenido ya se subió.
+
+        Args:
+            image_base64: Imagen en base64 (con o sin prefijo data:image/...)
+            filename: Nombre del archivo (define el tipo MIME)
+            refresh: Descartar el ID en caché y subir de nuevo
+
+        Returns:
+            (media_id o None, True si vino de la caché)
+        """
+        image_bytes = _decode_image(image_base64)
+        content_hash = hash_content(image_bytes)
+
+        if refresh:
+            whatsapp_media_cache.invalidate(self.phone_number_id, content_hash)
+        else:
+            media_id = whatsapp_media_cache.get(self.phone_number_id, content_hash)
+            if media_id:
+                return media_id, True
+
+        media_id = self._upload_media_bytes(image_bytes, filename)
+        if media_id:
+            _, data = _media_upload_parts(b"", filename)
+            whatsapp_media_cache.put(self.phone_number_id, content_hash, media_id, data["type"], len(image_bytes))
+        return media_id, False
+
     def upload_media_for_template(self, image_base64: str, filename: str = "template_header.jpg") -> Dict:
         """
         Sube una imagen para usar como ejemplo en un template header.
@@ -301,7 +487,7 @@ class WhatsAppClient:
             if app_id:
                 print(f"[TEMPLATE] Usando Resumable Upload con App ID: {app_id}")
                 # Paso 1: Iniciar sesión de upload con App ID
-                init_response = requests.post(
+                init_response = get_graph_session().post(
                     f"https://graph.facebook.com/{self.api_version}/{app_id}/uploads",
                     headers={"Authorization": f"Bearer {self.access_token}"},
                     params={
@@ -319,7 +505,7 @@ class WhatsAppClient:
                     upload_id = upload_session.get("id")
 
                     # Paso 2: Subir el archivo
-                    upload_response = requests.post(
+                    upload_response = get_graph_session().post(
                         f"https://graph.facebook.com/{self.api_version}/{upload_id}",
                         headers={
                             "Authorization": f"OAuth {self.access_token}",
@@ -365,18 +551,11 @@ class WhatsAppClient:
         Returns:
             Dict con el resultado del envío
         """
-        # Si se proporciona country_code, formatear el número completo
-        if country_code:
-            full_phone = format_phone_number(country_code, phone)
-        else:
-            full_phone = phone
-
-        # Limpiar número de teléfono
-        full_phone = full_phone.replace("+", "").replace(" ", "").replace("-", "")
+        full_phone = _recipient_number(phone, country_code)
 
         try:
-            # Paso 1: Subir la imagen a WhatsApp
-            media_id = self._upload_media(image_base64)
+            # Paso 1: Obtener el media ID (solo se sube si el contenido no está en caché)
+            media_id, cached = self.get_media_id(image_base64)
 
             if not media_id:
                 return {
@@ -385,40 +564,20 @@ class WhatsAppClient:
                 }
 
             # Paso 2: Enviar mensaje con la imagen
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": full_phone,
-                "type": "image",
-                "image": {
-                    "id": media_id,
-                    "caption": message
-                }
-            }
-
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
+            response = self._post_message(_image_payload(full_phone, media_id, message))
+
+            # Si Meta ya no reconoce el ID en caché, subir de nuevo y reintentar una vez
+            if cached and _is_media_error(response):
+                print(f"[WHATSAPP] Media ID {media_id} vencido, subiendo la imagen de nuevo")
+                media_id, _ = self.get_media_id(image_base64, refresh=True)
+                if not media_id:
+                    return {
+                        "success": False,
+                        "error": "No se pudo subir la imagen a WhatsApp"
+                    }
+                response = self._post_message(_image_payload(full_phone, media_id, message))
 
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "messageId": result.get("messages", [{}])[0].get("id"),
-                    "media_id": media_id,
-                    "response": result
-                }
-            else:
-                error_data = response.json()
-                return {
-                    "success": False,
-                    "error": error_data.get("error", {}).get("message", "Error desconocido"),
-                    "error_code": error_data.get("error", {}).get("code"),
-                    "status_code": response.status_code
-                }
+            return _message_result(response, include_status=True, media_id=media_id)
 
         except requests.exceptions.RequestException as e:
             return {
@@ -438,7 +597,7 @@ class WhatsAppClient:
             Dict con la lista de templates
         """
         try:
-            response = requests.get(
+            response = get_graph_session().get(
                 f"https://graph.facebook.com/{self.api_version}/{self.business_account_id}/message_templates",
                 headers=self.headers,
                 timeout=30
@@ -542,7 +701,7 @@ class WhatsAppClient:
         print(json.dumps(payload, indent=2, ensure_ascii=False))
 
         try:
-            response = requests.post(
+            response = get_graph_session().post(
                 f"https://graph.facebook.com/{self.api_version}/{self.business_account_id}/message_templates",
                 headers=self.headers,
                 json=payload,
@@ -590,7 +749,7 @@ class WhatsAppClient:
             Dict con el resultado
         """
         try:
-            response = requests.delete(
+            response = get_graph_session().delete(
                 f"https://graph.facebook.com/{self.api_version}/{self.business_account_id}/message_templates",
                 headers=self.headers,
                 params={"name": template_name},
@@ -637,85 +796,19 @@ class WhatsAppClient:
         Returns:
             Dict con el resultado
         """
-        if country_code:
-            full_phone = format_phone_number(country_code, phone)
-        else:
-            full_phone = phone
-
-        full_phone = full_phone.replace("+", "").replace(" ", "").replace("-", "")
-
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": full_phone,
-            "type": "template",
-            "template": {
-                "name": template_name,
-                "language": {"code": language}
-            }
-        }
-
-        # Construir componentes
-        components = []
-
-        # Agregar header de imagen si se proporciona
-        if header_image_id or header_image_link:
-            header_component = {
-                "type": "header",
-                "parameters": []
-            }
-            if header_image_id:
-                header_component["parameters"].append({
-                    "type": "image",
-                    "image": {"id": header_image_id}
-                })
-            elif header_image_link:
-                header_component["parameters"].append({
-                    "type": "image",
-                    "image": {"link": header_image_link}
-                })
-            components.append(header_component)
-
-        # Agregar variables del body si existen
-        if variables:
-            components.append({
-                "type": "body",
-                "parameters": [
-                    {"type": "text", "text": var} for var in variables
-                ]
-            })
-
-        if components:
-            payload["template"]["components"] = components
+        full_phone = _recipient_number(phone, country_code)
+        payload = _template_payload(full_phone, template_name, language, variables, header_image_id, header_image_link)
 
         try:
             import json
             print(f"[TEMPLATE MSG] Enviando template '{template_name}' a {full_phone}")
             print(f"[TEMPLATE MSG] Payload: {json.dumps(payload, indent=2, ensure_ascii=False)}")
 
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
+            response = self._post_message(payload)
 
             print(f"[TEMPLATE MSG] Response: {response.status_code} - {response.text[:500]}")
 
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "messageId": result.get("messages", [{}])[0].get("id"),
-                    "response": result
-                }
-            else:
-                error_data = response.json()
-                return {
-                    "success": False,
-                    "error": error_data.get("error", {}).get("message", "Error desconocido"),
-                    "error_code": error_data.get("error", {}).get("code"),
-                    "full_error": error_data
-                }
+            return _message_result(response, include_full_error=True)
 
         except requests.exceptions.RequestException as e:
             return {
@@ -735,7 +828,7 @@ class WhatsAppClient:
         """
         try:
             # Primero obtener la URL del media
-            response = requests.get(
+            response = get_graph_session().get(
                 f"https://graph.facebook.com/{self.api_version}/{media_id}",
                 headers=self.headers,
                 timeout=30
@@ -747,7 +840,7 @@ class WhatsAppClient:
 
                 # Descargar el archivo
                 if media_url:
-                    download_response = requests.get(
+                    download_response = get_graph_session().get(
                         media_url,
                         headers={"Authorization": f"Bearer {self.access_token}"},
                         timeout=60
@@ -783,6 +876,17 @@ class WhatsAppClient:
             }
 
 
+_shared_client: Optional[WhatsAppClient] = None
+
+
+def get_whatsapp_client() -> WhatsAppClient:
+    """Cliente compartido del proceso (las conexiones las reutiliza http_pool)"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = WhatsAppClient()
+    return _shared_client
+
+
 def send_birthday_whatsapp(phone: str, country_code: str, user_name: str, nick: Optional[str] = None) -> bool:
     """
     Envía un mensaje de cumpleaños por WhatsApp
@@ -796,7 +900,7 @@ def send_birthday_whatsapp(phone: str, country_code: str, user_name: str, nick:
     Returns:
         True si se envió correctamente, False en caso contrario
     """
-    client = WhatsAppClient()
+    client = get_whatsapp_client()
 
     # Verificar que WhatsApp esté listo
     if not client.is_ready():
@@ -861,7 +965,7 @@ def send_ticket_whatsapp(
     Returns:
         True si se envió correctamente
     """
-    client = WhatsAppClient()
+    client = get_whatsapp_client()
 
     if not client.is_ready():
         print("[ERROR] WhatsApp no esta listo")
@@ -899,28 +1003,18 @@ def send_ticket_whatsapp(
     # Preparar imagen promocional si existe
     promo_image = None
     if event and hasattr(event, 'whatsapp_image_path') and event.whatsapp_image_path:
-        import os
-        import base64
         if os.path.exists(event.whatsapp_image_path):
             try:
-                with open(event.whatsapp_image_path, 'rb') as f:
-                    image_data = f.read()
-                    ext = os.path.splitext(event.whatsapp_image_path)[1].lower()
-                    mime_types = {
-                        '.jpg': 'image/jpeg',
-                        '.jpeg': 'image/jpeg',
-                        '.png': 'image/png',
-                        '.gif': 'image/gif'
-                    }
-                    mime_type = mime_types.get(ext, 'image/jpeg')
-                    promo_image = f"data:{mime_type};base64,{base64.b64encode(image_data).decode()}"
-                    print(f"[INFO] Imagen promocional cargada")
+                promo_image = _load_image_data_url(
+                    event.whatsapp_image_path,
+                    os.path.getmtime(event.whatsapp_image_path)
+                )
+                print(f"[INFO] Imagen promocional cargada")
             except Exception as e:
                 print(f"[WARNING] No se pudo cargar la imagen del evento: {e}")
 
     # Nueva lógica: Mensaje de texto con QR (si está habilitado), luego banner promocional
-    import time
-
+    # El ritmo de envío lo controla whatsapp_rate_limiter dentro del cliente
     result = None
 
     # 1. Enviar mensaje principal: texto + QR (si está habilitado)
@@ -961,8 +1055,6 @@ def send_ticket_whatsapp(
 
     # 2. Si hay imagen promocional, enviarla después (opcional)
     if promo_image:
-        time.sleep(3)  # Esperar 3 segundos antes de enviar el banner
-
         banner_result = client.send_message_with_image(phone, "📢 *Información del evento:*", promo_image, country_code)
         if banner_result.get("success"):
             print(f"[OK] Banner promocional enviado a {user_name}")
@@ -1015,7 +1107,7 @@ def send_ticket_with_template(
     Returns:
         Dict con success, messageId o error
     """
-    client = WhatsAppClient()
+    client = get_whatsapp_client()
 
     if not client.is_ready():
         print("[ERROR] WhatsApp no está listo")
@@ -1065,7 +1157,7 @@ def send_ticket_with_template(
     if qr_image_base64:
         # Subir la imagen QR a WhatsApp primero
         print(f"[TEMPLATE] Subiendo imagen QR para header...")
-        media_id = client._upload_media(qr_image_base64, "ticket_qr.png")
+        media_id, _ = client.get_media_id(qr_image_base64, "ticket_qr.png")
         if media_id:
             header_image_id = media_id
             print(f"[TEMPLATE] Imagen QR subida con ID: {media_id}")
@@ -1144,7 +1236,7 @@ def send_bulk_whatsapp(
     Returns:
         Dict con el resultado: {"success": bool, "message_id": str, "error": str}
     """
-    client = WhatsAppClient()
+    client = get_whatsapp_client()
 
     if not client.is_ready():
         print("[ERROR] WhatsApp no esta listo")
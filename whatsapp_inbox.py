@@ -0,0 +1,343 @@
+"""
+Bandeja de entrada de los webhooks de WhatsApp
+
+POST /webhooks/whatsapp solo guarda el cuerpo recibido en
+whatsapp_webhook_inbox (un INSERT) y responde 200 de inmediato, así Meta no
+reintenta aunque lleguen cientos de respuestas a la vez tras un envío
+masivo.
+
+WebhookInboxConsumer (un hilo del proceso job_worker.py) reclama los
+webhooks pendientes en lotes y los procesa juntos:
+  1. descarta con una sola consulta los mensajes cuyo wa_message_id ya existe
+  2. agrupa los mensajes por número: una actualización o creación de
+     conversación por número, y una sola búsqueda de usuarios por teléfono
+  3. inserta los mensajes nuevos y aplica los estados de envío
+  4. marca los webhooks como procesados, todo con un solo commit
+
+Si un lote falla se reprocesa webhook por webhook, y el que vuelva a fallar
+se reintenta luego (hasta WHATSAPP_INBOX_MAX_ATTEMPTS). Se pueden ejecutar
+varios consumidores: cada lote se reclama con SELECT ... FOR UPDATE SKIP LOCKED.
+
+Variables de entorno:
+    WHATSAPP_INBOX_BATCH_SIZE      Webhooks por lote (default 200)
+    WHATSAPP_INBOX_POLL_SECONDS    Espera cuando la bandeja está vacía (default 1)
+    WHATSAPP_INBOX_RETENTION_DAYS  Días que se guardan los ya procesados (default 7)
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+WHATSAPP_INBOX_BATCH_SIZE = int(os.getenv("WHATSAPP_INBOX_BATCH_SIZE", "200"))
+WHATSAPP_INBOX_POLL_SECONDS = float(os.getenv("WHATSAPP_INBOX_POLL_SECONDS", "1"))
+WHATSAPP_INBOX_RETENTION_DAYS = int(os.getenv("WHATSAPP_INBOX_RETENTION_DAYS", "7"))
+WHATSAPP_INBOX_MAX_ATTEMPTS = 5
+
+# Un webhook "processing" más viejo que esto quedó de un consumidor que murió
+WHATSAPP_INBOX_STALE_AFTER = timedelta(minutes=5)
+
+
+def enqueue_webhook(payload: str) -> int:
+    """Guarda el cuerpo de un webhook para procesarlo después. Retorna su id"""
+    db = SessionLocal()
+    try:
+        result = db.execute(insert(models.WhatsAppWebhookInbox).values(
+            payload=payload, status="pending", attempts=0, received_at=datetime.utcnow()
+        ))
+        db.commit()
+        return result.inserted_primary_key[0]
+    finally:
+        db.close()
+
+
+def _iter_values(body: Dict) -> Iterator[Dict]:
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            if "value" in change:
+                yield change["value"]
+
+
+def _message_row(message: Dict, contact_name: Optional[str]) -> Dict:
+    """Fila de whatsapp_messages para un mensaje recibido"""
+    msg_type = message.get("type")
+    timestamp = message.get("timestamp")
+
+    # Extraer contenido según tipo
+    text_body = None
+    media_id = None
+    caption = None
+
+    if msg_type == "text":
+        text_body = message.get("text", {}).get("body")
+    elif msg_type in ["image", "video", "audio", "document", "sticker"]:
+        media_data = message.get(msg_type, {})
+        media_id = media_data.get("id")
+        caption = media_data.get("caption")
+    elif msg_type == "location":
+        loc = message.get("location", {})
+        text_body = f"Ubicación: {loc.get('latitude')}, {loc.get('longitude')}"
+
+    return {
+        "wa_message_id": message.get("id"),
+        "from_number": message.get("from"),
+        "from_name": contact_name,
+        "message_type": msg_type,
+        "text_body": text_body,
+        "media_id": media_id,
+        "caption": caption,
+        "context_message_id": message.get("context", {}).get("id"),
+        "is_forwarded": message.get("context", {}).get("forwarded", False),
+        "timestamp": datetime.fromtimestamp(int(timestamp)) if timestamp else datetime.utcnow(),
+        "raw_payload": json.dumps(message)
+    }
+
+
+def process_batch(db: Session, rows: List[Tuple[int, str]]) -> Dict:
+    """
+    Procesa varios webhooks de la bandeja con un solo commit
+
+    Args:
+        rows: (id, payload) de los webhooks reclamados
+
+    Returns:
+        Dict: mensajes nuevos, duplicados y estados aplicados
+    """
+    messages: Dict[str, Dict] = {}
+    statuses: Dict[str, Dict] = {}
+    duplicates = 0
+
+    for _, payload in rows:
+        for value in _iter_values(json.loads(payload)):
+            contacts = {
+                contact.get("wa_id"): contact.get("profile", {}).get("name")
+                for contact in reversed(value.get("contacts") or [])
+            }
+            for message in value.get("messages") or []:
+                msg_id = message.get("id")
+                if not msg_id:
+                    continue
+                if msg_id in messages:
+                    duplicates += 1
+                    continue
+                messages[msg_id] = _message_row(message, contacts.get(message.get("from")))
+
+            # Si llegan varios estados del mismo mensaje, vale el último recibido
+            for status_data in value.get("statuses") or []:
+                if status_data.get("id"):
+                    statuses.pop(status_data["id"], None)
+                    statuses[status_data["id"]] = status_data
+
+    # Dedupe contra la base de datos (Meta reintenta y reenvía webhooks)
+    if messages:
+        existing = {
+            msg_id for msg_id, in db.query(models.WhatsAppMessage.wa_message_id).filter(
+                models.WhatsAppMessage.wa_message_id.in_(list(messages))
+            ).all()
+        }
+        duplicates += len(existing)
+        new_rows = [row for msg_id, row in messages.items() if msg_id not in existing]
+    else:
+        new_rows = []
+
+    if new_rows:
+        db.execute(insert(models.WhatsAppMessage), new_rows)
+        _upsert_conversations(db, new_rows)
+
+    if statuses:
+        _apply_statuses(db, statuses)
+
+    db.query(models.WhatsAppWebhookInbox).filter(
+        models.WhatsAppWebhookInbox.id.in_([inbox_id for inbox_id, _ in rows])
+    ).update({
+        "status": "processed",
+        "error": None,
+        "processed_at": datetime.utcnow()
+    }, synchronize_session=False)
+
+    db.commit()
+    return {"messages": len(new_rows), "duplicates": duplicates, "statuses": len(statuses)}
+
+
+def _upsert_conversations(db: Session, new_rows: List[Dict]):
+    """Una actualización o creación de conversación por número"""
+    by_number: Dict[str, Dict] = {}
+    for row in new_rows:
+        entry = by_number.setdefault(row["from_number"], {"count": 0, "contact_name": None})
+        entry["count"] += 1
+        entry["contact_name"] = entry["contact_name"] or row["from_name"]
+
+    now = datetime.utcnow()
+    conversations = {
+        conversation.phone_number: conversation
+        for conversation in db.query(models.WhatsAppConversation).filter(
+            models.WhatsAppConversation.phone_number.in_(list(by_number))
+        ).all()
+    }
+
+    # Buscar usuarios por teléfono (últimos 10 dígitos) solo para las conversaciones nuevas
+    missing = [number for number in by_number if number not in conversations]
+    user_ids: Dict[str, int] = {}
+    if missing:
+        for user_id, phone in db.query(models.User.id, models.User.phone).filter(
+            models.User.phone.in_({number[-10:] for number in missing})
+        ).order_by(models.User.id).all():
+            user_ids.setdefault(phone, user_id)
+
+    for number, entry in by_number.items():
+        conversation = conversations.get(number)
+        if conversation:
+            conversation.last_message_at = now
+            conversation.last_user_message_at = now
+            conversation.unread_count = models.WhatsAppConversation.unread_count + entry["count"]
+            conversation.is_active = True
+            if entry["contact_name"] and not conversation.contact_name:
+                conversation.contact_name = entry["contact_name"]
+        else:
+            db.add(models.WhatsAppConversation(
+                phone_number=number,
+                contact_name=entry["contact_name"],
+                user_id=user_ids.get(number[-10:]),
+                last_message_at=now,
+                last_user_message_at=now,
+                unread_count=entry["count"],
+                is_active=True
+            ))
+
+
+def _apply_statuses(db: Session, statuses: Dict[str, Dict]):
+    """Actualiza los MessageRecipient de los mensajes con estado nuevo"""
+    now = datetime.utcnow()
+    recipients = db.query(models.MessageRecipient).filter(
+        models.MessageRecipient.whatsapp_message_id.in_(list(statuses))
+    ).all()
+
+    for recipient_record in recipients:
+        status_data = statuses[recipient_record.whatsapp_message_id]
+        status_type = status_data.get("status")
+        recipient_record.whatsapp_status = status_type
+        recipient_record.whatsapp_status_updated_at = now
+        if status_type == "failed":
+            recipient_record.whatsapp_sent = False
+            error_info = (status_data.get("errors") or [{}])[0]
+            recipient_record.whatsapp_error = error_info.get("message", "Error desconocido")
+
+
+def _claim(db: Session, consumer_id: str, limit: int) -> List[Tuple[int, str]]:
+    """Reclama hasta `limit` webhooks pendientes de forma atómica"""
+    rows = db.query(models.WhatsAppWebhookInbox.id, models.WhatsAppWebhookInbox.payload).filter(
+        models.WhatsAppWebhookInbox.status == "pending"
+    ).order_by(
+        models.WhatsAppWebhookInbox.id
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    if not rows:
+        db.commit()
+        return []
+
+    db.query(models.WhatsAppWebhookInbox).filter(
+        models.WhatsAppWebhookInbox.id.in_([inbox_id for inbox_id, _ in rows])
+    ).update({
+        "status": "processing",
+        "locked_by": consumer_id,
+        "locked_at": datetime.utcnow(),
+        "attempts": models.WhatsAppWebhookInbox.attempts + 1
+    }, synchronize_session=False)
+    db.commit()
+    return [(inbox_id, payload) for inbox_id, payload in rows]
+
+
+def _release(db: Session, inbox_id: int, error: str):
+    """Devuelve un webhook a la bandeja, o lo marca fallido si agotó los intentos"""
+    attempts = db.query(models.WhatsAppWebhookInbox.attempts).filter(
+        models.WhatsAppWebhookInbox.id == inbox_id
+    ).scalar() or 0
+    db.query(models.WhatsAppWebhookInbox).filter(models.WhatsAppWebhookInbox.id == inbox_id).update({
+        "status": "failed" if attempts >= WHATSAPP_INBOX_MAX_ATTEMPTS else "pending",
+        "locked_by": None,
+        "locked_at": None,
+        "error": error[:500]
+    }, synchronize_session=False)
+    db.commit()
+
+
+def _recover_and_purge(db: Session):
+    """Devuelve los webhooks de consumidores muertos y borra los procesados antiguos"""
+    db.query(models.WhatsAppWebhookInbox).filter(
+        models.WhatsAppWebhookInbox.status == "processing",
+        models.WhatsAppWebhookInbox.locked_at < datetime.utcnow() - WHATSAPP_INBOX_STALE_AFTER
+    ).update({"status": "pending", "locked_by": None, "locked_at": None}, synchronize_session=False)
+    db.query(models.WhatsAppWebhookInbox).filter(
+        models.WhatsAppWebhookInbox.status == "processed",
+        models.WhatsAppWebhookInbox.processed_at < datetime.utcnow() - timedelta(days=WHATSAPP_INBOX_RETENTION_DAYS)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+class WebhookInboxConsumer:
+    """Procesa en lotes los webhooks guardados por /webhooks/whatsapp"""
+
+    def __init__(self, batch_size: int = WHATSAPP_INBOX_BATCH_SIZE, poll_interval: float = WHATSAPP_INBOX_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.consumer_id = f"{socket.gethostname()}:{os.getpid()}:inbox"
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        print(f"[INBOX] Consumidor de webhooks {self.consumer_id} iniciado (lotes de {self.batch_size})")
+        last_recovery = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_recovery > 60:
+                    db = SessionLocal()
+                    try:
+                        _recover_and_purge(db)
+                    finally:
+                        db.close()
+                    last_recovery = time.monotonic()
+
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                print(f"[INBOX] Error en el consumidor: {e}")
+                self._stop.wait(self.poll_interval)
+        print(f"[INBOX] Consumidor de webhooks {self.consumer_id} detenido")
+
+    def run_once(self) -> int:
+        """Reclama y procesa un lote. Retorna cuántos webhooks se procesaron"""
+        db = SessionLocal()
+        try:
+            rows = _claim(db, self.consumer_id, self.batch_size)
+            if not rows:
+                return 0
+            try:
+                summary = process_batch(db, rows)
+                print(f"[INBOX] {len(rows)} webhooks: {summary['messages']} mensajes nuevos, "
+                      f"{summary['duplicates']} duplicados, {summary['statuses']} estados")
+            except Exception as e:
+                db.rollback()
+                print(f"[INBOX] Lote de {len(rows)} webhooks falló ({e}), procesando uno por uno")
+                self._process_one_by_one(db, rows)
+            return len(rows)
+        finally:
+            db.close()
+
+    def _process_one_by_one(self, db: Session, rows: List[Tuple[int, str]]):
+        for row in rows:
+            try:
+                process_batch(db, [row])
+            except Exception as e:
+                db.rollback()
+                print(f"[INBOX] Webhook {row[0]} falló: {e}")
+                _release(db, row[0], str(e))
@@ -0,0 +1,162 @@
+"""
+Caché de media IDs de WhatsApp
+
+Meta conserva por 30 días los archivos subidos a /media, así que la misma
+imagen (banner del evento, imagen de campaña, QR reenviado) se sube una sola
+vez y su media ID se reutiliza. La llave es el SHA-256 del contenido más el
+phone_number_id, guardada en la tabla whatsapp_media_cache para que todos los
+workers la compartan, con una copia en memoria para evitar consultas.
+"""
+import hashlib
+import os
+import threading
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+import models
+from database import SessionLocal
+from timezone_utils import get_bogota_now_naive
+
+# Días que se reutiliza un media ID (margen bajo los 30 días de Meta)
+WHATSAPP_MEDIA_TTL_DAYS = int(os.getenv("WHATSAPP_MEDIA_TTL_DAYS", "29"))
+
+# Códigos con los que Meta rechaza un media ID vencido o inválido
+MEDIA_EXPIRED_ERROR_CODES = {100, 131052, 131053}
+
+
+def hash_content(content: bytes) -> str:
+    """SHA-256 hexadecimal del contenido"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class WhatsAppMediaCache:
+    """Caché de media IDs por contenido, en memoria y en base de datos"""
+
+    def __init__(self, ttl_days: int = WHATSAPP_MEDIA_TTL_DAYS):
+        self.ttl = timedelta(days=ttl_days)
+        self._memory: Dict[str, Tuple[str, object]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(phone_number_id: str, content_hash: str) -> str:
+        return f"{phone_number_id or 'default'}:{content_hash}"
+
+    def get(self, phone_number_id: str, content_hash: str) -> Optional[str]:
+        """Retorna el media ID vigente para el contenido, o None"""
+        key = self._key(phone_number_id, content_hash)
+        now = get_bogota_now_naive()
+
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached and cached[1] > now:
+            self.hits += 1
+            return cached[0]
+
+        db = SessionLocal()
+        try:
+            entry = db.query(models.WhatsAppMediaCache).filter(
+                models.WhatsAppMediaCache.cache_key == key,
+                models.WhatsAppMediaCache.expires_at > now
+            ).first()
+            if not entry:
+                self.misses += 1
+                return None
+
+            db.execute(
+                update(models.WhatsAppMediaCache).where(
+                    models.WhatsAppMediaCache.id == entry.id
+                ).values(use_count=models.WhatsAppMediaCache.use_count + 1)
+            )
+            db.commit()
+
+            with self._lock:
+                self._memory[key] = (entry.media_id, entry.expires_at)
+            self.hits += 1
+            return entry.media_id
+
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] No se pudo consultar la caché de medios: {e}")
+            return None
+        finally:
+            db.close()
+
+    def put(self, phone_number_id: str, content_hash: str, media_id: str, mime_type: Optional[str] = None, size_bytes: Optional[int] = None):
+        """Guarda (o reemplaza) el media ID de un contenido"""
+        key = self._key(phone_number_id, content_hash)
+        now = get_bogota_now_naive()
+        expires_at = now + self.ttl
+
+        with self._lock:
+            self._memory[key] = (media_id, expires_at)
+
+        db = SessionLocal()
+        try:
+            updated = db.query(models.WhatsAppMediaCache).filter(
+                models.WhatsAppMediaCache.cache_key == key
+            ).update({
+                "media_id": media_id,
+                "mime_type": mime_type,
+                "size_bytes": size_bytes,
+                "uploaded_at": now,
+                "expires_at": expires_at
+            }, synchronize_session=False)
+
+            if not updated:
+                db.add(models.WhatsAppMediaCache(
+                    cache_key=key,
+                    media_id=media_id,
+                    mime_type=mime_type,
+                    size_bytes=size_bytes,
+                    use_count=0,
+                    uploaded_at=now,
+                    expires_at=expires_at
+                ))
+            db.commit()
+
+        except IntegrityError:
+            # Otro worker subió el mismo contenido al mismo tiempo; cualquiera de los dos IDs sirve
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] No se pudo guardar en la caché de medios: {e}")
+        finally:
+            db.close()
+
+    def invalidate(self, phone_number_id: str, content_hash: str):
+        """Descarta un media ID que Meta reportó como vencido o inválido"""
+        key = self._key(phone_number_id, content_hash)
+
+        with self._lock:
+            self._memory.pop(key, None)
+
+        db = SessionLocal()
+        try:
+            db.query(models.WhatsAppMediaCache).filter(
+                models.WhatsAppMediaCache.cache_key == key
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] No se pudo invalidar la caché de medios: {e}")
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        """Aciertos y fallos de la caché en este proceso"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+
+# Instancia global de la caché
+whatsapp_media_cache = WhatsAppMediaCache()
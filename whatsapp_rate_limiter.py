@@ -0,0 +1,182 @@
+"""
+Limitador de envío para la Cloud API de WhatsApp
+
+Token bucket por phone_number_id guardado en la tabla whatsapp_rate_limits,
+de modo que todos los workers de uvicorn y job_worker.py comparten el mismo
+presupuesto. Cuando Meta responde con un error de throttling, el bucket se
+bloquea durante el Retry-After (o el tiempo sugerido para ese código) y la
+tasa se reduce a la mitad; luego se recupera gradualmente hasta el máximo.
+"""
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+import models
+from database import SessionLocal
+
+# Mensajes por segundo y ráfaga máxima por número
+WHATSAPP_RATE_PER_SECOND = float(os.getenv("WHATSAPP_RATE_PER_SECOND", "20"))
+WHATSAPP_RATE_BURST = float(os.getenv("WHATSAPP_RATE_BURST", "20"))
+WHATSAPP_RATE_MIN_PER_SECOND = float(os.getenv("WHATSAPP_RATE_MIN_PER_SECOND", "1"))
+# Mensajes/segundo que se recuperan por cada segundo sin throttling
+WHATSAPP_RATE_RECOVERY = float(os.getenv("WHATSAPP_RATE_RECOVERY", "0.1"))
+
+# Códigos de throttling de Meta y espera sugerida (segundos) si no llega Retry-After
+THROTTLE_ERROR_CODES = {
+    4: 60,          # Límite de llamadas de la aplicación
+    80007: 60,      # Límite de la cuenta de WhatsApp Business
+    130429: 2,      # Límite de rendimiento (throughput) de la Cloud API
+    131048: 300,    # Límite por spam: seguir enviando afecta la calificación de calidad
+    131056: 6,      # Límite por par remitente-destinatario (solo afecta a ese destinatario)
+}
+PAIR_RATE_LIMIT_CODE = 131056
+HTTP_429_BACKOFF = 5
+
+
+class WhatsAppRateLimiter:
+    """Token bucket por número de WhatsApp coordinado a través de la base de datos"""
+
+    def __init__(
+        self,
+        rate: float = WHATSAPP_RATE_PER_SECOND,
+        burst: float = WHATSAPP_RATE_BURST,
+        min_rate: float = WHATSAPP_RATE_MIN_PER_SECOND,
+        recovery: float = WHATSAPP_RATE_RECOVERY
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.recovery = recovery
+        # Estado local usado solo si la base de datos no está disponible
+        self._local_buckets = {}
+        self._local_lock = threading.Lock()
+
+    def acquire(self, phone_number_id: str) -> float:
+        """
+        Espera hasta que haya un token disponible para el número y lo consume.
+
+        Returns:
+            Segundos esperados
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_consume(phone_number_id)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def report_response(self, phone_number_id: str, status_code: int, error_code: Optional[int], retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Ajusta el bucket según la respuesta de Meta.
+
+        Returns:
+            Segundos a esperar antes de reintentar si la respuesta fue throttling, None si no
+        """
+        if error_code not in THROTTLE_ERROR_CODES and status_code != 429:
+            return None
+
+        backoff = _parse_retry_after(retry_after)
+        if backoff is None:
+            backoff = THROTTLE_ERROR_CODES.get(error_code, HTTP_429_BACKOFF)
+
+        print(f"[WHATSAPP] Throttling de Meta (código {error_code}, HTTP {status_code}), esperando {backoff:.1f}s")
+
+        # El límite por par solo afecta a un destinatario: no frenar todo el número
+        if error_code == PAIR_RATE_LIMIT_CODE:
+            return backoff
+
+        self._update(phone_number_id, lambda bucket, now: self._penalize(bucket, now, backoff, error_code))
+        return backoff
+
+    def _try_consume(self, phone_number_id: str) -> float:
+        """Intenta tomar un token. Retorna 0 si lo tomó, o los segundos a esperar"""
+        return self._update(phone_number_id, self._consume)
+
+    def _consume(self, bucket, now: float) -> float:
+        self._refill(bucket, now)
+        if bucket.blocked_until and now < bucket.blocked_until:
+            return bucket.blocked_until - now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / bucket.rate
+
+    def _refill(self, bucket, now: float):
+        elapsed = max(0.0, now - bucket.last_refill)
+        bucket.rate = min(self.rate, bucket.rate + self.recovery * elapsed)
+        bucket.tokens = min(self.burst, bucket.tokens + bucket.rate * elapsed)
+        bucket.last_refill = now
+
+    def _penalize(self, bucket, now: float, backoff: float, error_code: Optional[int]):
+        self._refill(bucket, now)
+        bucket.tokens = 0.0
+        bucket.rate = max(self.min_rate, bucket.rate / 2)
+        bucket.blocked_until = max(bucket.blocked_until or 0.0, now + backoff)
+        bucket.throttle_count = (bucket.throttle_count or 0) + 1
+        bucket.last_error_code = error_code
+
+    def _update(self, phone_number_id: str, operation):
+        """Aplica una operación al bucket del número bloqueando su fila (SELECT ... FOR UPDATE)"""
+        key = phone_number_id or "default"
+        db = SessionLocal()
+        try:
+            bucket = db.query(models.WhatsAppRateLimit).filter(
+                models.WhatsAppRateLimit.phone_number_id == key
+            ).with_for_update().first()
+
+            if not bucket:
+                bucket = models.WhatsAppRateLimit(
+                    phone_number_id=key,
+                    tokens=self.burst,
+                    rate=self.rate,
+                    last_refill=time.time(),
+                    throttle_count=0
+                )
+                db.add(bucket)
+                try:
+                    db.flush()
+                except IntegrityError:
+                    # Otro worker creó la fila al mismo tiempo
+                    db.rollback()
+                    return self._update(phone_number_id, operation)
+
+            result = operation(bucket, time.time())
+            db.commit()
+            return result
+
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] Limitador de WhatsApp sin base de datos, usando bucket local: {e}")
+            return self._update_local(key, operation)
+        finally:
+            db.close()
+
+    def _update_local(self, key: str, operation):
+        with self._local_lock:
+            bucket = self._local_buckets.get(key)
+            if not bucket:
+                bucket = SimpleNamespace(
+                    tokens=self.burst, rate=self.rate, last_refill=time.time(),
+                    blocked_until=None, throttle_count=0, last_error_code=None
+                )
+                self._local_buckets[key] = bucket
+            return operation(bucket, time.time())
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Interpreta el header Retry-After (solo la forma en segundos)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+# Instancia global del limitador
+whatsapp_rate_limiter = WhatsAppRateLimiter()